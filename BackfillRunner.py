@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List
+
+CHECKPOINT_PATH = 'backfill_checkpoint.json'
+BATCH_SIZE = 100
+PROGRESS_INTERVAL_SECONDS = 10
+
+class RateLimiter:
+    def __init__(self, rate_per_second :float):
+        self.interval = 1 / rate_per_second if rate_per_second else 0
+        self.__next_slot = {}
+        self.__lock = threading.Lock()
+
+    def Wait(self, host :str):
+        if self.interval == 0:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(self.__next_slot.get(host, now), now)
+            self.__next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class BackfillCheckpoint:
+    def __init__(self, path :str = CHECKPOINT_PATH, base_backoff_seconds :float = 1800, max_backoff_seconds :float = 86400, max_attempts :int = 8, max_deferred_seconds :float = 2 * 86400):
+        self.path = path
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_attempts = max_attempts
+        self.max_deferred_seconds = max_deferred_seconds
+        self.__entries = {}
+        self.__lock = threading.Lock()
+        self.__dirty = False
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.__entries = json.load(f)
+
+    def ShouldAttempt(self, match_id :str, now :float = None) -> bool:
+        with self.__lock:
+            entry = self.__entries.get(str(match_id))
+        if entry is None:
+            return True
+        if entry['gave_up']:
+            return False
+        return (now if now is not None else time.time()) >= entry['next_attempt']
+
+    def RecordSuccess(self, match_id :str):
+        with self.__lock:
+            if self.__entries.pop(str(match_id), None) is not None:
+                self.__dirty = True
+
+    def RecordFailure(self, match_id :str, reason :str):
+        with self.__lock:
+            entry = self.__entries.setdefault(str(match_id), {'attempts': 0, 'next_attempt': 0, 'gave_up': False, 'reason': None})
+            entry['attempts'] += 1
+            entry['reason'] = reason
+            entry['next_attempt'] = time.time() + min(self.base_backoff_seconds * 2 ** (entry['attempts'] - 1), self.max_backoff_seconds)
+            entry['gave_up'] = entry['attempts'] >= self.max_attempts
+            self.__dirty = True
+            return entry['gave_up']
+
+    def RecordDeferred(self, match_id :str, reason :str) -> bool:
+        # no final result yet is not a failure; it only gives up once the page has stayed without one for max_deferred_seconds
+        with self.__lock:
+            now = time.time()
+            entry = self.__entries.setdefault(str(match_id), {'attempts': 0, 'next_attempt': 0, 'gave_up': False, 'reason': None})
+            deferred_since = entry.setdefault('deferred_since', now)
+            entry['reason'] = reason
+            entry['next_attempt'] = now + self.base_backoff_seconds
+            entry['gave_up'] = entry['attempts'] >= self.max_attempts or now - deferred_since >= self.max_deferred_seconds
+            self.__dirty = True
+            return entry['gave_up']
+
+    def GetStats(self) -> dict:
+        with self.__lock:
+            gave_up = sum(1 for entry in self.__entries.values() if entry['gave_up'])
+            return {'failing': len(self.__entries) - gave_up, 'gave_up': gave_up}
+
+    def Save(self):
+        with self.__lock:
+            if self.path is None or not self.__dirty:
+                return
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.__entries, f)
+            os.replace(temp_path, self.path)
+            self.__dirty = False
+
+class BackfillRunner:
+    def __init__(self, loggerFactory, checkpoint :BackfillCheckpoint = None, max_workers :int = 8, rate_per_second :float = 4, batch_size :int = BATCH_SIZE):
+        self.logger = loggerFactory.getLogger("Backfill")
+        self.checkpoint = checkpoint if checkpoint is not None else BackfillCheckpoint()
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.batch_size = batch_size
+
+    def _Resolve(self, resolve :Callable, host :str, item):
+        self.rate_limiter.Wait(host)
+        return resolve(item)
+
+    def Run(self, items :list, get_id :Callable, resolve :Callable, save_batch :Callable, host :str) -> dict:
+        pending = [item for item in items if self.checkpoint.ShouldAttempt(get_id(item))]
+        skipped = len(items) - len(pending)
+        self.logger.info(f"需補完{len(pending)}項賽事, 因早前失敗而略過{skipped}項")
+        stats = {'total': len(pending), 'resolved': 0, 'unresolved': 0, 'failed': 0, 'gave_up': 0, 'skipped': skipped}
+        if len(pending) == 0:
+            return stats
+
+        completed :List = []
+        start = time.monotonic()
+        last_report = start
+        iterator = iter(pending)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Backfill") as executor:
+            try:
+                while True:
+                    while len(in_flight) < self.max_workers * 2:
+                        item = next(iterator, None)
+                        if item is None:
+                            break
+                        in_flight[executor.submit(self._Resolve, resolve, host, item)] = item
+                    if len(in_flight) == 0:
+                        break
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item = in_flight.pop(future)
+                        match_id = get_id(item)
+                        try:
+                            result = future.result()
+                        except Exception as ex:
+                            stats['failed'] += 1
+                            reason = f"{type(ex).__name__}: {ex}"
+                            self.logger.debug(f"補完{match_id}賽事失敗: {reason}")
+                            if self.checkpoint.RecordFailure(match_id, reason):
+                                stats['gave_up'] += 1
+                            continue
+                        if result is None:
+                            stats['unresolved'] += 1
+                            if self.checkpoint.RecordDeferred(match_id, "unresolved"):
+                                stats['gave_up'] += 1
+                            continue
+                        stats['resolved'] += 1
+                        self.checkpoint.RecordSuccess(match_id)
+                        completed.append(result)
+
+                    if len(completed) >= self.batch_size:
+                        # swap the batch out first, so a failing save is not retried by the finally below
+                        batch, completed = completed, []
+                        save_batch(batch)
+                        self.checkpoint.Save()
+
+                    now = time.monotonic()
+                    if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                        last_report = now
+                        self._LogProgress(stats, now - start)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                if len(completed) > 0:
+                    save_batch(completed)
+                self.checkpoint.Save()
+
+        self._LogProgress(stats, time.monotonic() - start)
+        return stats
+
+    def _LogProgress(self, stats :dict, elapsed :float):
+        processed = stats['resolved'] + stats['unresolved'] + stats['failed']
+        throughput = processed / elapsed if elapsed > 0 else 0.0
+        remaining = (stats['total'] - processed) / throughput if throughput > 0 else 0.0
+        self.logger.info(f"補完進度 {processed}/{stats['total']}: 成功{stats['resolved']}, 未有賽果{stats['unresolved']}, 失敗{stats['failed']}, 放棄{stats['gave_up']}. "
+                         f"每秒{throughput:.1f}場, 尚餘約{remaining:.0f}秒")
@@ -0,0 +1,210 @@
+import numpy as np
+from typing import List
+from DataAccess.ResultDto import ResultDto
+from DataAccess.ResultColumns import ResultColumns, MISSING_INT
+from DataAccess.HistoricalOddsIndex import HALF_TIME, FULL_TIME
+
+ODD_INCREMENT_BOUNDS = np.array([1.5, 1.65, 1.8, 2.05, 2.4])
+ODD_INCREMENTS = np.array([0.03, 0.05, 0.07, 0.09, 0.15, 0.2])
+MIN_SIMILAR_MATCHES = 4
+GROUP_KEY_SCALE = 1000.0
+BAND_EPSILON = 1e-6
+MAX_PAIRS_PER_CHUNK = 4000000
+
+def GetOddIncrements(odds :np.ndarray) -> np.ndarray:
+    return ODD_INCREMENTS[np.searchsorted(ODD_INCREMENT_BOUNDS, odds, side='right')]
+
+class HalfColumns:
+    def __init__(self, dtos :List[ResultDto], half :str):
+        self.half = half
+        if isinstance(dtos, ResultColumns):
+            self._FromResultColumns(dtos)
+            return
+
+        rows = []
+        for dto in dtos:
+            minute = dto.ht_time if half == HALF_TIME else dto.ft_time
+            success = dto.ht_success if half == HALF_TIME else dto.ft_success
+            if minute is None or success is None:
+                continue
+            if dto.ht_prematch_goalline is None or dto.ft_prematch_goalline is None:
+                continue
+            if dto.ht_prematch_odd is None or dto.ft_prematch_odd is None:
+                continue
+            rows.append((dto.ht_prematch_goalline, dto.ft_prematch_goalline, minute, dto.ht_prematch_odd, dto.ft_prematch_odd, success))
+
+        if len(rows) == 0:
+            rows_by_column = [[] for _ in range(6)]
+        else:
+            rows_by_column = list(zip(*rows))
+        self.ht_line = np.asarray(rows_by_column[0], dtype=object)
+        self.ft_line = np.asarray(rows_by_column[1], dtype=object)
+        self.minute = np.asarray(rows_by_column[2], dtype=np.int64)
+        self.ht_odd = np.asarray(rows_by_column[3], dtype=np.float64)
+        self.ft_odd = np.asarray(rows_by_column[4], dtype=np.float64)
+        self.success = np.asarray(rows_by_column[5], dtype=np.int64)
+
+    def _FromResultColumns(self, results :ResultColumns):
+        minute = results.ht_time if self.half == HALF_TIME else results.ft_time
+        success = results.ht_success if self.half == HALF_TIME else results.ft_success
+        mask = ((minute != MISSING_INT) & (success != MISSING_INT) &
+                (results.ht_prematch_goalline != None) & (results.ft_prematch_goalline != None) &
+                ~np.isnan(results.ht_prematch_odd) & ~np.isnan(results.ft_prematch_odd))
+        self.ht_line = results.ht_prematch_goalline[mask]
+        self.ft_line = results.ft_prematch_goalline[mask]
+        self.minute = minute[mask].astype(np.int64)
+        self.ht_odd = results.ht_prematch_odd[mask]
+        self.ft_odd = results.ft_prematch_odd[mask]
+        self.success = success[mask].astype(np.int64)
+
+    def __len__(self):
+        return len(self.minute)
+
+def CountSimilarMatches(columns :HalfColumns) -> tuple:
+    size = len(columns)
+    if size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return (empty, empty, empty)
+
+    _, ht_code = np.unique(columns.ht_line.astype(str), return_inverse=True)
+    _, ft_code = np.unique(columns.ft_line.astype(str), return_inverse=True)
+    order = np.lexsort((columns.ht_odd, columns.minute, ft_code, ht_code))
+    group_keys = np.stack([ht_code[order], ft_code[order], columns.minute[order]], axis=1)
+    _, group_id = np.unique(group_keys, axis=0, return_inverse=True)
+    group_id = group_id.reshape(-1)
+
+    ht_odd = columns.ht_odd[order]
+    ft_odd = columns.ft_odd[order]
+    has_goal = columns.success[order] > 0
+    has_two_goals = columns.success[order] > 1
+    ht_increment = GetOddIncrements(ht_odd)
+    ft_increment = GetOddIncrements(ft_odd)
+
+    sort_key = group_id * GROUP_KEY_SCALE + ht_odd
+    lower = np.searchsorted(sort_key, sort_key - ht_increment - BAND_EPSILON, side='left')
+    upper = np.searchsorted(sort_key, sort_key + ht_increment + BAND_EPSILON, side='right')
+    counts = upper - lower
+
+    total = np.zeros(size, dtype=np.int64)
+    success = np.zeros(size, dtype=np.int64)
+    two_ball_success = np.zeros(size, dtype=np.int64)
+
+    chunk_start = 0
+    cumulative = np.cumsum(counts)
+    while chunk_start < size:
+        offset = cumulative[chunk_start - 1] if chunk_start > 0 else 0
+        chunk_end = int(np.searchsorted(cumulative, offset + MAX_PAIRS_PER_CHUNK, side='right'))
+        chunk_end = min(max(chunk_end, chunk_start + 1), size)
+
+        chunk_counts = counts[chunk_start:chunk_end]
+        query = np.repeat(np.arange(chunk_start, chunk_end), chunk_counts)
+        starts = np.cumsum(chunk_counts) - chunk_counts
+        candidate = np.repeat(lower[chunk_start:chunk_end], chunk_counts) + (np.arange(len(query)) - np.repeat(starts, chunk_counts))
+
+        similar = ((candidate != query) &
+                   (ht_odd[query] <= ht_odd[candidate] + ht_increment[query]) &
+                   (ht_odd[query] >= ht_odd[candidate] - ht_increment[query]) &
+                   (ft_odd[query] <= ft_odd[candidate] + ft_increment[query]) &
+                   (ft_odd[query] >= ft_odd[candidate] - ft_increment[query]))
+        query = query[similar]
+        candidate = candidate[similar]
+        total += np.bincount(query, minlength=size)
+        success += np.bincount(query, weights=has_goal[candidate], minlength=size).astype(np.int64)
+        two_ball_success += np.bincount(query, weights=has_two_goals[candidate], minlength=size).astype(np.int64)
+        chunk_start = chunk_end
+
+    inverse = np.empty(size, dtype=np.int64)
+    inverse[order] = np.arange(size)
+    return (success[inverse], two_ball_success[inverse], total[inverse])
+
+def _HitRate(hits :np.ndarray, mask :np.ndarray) -> tuple:
+    count = int(mask.sum())
+    if count == 0:
+        return (0.0, 0)
+    return (float(hits[mask].mean() * 100), count)
+
+def RunBacktest(dtos) -> dict:
+    report = {}
+    for half in (HALF_TIME, FULL_TIME):
+        columns = HalfColumns(dtos, half)
+        success, two_ball_success, total = CountSimilarMatches(columns)
+
+        covered = total >= MIN_SIMILAR_MATCHES
+        rate = np.divide(success * 100.0, total, out=np.zeros(len(columns)), where=total > 0)
+        decided = covered & (rate != 50)
+        actual = columns.success > 0
+        hits = (rate > 50) == actual
+
+        by_minute = {}
+        for minute in np.unique(columns.minute[decided]):
+            by_minute[int(minute)] = _HitRate(hits, decided & (columns.minute == minute))
+
+        by_goal_line = {}
+        goal_lines = columns.ht_line.astype(str) + ' / ' + columns.ft_line.astype(str)
+        for goal_line in np.unique(goal_lines[decided]):
+            by_goal_line[str(goal_line)] = _HitRate(hits, decided & (goal_lines == goal_line))
+
+        calibration = []
+        bins = np.minimum((rate // 10).astype(np.int64), 9)
+        for band in range(10):
+            mask = covered & (bins == band)
+            count = int(mask.sum())
+            if count == 0:
+                continue
+            calibration.append((band * 10, band * 10 + 10, float(rate[mask].mean()), float(actual[mask].mean() * 100), count))
+
+        report[half] = {
+            'records': len(columns),
+            'covered': int(covered.sum()),
+            'hit_rate': _HitRate(hits, decided),
+            'by_minute': by_minute,
+            'by_goal_line': by_goal_line,
+            'calibration': calibration,
+        }
+    return report
+
+def FormatReport(report :dict) -> str:
+    lines = []
+    for half, result in report.items():
+        lines.append(f"===={'半場' if half == HALF_TIME else '全場'}回測====")
+        lines.append(f"紀錄 {result['records']}, 有足夠類似賽事 {result['covered']}")
+        lines.append(f"整體命中 {result['hit_rate'][0]:.2f}% (共{result['hit_rate'][1]}場次)")
+        lines.append("按時間:")
+        for minute, (rate, count) in result['by_minute'].items():
+            lines.append(f"  {minute}': {rate:.2f}% (共{count}場次)")
+        lines.append("按中位數:")
+        for goal_line, (rate, count) in result['by_goal_line'].items():
+            lines.append(f"  {goal_line}: {rate:.2f}% (共{count}場次)")
+        lines.append("校準 (預測成功率 -> 實際入球率):")
+        for low, high, predicted, actual, count in result['calibration']:
+            lines.append(f"  {low}-{high}%: {predicted:.2f}% -> {actual:.2f}% (共{count}場次)")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) > 1:
+        import random
+        random.seed(20240122)
+        dtos = []
+        for i in range(int(sys.argv[1])):
+            dto = ResultDto(i, random.randint(10, 45), round(random.uniform(2.0, 2.15), 2))
+            dto.ht_prematch_goalline = random.choice(['0.5/1.0', '1.0/1.5', '1.5'])
+            dto.ft_prematch_goalline = random.choice(['2.0/2.5', '2.5', '2.5/3.0', '3.0/3.5'])
+            dto.ht_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+            dto.ft_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+            dto.ht_success = random.randint(0, 3)
+            dto.ft_time = random.randint(46, 90)
+            dto.ft_success = random.randint(0, 4)
+            dtos.append(dto)
+    else:
+        import Config
+        from LoggerFactory import LoggerFactory
+        from DataAccess.ResultRepository import ResultRepository
+        dtos = ResultRepository(Config.CONNECTION_STRING, LoggerFactory("Backtest_Logs"), backend=getattr(Config, 'RESULT_STORE_BACKEND', None)).GetResultColumns()
+
+    start = time.perf_counter()
+    report = RunBacktest(dtos)
+    print(FormatReport(report))
+    print(f"回測{len(dtos)}項紀錄, 用時{time.perf_counter() - start:.2f}秒")
@@ -0,0 +1,179 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+import pytz
+from Crawler import Crawler, SiteApi
+from Fetcher import Fetcher, RESULT_DELAY
+from BackfillRunner import BackfillRunner, BackfillCheckpoint
+from ResponseCache import ResponseCache
+from OddsTimeSeries import OddsSeriesWriter
+from TrafficArchive import RecordedResponse, ReplaySessionPool, AsyncReplaySessionPool, LoadArchive
+from DataAccess.ResultDto import ResultDto, ToMatchDate, HONG_KONG_TZ
+from Metrics import REGISTRY
+
+MATCH_COUNTS = (10, 50, 200)
+HISTORY_SIZE = 5000
+HKJC_LATENCY_SECONDS = 0.15
+G10OAL_LATENCY_SECONDS = 0.4
+HT_GOAL_LINES = ['0.5/1.0', '1.0/1.5', '1.5']
+FT_GOAL_LINES = ['2.0/2.5', '2.5', '2.5/3.0', '3.0/3.5']
+
+def _OddsRows(rng :random.Random, goal_lines :List[str], count :int) -> str:
+    rows = []
+    for i in range(count):
+        row_class = ' class="table-secondary"' if i == 0 else ''
+        rows.append(f'<tr{row_class}>\n<td class="text-center">{rng.uniform(1.6, 2.4):.2f}</td> <td class="text-center">{rng.choice(goal_lines)}</td>\n'
+                    f'<td class="text-center">{rng.uniform(1.6, 2.4):.2f}</td><td>12:00</td></tr>')
+    return ''.join(rows)
+
+def BuildMatchPage(rng :random.Random) -> str:
+    ht_goals = rng.randint(0, 2)
+    ft_goals = ht_goals + rng.randint(0, 2)
+    tables = ''
+    for table_name, goal_lines in (('fhl', HT_GOAL_LINES), ('hil', FT_GOAL_LINES)):
+        tables += (f'<a name="{table_name}"></a>\n<h5>{table_name}</h5>\n<div class="table-responsive"><table class="table"><thead><tr><th>x</th></tr></thead>'
+                   f'<tbody>{_OddsRows(rng, goal_lines, 12)}</tbody></table></div>\n')
+    return (f'<html><head><title>g10oal</title></head><body><div class="container"><div class="row text-center">賽事</div>\n'
+            f'<div class="col text-center"><div class="lead">{ft_goals} - 0</div><div class="text-muted"><small>({ht_goals} - 0)</small></div>全場已完</div>\n'
+            f'{tables}</div></body></html>')
+
+def BuildSyntheticArchive(match_count :int, seed :int = 0) -> List[RecordedResponse]:
+    rng = random.Random(seed)
+    kickoff = (datetime.now(tz=pytz.timezone('Asia/Hong_Kong')) - timedelta(minutes=30)).isoformat()
+    first_half = []
+    second_half = []
+    odds = []
+    pages = []
+    for i in range(match_count):
+        match_id = f'5000{i:04d}'
+        is_first_half = rng.random() < 0.7
+        pool = 'fhlodds' if is_first_half else 'hilodds'
+        live_odd = rng.uniform(2.0, 2.15) if rng.random() < 0.8 else rng.uniform(1.6, 1.99)
+        match = {
+            'matchID': match_id,
+            'matchDate': kickoff,
+            'matchState': 'FirstHalf' if is_first_half else 'SecondHalf',
+            'homeTeam': {'teamNameCH': f'主隊{i}'},
+            'awayTeam': {'teamNameCH': f'客隊{i}'},
+            'accumulatedscore': [],
+        }
+        (first_half if is_first_half else second_half).append(match)
+        odds.append({
+            'matchID': match_id,
+            'matchDate': kickoff,
+            'inplayPools': [pool.upper()],
+            pool: {'LINELIST': [{'LINE': '0.5/1.0', 'H': f'100@{live_odd:.2f}', 'L': f'100@{rng.uniform(1.6, 1.9):.2f}'}]},
+        })
+        pages.append(RecordedResponse(f'{SiteApi.G10OAL.value}{SiteApi.G10OAL_Odd_Api.value.format(match_id)}', 200,
+                                      BuildMatchPage(rng).encode('utf-8'), 'utf-8', 'text/html', G10OAL_LATENCY_SECONDS))
+
+    def JsonResponse(site_api :str, body) -> RecordedResponse:
+        return RecordedResponse(f'{SiteApi.HKJC.value}{site_api}', 200, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'utf-8', 'application/json', HKJC_LATENCY_SECONDS)
+
+    return [JsonResponse(SiteApi.HKJC_All_Odd_Api.value, {'matches': odds}),
+            JsonResponse(SiteApi.HKJC_Result_Api.value, [{'matches': second_half}, {'matches': first_half}])] + pages
+
+def BuildHistory(size :int, seed :int = 0) -> List[ResultDto]:
+    rng = random.Random(seed)
+    now = datetime.now()
+    dtos = []
+    for i in range(size):
+        dto = ResultDto(f'H{i}', rng.randint(0, 45), round(rng.uniform(2.0, 2.15), 2))
+        dto.ht_prematch_goalline = rng.choice(HT_GOAL_LINES)
+        dto.ft_prematch_goalline = rng.choice(FT_GOAL_LINES)
+        dto.ht_prematch_odd = round(rng.uniform(1.6, 2.4), 2)
+        dto.ft_prematch_odd = round(rng.uniform(1.6, 2.4), 2)
+        dto.ht_success = rng.randint(0, 3)
+        dto.ft_time = rng.randint(46, 90)
+        dto.ft_success = rng.randint(0, 4)
+        dto.ht_prob = round(rng.uniform(0, 100), 2)
+        dto.ht_pred = rng.randint(0, 1)
+        dto.match_date = now - timedelta(days=rng.randint(0, 30))
+        dtos.append(dto)
+    return dtos
+
+def RunScenario(responses :List[RecordedResponse], loggerFactory, cycles :int = 5, latency_scale :float = 0, use_async :bool = True) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        sync_pool = ReplaySessionPool(responses, latency_scale)
+        async_pool = AsyncReplaySessionPool(responses, latency_scale)
+        crawler = Crawler(loggerFactory, sync_pool, async_pool, ResponseCache(os.path.join(directory, 'response_cache')))
+        fetcher = Fetcher(':memory:', loggerFactory, crawler=crawler)
+        fetcher.odds_recorder = OddsSeriesWriter(os.path.join(directory, 'odds_series'))
+        fetcher.backfill_runner = BackfillRunner(loggerFactory, BackfillCheckpoint(os.path.join(directory, 'backfill_checkpoint.json')), rate_per_second=1000)
+        fetcher.repository.BulkUpsert(BuildHistory(HISTORY_SIZE))
+        fetcher.repository.GetResults(False)
+
+        cycle_seconds = []
+        requests_per_cycle = []
+        notifications = []
+        match_seconds = []
+        for _ in range(cycles):
+            REGISTRY.Reset()
+            requests_before = sync_pool.request_count + async_pool.request_count
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = asyncio.run(fetcher.FindMatchAsync()) if use_async else fetcher.FindMatch()
+            cycle_seconds.append(time.perf_counter() - start)
+            requests_per_cycle.append(sync_pool.request_count + async_pool.request_count - requests_before)
+            notifications.append(len(results))
+            match_seconds.extend(REGISTRY.GetMatchValues('fetcher_match_seconds'))
+
+        # the replayed matches kicked off 30 minutes ago, so backfill as of once their results are due
+        results_due_at = ToMatchDate(datetime.now(tz=HONG_KONG_TZ)) + RESULT_DELAY
+        start = time.perf_counter()
+        backfill = fetcher.FillMatchResults(results_due_at)
+        backfill_seconds = time.perf_counter() - start
+        fetcher.repository.Close()
+        fetcher.odds_recorder.Close()
+        fetcher.executor.shutdown()
+
+    match_seconds = np.asarray(match_seconds) if len(match_seconds) > 0 else np.zeros(1)
+    return {
+        'cycles': cycles,
+        'first_cycle_seconds': cycle_seconds[0],
+        'steady_cycle_seconds': float(np.mean(cycle_seconds[1:])) if cycles > 1 else cycle_seconds[0],
+        'requests_per_cycle': float(np.mean(requests_per_cycle)),
+        'first_cycle_requests': requests_per_cycle[0],
+        'notifications': notifications[0],
+        'match_p50_seconds': float(np.percentile(match_seconds, 50)),
+        'match_p99_seconds': float(np.percentile(match_seconds, 99)),
+        'backfill_seconds': backfill_seconds,
+        'backfill': backfill,
+        'replay_misses': sync_pool.miss_count + async_pool.miss_count,
+    }
+
+def FormatResult(label :str, result :dict) -> str:
+    return (f"{label}: 首次週期 {result['first_cycle_seconds'] * 1000:.1f}ms ({result['first_cycle_requests']}請求, {result['notifications']}通知), "
+            f"其後週期 {result['steady_cycle_seconds'] * 1000:.1f}ms, 平均 {result['requests_per_cycle']:.1f}請求/週期, "
+            f"每場 p50 {result['match_p50_seconds'] * 1000:.2f}ms p99 {result['match_p99_seconds'] * 1000:.2f}ms, "
+            f"補完賽果 {result['backfill']['resolved']}/{result['backfill']['total']}場 {result['backfill_seconds'] * 1000:.1f}ms, 未錄製請求 {result['replay_misses']}")
+
+if __name__ == "__main__":
+    import sys
+    from LoggerFactory import LoggerFactory
+
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    latency_scale = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    archive_path = sys.argv[3] if len(sys.argv) > 3 else None
+    loggerFactory = LoggerFactory("Benchmark_Logs")
+
+    if archive_path is not None:
+        scenarios = [(f"錄製檔 {archive_path}", LoadArchive(archive_path))]
+    else:
+        scenarios = [(f"{count}場即場賽事", BuildSyntheticArchive(count)) for count in MATCH_COUNTS]
+
+    print(f"週期: {cycles}, 延遲倍數: {latency_scale}")
+    for label, responses in scenarios:
+        for use_async in (False, True):
+            result = RunScenario(responses, loggerFactory, cycles, latency_scale, use_async)
+            if archive_path is None:
+                assert result['backfill']['resolved'] > 0 and result['backfill']['resolved'] == result['backfill']['total'], f"補完賽果未有全部完成: {result['backfill']}"
+            print(FormatResult(f"{label} ({'async' if use_async else 'threads'})", result))
@@ -1,141 +1,127 @@
 from enum import Enum
 import requests
 import json
-import bs4
-import Utils
+import G10oalParser
 import time
+import asyncio
+from HttpSessionPool import HttpSessionPool, AsyncSessionPool
+from ResponseCache import ResponseCache
+from TrafficArchive import TrafficRecorder
+from Metrics import REGISTRY
+from OddsSnapshot import FindLineOdd, LIVE_ODDS_LINE
 
 class Crawler:
-    def __init__(self, loggerFactory):
+    def __init__(self, loggerFactory, session_pool :HttpSessionPool = None, async_session_pool :AsyncSessionPool = None, response_cache :ResponseCache = None, recorder :TrafficRecorder = None):
         self.logger = loggerFactory.getLogger("Crawler")
+        self.recorder = recorder
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.session_pool = session_pool if session_pool is not None else HttpSessionPool(response_cache=self.response_cache)
+        self.async_session_pool = async_session_pool if async_session_pool is not None else AsyncSessionPool(response_cache=self.response_cache)
     
     def GetWebsiteData(self, site_domain :str, site_api :str) -> requests.Response:
         try:
-            session = requests.Session()
-            r = session.get(site_domain)
-            
-            header = {"referer": site_domain, 
-                "user-agent": 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'}
-
-            liveMatches_url = f'{site_domain}{site_api}'
-            result = session.post(
-                liveMatches_url,
-                headers=header,
-                cookies=r.cookies
-            )
+            with REGISTRY.Time('crawler_request_seconds', site=site_domain) as timer:
+                result = self.session_pool.Post(site_domain, site_api)
+            self._Record(site_domain, site_api, result, timer.elapsed)
             return result
+        except requests.exceptions.ConnectionError:
+            self.logger.debug(f"連線{site_domain}失敗, 將重設連線")
+            self.session_pool.Reset(site_domain)
+            raise
         except ConnectionError:
             print("Connection error, retrying.")
             time.sleep(1)
             return self.GetWebsiteData(site_domain, site_api)
 
+    async def GetWebsiteDataAsync(self, site_domain :str, site_api :str):
+        with REGISTRY.Time('crawler_request_seconds', site=site_domain) as timer:
+            result = await self.async_session_pool.Post(site_domain, site_api)
+        self._Record(site_domain, site_api, result, timer.elapsed)
+        return result
+
+    def _Record(self, site_domain :str, site_api :str, result, elapsed :float):
+        if self.recorder is None:
+            return
+        try:
+            self.recorder.Record(f'{site_domain}{site_api}', result, elapsed)
+        except Exception as ex:
+            self.logger.error(f"錄製{site_domain}{site_api}回應失敗. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+
+    def GetConnectionStats(self) -> dict:
+        return {'sync': self.session_pool.GetStats(), 'async': self.async_session_pool.GetStats(), 'cache': self.response_cache.GetStats()}
+
     def GetMatchResults(self, match_id:str) -> dict:
         result = self.GetWebsiteData(SiteApi.G10OAL.value, SiteApi.G10OAL_Odd_Api.value.format(match_id)).text
-        soup = bs4.BeautifulSoup(result, "html.parser")
-        score_board = soup.findAll('div', class_=lambda c: c == 'text-center')[1]
-        to_return = {}
-        if '場已完' in score_board.text or 'FT 90' in score_board.text:
-            ft_score :str = score_board.find('div', class_='lead').text
-            ht_score :str = score_board.find('div', class_='text-muted').find('small').text
-            to_return['ht'] = Utils.GetGoals(ht_score)
-            to_return['ft'] = Utils.GetGoals(ft_score)
-        return to_return
+        return self.ParseMatchResults(result)
+
+    def ParseMatchResults(self, result :str) -> dict:
+        return G10oalParser.ParseMatchResults(result)
         
+    def GetMatchPage(self, match_id:str) -> tuple:
+        site_api = SiteApi.G10OAL_Odd_Api.value.format(match_id)
+        url = f'{SiteApi.G10OAL.value}{site_api}'
+        result = self.response_cache.GetPermanent(url)
+        if result is not None:
+            with REGISTRY.Time('crawler_parse_seconds', match_id, page='match'):
+                return G10oalParser.ParseMatchPage(result)
+        
+        result = self.GetWebsiteData(SiteApi.G10OAL.value, site_api).text
+        with REGISTRY.Time('crawler_parse_seconds', match_id, page='match'):
+            page = G10oalParser.ParseMatchPage(result)
+        if len(page[0]) > 0:
+            self.response_cache.PutPermanent(url, result)
+        return page
+
     def GetPreMatchOdds(self, match_id:str) -> dict:
         result = self.GetWebsiteData(SiteApi.G10OAL.value, SiteApi.G10OAL_Odd_Api.value.format(match_id)).text
-        soup = bs4.BeautifulSoup(result, "html.parser")
-        
-        wanted_odds = {'ht':{}, 'ft':{}}
-        fhl_table = soup.find("a", {"name" : 'fhl'}).next_sibling.next_sibling.next_sibling.next_sibling
-        fhl_tbody = fhl_table.find("tbody")
-        fhl_odds = fhl_tbody.find_all("tr", class_=lambda c: c != "table-secondary")
-        check_median = 999.0
-        for odd in fhl_odds:
-            goalLines = odd.find_all("td", class_="text-center")
-            goalLine = goalLines[1].text
-            
-            highOdd = float(goalLines[0].text)
-            
-            if goalLine in wanted_odds['ht'].keys():
-                if wanted_odds['ht'][goalLine][0] > highOdd:
-                    wanted_odds['ht'][goalLine] = (wanted_odds['ht'][goalLine][0], True)
-                elif wanted_odds['ht'][goalLine][0] < highOdd: 
-                    wanted_odds['ht'][goalLine] = (wanted_odds['ht'][goalLine][0], False)
-                continue
-            
-            lowOdd = float(goalLines[2].text)
-            median = abs(highOdd - lowOdd)
-            if median < check_median:
-                check_median = median
-                wanted_odds['ht'].clear()
-                wanted_odds['ht'][goalLine] = (highOdd, None)
-        
-        hil_table = soup.find("a", {"name" : 'hil'}).next_sibling.next_sibling.next_sibling.next_sibling
-        hil_tbody = hil_table.find("tbody")
-        hil_odds = hil_tbody.find_all("tr", class_=lambda c: c != "table-secondary")
-        check_median = 999.0
-        for odd in hil_odds:
-            goalLines = odd.find_all("td", class_="text-center")
-            goalLine = goalLines[1].text
-            
-            highOdd = float(goalLines[0].text)
-            
-            if goalLine in wanted_odds['ft'].keys():
-                if wanted_odds['ft'][goalLine][0] > highOdd:
-                    wanted_odds['ft'][goalLine] = (wanted_odds['ft'][goalLine][0], True)
-                elif wanted_odds['ft'][goalLine][0] < highOdd:
-                    wanted_odds['ft'][goalLine] = (wanted_odds['ft'][goalLine][0], False)
-                continue
-            
-            lowOdd = float(goalLines[2].text)
-            median = abs(highOdd - lowOdd)
-            if median < check_median:
-                check_median = median
-                wanted_odds['ft'].clear()
-                wanted_odds['ft'][goalLine] = (highOdd, None)
-                    
-        return wanted_odds
+        with REGISTRY.Time('crawler_parse_seconds', match_id, page='prematch_odds'):
+            return self.ParsePreMatchOdds(result)
+
+    async def GetPreMatchOddsAsync(self, match_id:str) -> dict:
+        result = (await self.GetWebsiteDataAsync(SiteApi.G10OAL.value, SiteApi.G10OAL_Odd_Api.value.format(match_id))).text
+        with REGISTRY.Time('crawler_parse_seconds', match_id, page='prematch_odds'):
+            return await asyncio.to_thread(self.ParsePreMatchOdds, result)
+
+    def ParsePreMatchOdds(self, result :str) -> dict:
+        return G10oalParser.ParsePreMatchOdds(result)
         
-    def GetLiveTimeOdds(self, match_id:str) -> float:
-        result = self.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_Odd_Api.value.format(match_id))
+    def _FindLiveTimeOdds(self, result, match_id:str, line :str = LIVE_ODDS_LINE) -> float:
+        match_response = result.json()
+        try:
+            match_data = next(item for item in match_response['matches'] if item["matchID"] == match_id)
+        except:
+            return None
+        return FindLineOdd(match_data, line)
         
-        e = True
+    def GetLiveTimeOdds(self, match_id:str, line :str = LIVE_ODDS_LINE) -> float:
         trial = 1
-        while e:
+        while True:
             try:
-                match_response = result.json()
-                try:
-                    match_data = next(item for item in match_response['matches'] if item["matchID"] == match_id)
-                except:
-                    return
-                if 'fhlodds' in match_data:
-                    for line in match_data['fhlodds']['LINELIST']:
-                        if line['LINE'] != '0.5/1.0':
-                            continue
-                        odd = float(line['H'][4:])
-                        return odd
-                if 'hilodds' in match_data:
-                    for line in match_data['hilodds']['LINELIST']:
-                        if line['LINE'] != '0.5/1.0':
-                            continue
-                        odd = float(line['H'][4:])
-                        return odd
-                
-                e = False
+                result = self.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_Odd_Api.value.format(match_id))
+                return self._FindLiveTimeOdds(result, match_id, line)
             except ConnectionError:
                 print("Current connection is not available, aborting process. ")
-                e = False
-                break
+                return -1
             except json.decoder.JSONDecodeError:
                 if trial > 20:
                     print(f"Match {match_id} was unable to retrieve. Giving up.")
-                    e = False
-                    break
-                
-                e = True
+                    return -1
+                trial += 1
+
+    async def GetLiveTimeOddsAsync(self, match_id:str, line :str = LIVE_ODDS_LINE) -> float:
+        trial = 1
+        while True:
+            try:
+                result = await self.GetWebsiteDataAsync(SiteApi.HKJC.value, SiteApi.HKJC_Odd_Api.value.format(match_id))
+                return self._FindLiveTimeOdds(result, match_id, line)
+            except ConnectionError:
+                print("Current connection is not available, aborting process. ")
+                return -1
+            except json.decoder.JSONDecodeError:
+                if trial > 20:
+                    print(f"Match {match_id} was unable to retrieve. Giving up.")
+                    return -1
                 trial += 1
-                result = self.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_Odd_Api.value.format(match_id))
-        return -1
 
 class SiteApi(Enum):
     G10OAL = 'http://g10oal.com'
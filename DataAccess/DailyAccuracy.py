@@ -0,0 +1,106 @@
+import threading
+from typing import List
+import numpy as np
+from .ResultDto import ResultDto
+
+SECONDS_IN_DAY = 86400
+HONG_KONG_UTC_OFFSET = 8 * 3600
+PROBABILITY = 'prob'
+PREDICT_YES = 'yes'
+PREDICT_NO = 'no'
+KINDS = (PROBABILITY, PREDICT_YES, PREDICT_NO)
+
+def GetContributions(dto :ResultDto) -> tuple:
+    prob_correct = 0
+    prob_total = 0
+    for prob, success in ((dto.ht_prob, dto.ht_success), (dto.ft_prob, dto.ft_success)):
+        if prob is None or success is None:
+            continue
+        if (prob > 50 and success) or (prob < 50 and not success):
+            prob_correct += 1
+        if prob != 50:
+            prob_total += 1
+
+    yes_correct = yes_total = no_correct = no_total = 0
+    if dto.ht_pred is not None and dto.ht_success is not None:
+        if dto.ht_pred:
+            yes_correct = 1 if dto.ht_success >= 1 else 0
+            yes_total = 1
+        else:
+            no_correct = 1 if not dto.ht_success else 0
+            no_total = 1
+    return (prob_correct, prob_total, yes_correct, yes_total, no_correct, no_total)
+
+class DailyAccuracy:
+    def __init__(self):
+        self.__entries = {}
+        self.__lock = threading.Lock()
+        self.__timestamps = np.zeros(0, dtype=np.float64)
+        self.__prefix = np.zeros((1, 6), dtype=np.int64)
+        self.__dirty = False
+        self.version = 0
+
+    def _GetEntry(self, dto :ResultDto) -> tuple:
+        if dto.match_date is None:
+            return None
+        contributions = GetContributions(dto)
+        if not any(contributions):
+            return None
+        return (dto.match_date, contributions)
+
+    def Rebuild(self, dtos :List[ResultDto]):
+        with self.__lock:
+            self.__entries = {}
+            for dto in dtos:
+                entry = self._GetEntry(dto)
+                if entry is not None:
+                    self.__entries[dto.hkjc_id] = entry
+            self.__dirty = True
+            self.version += 1
+
+    def Update(self, dto :ResultDto):
+        entry = self._GetEntry(dto)
+        with self.__lock:
+            if entry is None:
+                if self.__entries.pop(dto.hkjc_id, None) is None:
+                    return
+            elif self.__entries.get(dto.hkjc_id) == entry:
+                return
+            else:
+                self.__entries[dto.hkjc_id] = entry
+            self.__dirty = True
+            self.version += 1
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def _Refresh(self):
+        if not self.__dirty:
+            return
+        entries = list(self.__entries.values())
+        if len(entries) == 0:
+            self.__timestamps = np.zeros(0, dtype=np.float64)
+            self.__prefix = np.zeros((1, 6), dtype=np.int64)
+        else:
+            dates = np.array([x[0] for x in entries], dtype='datetime64[us]')
+            timestamps = dates.astype(np.int64) / 1e6 - HONG_KONG_UTC_OFFSET
+            counts = np.array([x[1] for x in entries], dtype=np.int64)
+            order = np.argsort(timestamps, kind='stable')
+            self.__timestamps = timestamps[order]
+            self.__prefix = np.vstack([np.zeros((1, 6), dtype=np.int64), np.cumsum(counts[order], axis=0)])
+        self.__dirty = False
+
+    def GetDailyRates(self, now_timestamp :float, days :int, kind :str) -> List[tuple]:
+        column = KINDS.index(kind) * 2
+        with self.__lock:
+            self._Refresh()
+            timestamps = self.__timestamps
+            prefix = self.__prefix
+        # day N covers matches with N*24h <= now - match_date < (N+1)*24h
+        edges = now_timestamp - np.arange(days + 1) * SECONDS_IN_DAY
+        positions = np.searchsorted(timestamps, edges, side='right')
+        upper = positions[:-1]
+        lower = positions[1:]
+        correct = prefix[upper, column] - prefix[lower, column]
+        total = prefix[upper, column + 1] - prefix[lower, column + 1]
+        return [((c / t) * 100 if t != 0 else 0, int(t)) for c, t in zip(correct.tolist(), total.tolist())]
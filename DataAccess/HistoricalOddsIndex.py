@@ -0,0 +1,191 @@
+from bisect import bisect_left, bisect_right
+import threading
+from typing import List
+from .ResultDto import ResultDto
+
+HALF_TIME = 'ht'
+FULL_TIME = 'ft'
+BAND_EPSILON = 1e-6
+
+class OddsBucket:
+    def __init__(self):
+        self.ht_odds = []
+        self.records = []
+
+    def Add(self, ht_odd :float, record :tuple):
+        position = bisect_right(self.ht_odds, ht_odd)
+        self.ht_odds.insert(position, ht_odd)
+        self.records.insert(position, record)
+
+    def Remove(self, ht_odd :float, hkjc_id) -> bool:
+        start = bisect_left(self.ht_odds, ht_odd)
+        end = bisect_right(self.ht_odds, ht_odd)
+        for position in range(start, end):
+            if self.records[position][0] == hkjc_id:
+                del self.ht_odds[position]
+                del self.records[position]
+                return True
+        return False
+
+    def GetRange(self, low :float, high :float) -> tuple:
+        start = bisect_left(self.ht_odds, low)
+        end = bisect_right(self.ht_odds, high)
+        return (self.ht_odds[start:end], self.records[start:end])
+
+class HistoricalOddsIndex:
+    def __init__(self):
+        self.__buckets = {}
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def _GetEntries(self, dto :ResultDto) -> List[tuple]:
+        if dto.ht_prematch_goalline is None or dto.ft_prematch_goalline is None:
+            return []
+        if dto.ht_prematch_odd is None or dto.ft_prematch_odd is None:
+            return []
+        entries = []
+        if dto.ht_time is not None and dto.ht_success is not None:
+            key = (dto.ht_prematch_goalline, dto.ft_prematch_goalline, HALF_TIME, dto.ht_time)
+            entries.append((key, dto.ht_prematch_odd, (dto.hkjc_id, dto.ft_prematch_odd, dto.ht_success)))
+        if dto.ft_time is not None and dto.ft_success is not None:
+            key = (dto.ht_prematch_goalline, dto.ft_prematch_goalline, FULL_TIME, dto.ft_time)
+            entries.append((key, dto.ht_prematch_odd, (dto.hkjc_id, dto.ft_prematch_odd, dto.ft_success)))
+        return entries
+
+    def _Remove(self, hkjc_id):
+        for key, ht_odd, _ in self.__entries.pop(hkjc_id, []):
+            bucket = self.__buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.Remove(ht_odd, hkjc_id)
+            if len(bucket.records) == 0:
+                del self.__buckets[key]
+
+    def _Add(self, dto :ResultDto):
+        entries = self._GetEntries(dto)
+        if len(entries) == 0:
+            return
+        for key, ht_odd, record in entries:
+            self.__buckets.setdefault(key, OddsBucket()).Add(ht_odd, record)
+        self.__entries[dto.hkjc_id] = entries
+
+    def Rebuild(self, dtos :List[ResultDto]):
+        with self.__lock:
+            grouped = {}
+            self.__entries = {}
+            for dto in dtos:
+                entries = self._GetEntries(dto)
+                if len(entries) == 0:
+                    continue
+                for key, ht_odd, record in entries:
+                    grouped.setdefault(key, []).append((ht_odd, record))
+                self.__entries[dto.hkjc_id] = entries
+            self.__buckets = {}
+            for key, items in grouped.items():
+                items.sort(key=lambda x: x[0])
+                bucket = OddsBucket()
+                bucket.ht_odds = [x[0] for x in items]
+                bucket.records = [x[1] for x in items]
+                self.__buckets[key] = bucket
+
+    def Update(self, dto :ResultDto):
+        with self.__lock:
+            self._Remove(dto.hkjc_id)
+            self._Add(dto)
+
+    def Remove(self, hkjc_id):
+        with self.__lock:
+            self._Remove(hkjc_id)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def Query(self, ht_line, ft_line, half :str, minute :int, ht_odd :float, ht_odd_increment :float, ft_odd :float, ft_odd_increment :float) -> tuple:
+        success = 0
+        two_ball_success = 0
+        total = 0
+        with self.__lock:
+            bucket = self.__buckets.get((ht_line, ft_line, half, minute))
+            if bucket is None:
+                return (success, two_ball_success, total)
+            candidate_ht_odds, candidates = bucket.GetRange(ht_odd - ht_odd_increment - BAND_EPSILON, ht_odd + ht_odd_increment + BAND_EPSILON)
+
+        for record_ht_odd, (_, record_ft_odd, record_success) in zip(candidate_ht_odds, candidates):
+            if (ht_odd <= record_ht_odd + ht_odd_increment and
+                ht_odd >= record_ht_odd - ht_odd_increment and
+                ft_odd <= record_ft_odd + ft_odd_increment and
+                ft_odd >= record_ft_odd - ft_odd_increment):
+                if record_success > 0:
+                    success += 1
+                if record_success > 1:
+                    two_ball_success += 1
+                total += 1
+        return (success, two_ball_success, total)
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    def Scan(records :List[ResultDto], ht_line, ft_line, is_first_half :bool, time_int :int, ht_odd, ht_odd_increment, ft_odd, ft_odd_increment) -> tuple:
+        success = 0
+        two_ball_success = 0
+        total = 0
+        match_goalline_records = [x for x in records if x.ht_prematch_goalline == ht_line and x.ft_prematch_goalline == ft_line]
+        for record in match_goalline_records:
+            record_time = record.ht_time if is_first_half else record.ft_time
+            record_success = record.ht_success if is_first_half else record.ft_success
+            if record_time is None or record_success is None:
+                continue
+            if (ht_odd <= record.ht_prematch_odd + ht_odd_increment and
+                ht_odd >= record.ht_prematch_odd - ht_odd_increment and
+                ft_odd <= record.ft_prematch_odd + ft_odd_increment and
+                ft_odd >= record.ft_prematch_odd - ft_odd_increment and
+                time_int == record_time):
+                if record_success > 0:
+                    success += 1
+                if record_success > 1:
+                    two_ball_success += 1
+                total += 1
+        return (success, two_ball_success, total)
+
+    random.seed(20240122)
+    ht_lines = ['0.5/1.0', '1.0/1.5', '1.5']
+    ft_lines = ['2.0/2.5', '2.5', '2.5/3.0', '3.0/3.5']
+    records = []
+    for i in range(100000):
+        dto = ResultDto(i, random.randint(10, 45), round(random.uniform(2.0, 2.15), 2))
+        dto.ht_prematch_goalline = random.choice(ht_lines)
+        dto.ft_prematch_goalline = random.choice(ft_lines)
+        dto.ht_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+        dto.ft_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+        dto.ht_success = random.randint(0, 3)
+        if random.random() < 0.5:
+            dto.ft_time = random.randint(46, 90)
+            dto.ft_success = random.randint(0, 4)
+        records.append(dto)
+
+    queries = []
+    for _ in range(500):
+        is_first_half = random.random() < 0.5
+        queries.append((random.choice(ht_lines), random.choice(ft_lines), is_first_half,
+                        random.randint(10, 45) if is_first_half else random.randint(46, 90),
+                        round(random.uniform(1.6, 2.4), 2), 0.09, round(random.uniform(1.6, 2.4), 2), 0.09))
+
+    start = time.perf_counter()
+    index = HistoricalOddsIndex()
+    index.Rebuild(records)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_results = [Scan(records, *query) for query in queries]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_results = [index.Query(q[0], q[1], HALF_TIME if q[2] else FULL_TIME, *q[3:]) for q in queries]
+    index_time = time.perf_counter() - start
+
+    assert scan_results == index_results
+    print(f"Rows: {len(records)}, queries: {len(queries)}")
+    print(f"Index build: {build_time * 1000:.1f} ms")
+    print(f"Linear scan: {scan_time / len(queries) * 1000:.3f} ms/query")
+    print(f"Index query: {index_time / len(queries) * 1000:.3f} ms/query")
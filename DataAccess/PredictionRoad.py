@@ -0,0 +1,195 @@
+import threading
+from bisect import bisect_left, insort
+from typing import List
+from .ResultDto import ResultDto
+
+ROAD_ROWS = 6
+ROAD_COLUMNS = 14
+TRIM_SLACK = 64
+CHECKPOINT_INTERVAL = 64
+MIN_PREDICTION_ID = 1060
+
+class RoadMap:
+    def __init__(self, rows :int = ROAD_ROWS, max_columns :int = ROAD_COLUMNS):
+        self.rows = rows
+        self.max_columns = max_columns
+        self.__columns = []
+        self.__offset = 0
+        self.__first_open = 0
+        self.__turns = {}
+
+    def __len__(self):
+        return self.__offset + len(self.__columns)
+
+    def Copy(self) -> 'RoadMap':
+        road = RoadMap(self.rows, self.max_columns)
+        road.__columns = [list(column) for column in self.__columns]
+        road.__offset = self.__offset
+        road.__first_open = self.__first_open
+        road.__turns = {column: list(turn) for column, turn in self.__turns.items()}
+        return road
+
+    def _Column(self, index :int) -> list:
+        return self.__columns[index - self.__offset]
+
+    def _AppendColumn(self):
+        self.__columns.append([None] * self.rows)
+
+    def _SetCell(self, index :int, row :int, success :bool):
+        self._Column(index)[row] = success
+        while self.__first_open < len(self) and self._Column(self.__first_open)[0] is not None:
+            self.__first_open += 1
+
+    def _Trim(self, latest :int):
+        keep_from = min(latest, len(self) - self.max_columns)
+        if keep_from - self.__offset < TRIM_SLACK:
+            return
+        del self.__columns[:keep_from - self.__offset]
+        self.__offset = keep_from
+
+    def _GetTurnRow(self, latest :int) -> int:
+        expired = [column for column, turn in self.__turns.items() if column < latest and column + turn[1] < latest]
+        for column in expired:
+            del self.__turns[column]
+
+        to_set_row = self.rows - 1
+        for column, turn in self.__turns.items():
+            if column == latest:
+                continue
+            if column + turn[1] >= latest:
+                to_set_row = turn[0] - 1
+        return max(to_set_row, 0)
+
+    def Add(self, success :bool):
+        if len(self) == 0:
+            self._AppendColumn()
+            self._SetCell(0, 0, success)
+            return
+
+        latest = max(self.__first_open - 1, 0)
+        if self._Column(latest)[0] != success:
+            latest += 1
+        if len(self) <= latest:
+            self._AppendColumn()
+        self._Trim(latest)
+
+        column = self._Column(latest)
+        for row in range(self.rows):
+            if column[row] is None:
+                self._SetCell(latest, row, success)
+                return
+
+        to_set_row = self._GetTurnRow(latest)
+        if not latest in self.__turns:
+            self.__turns[latest] = [to_set_row, 0]
+
+        extended = latest + 1
+        while extended < len(self) and self._Column(extended)[to_set_row] is not None:
+            extended += 1
+        if extended >= len(self):
+            self._AppendColumn()
+        self._SetCell(extended, to_set_row, success)
+        self.__turns[latest] = [to_set_row, self.__turns[latest][1] + 1]
+
+    def Render(self) -> str:
+        columns = self.__columns[-self.max_columns:]
+        result = ""
+        for row in range(self.rows):
+            for column in columns:
+                if column[row] == True:
+                    result += '✅'
+                elif column[row] == False:
+                    result += '❌'
+                else:
+                    result += '⬛️'
+            result += "\n"
+        return result
+
+class PredictionRoad:
+    def __init__(self, predict :bool, min_id :int = MIN_PREDICTION_ID):
+        self.predict = predict
+        self.min_id = min_id
+        self.__lock = threading.Lock()
+        self.__ids = []
+        self.__outcomes = {}
+        self.__hkjc_ids = {}
+        self.__road = RoadMap()
+        self.__checkpoints = [RoadMap()]
+
+    def _GetOutcome(self, dto :ResultDto) -> bool:
+        if dto.id is None or dto.id <= self.min_id or dto.ht_success is None or dto.ht_pred is None or dto.ht_pred != self.predict:
+            return None
+        if self.predict:
+            return dto.ht_success >= 1
+        return dto.ht_success == 0
+
+    def _Append(self, outcome :bool):
+        self.__road.Add(outcome)
+        if len(self.__ids) % CHECKPOINT_INTERVAL == 0:
+            self.__checkpoints.append(self.__road.Copy())
+
+    def _ReplayFrom(self, position :int):
+        checkpoint = position // CHECKPOINT_INTERVAL
+        del self.__checkpoints[checkpoint + 1:]
+        self.__road = self.__checkpoints[checkpoint].Copy()
+        for i in range(checkpoint * CHECKPOINT_INTERVAL, len(self.__ids)):
+            self.__road.Add(self.__outcomes[self.__ids[i]])
+            if (i + 1) % CHECKPOINT_INTERVAL == 0:
+                self.__checkpoints.append(self.__road.Copy())
+
+    def Rebuild(self, dtos :List[ResultDto]):
+        with self.__lock:
+            self.__ids = []
+            self.__outcomes = {}
+            self.__hkjc_ids = {}
+            for dto in dtos:
+                outcome = self._GetOutcome(dto)
+                if outcome is None or dto.id in self.__outcomes:
+                    continue
+                self.__ids.append(dto.id)
+                self.__outcomes[dto.id] = outcome
+                self.__hkjc_ids[dto.hkjc_id] = dto.id
+            self.__ids.sort()
+            self._ReplayFrom(0)
+
+    def Update(self, dto :ResultDto):
+        outcome = self._GetOutcome(dto)
+        with self.__lock:
+            old_id = self.__hkjc_ids.get(dto.hkjc_id)
+            if old_id is not None and old_id == dto.id and self.__outcomes[old_id] == outcome:
+                return
+            if outcome is None and old_id is None:
+                return
+            if outcome is not None and dto.id != old_id and dto.id in self.__outcomes:
+                return
+
+            replay_from = len(self.__ids)
+            if old_id is not None:
+                position = bisect_left(self.__ids, old_id)
+                del self.__ids[position]
+                del self.__outcomes[old_id]
+                del self.__hkjc_ids[dto.hkjc_id]
+                replay_from = position
+            if outcome is not None:
+                if old_id is None and (len(self.__ids) == 0 or dto.id > self.__ids[-1]):
+                    self.__ids.append(dto.id)
+                    self.__outcomes[dto.id] = outcome
+                    self.__hkjc_ids[dto.hkjc_id] = dto.id
+                    self._Append(outcome)
+                    return
+                insort(self.__ids, dto.id)
+                self.__outcomes[dto.id] = outcome
+                self.__hkjc_ids[dto.hkjc_id] = dto.id
+                replay_from = min(replay_from, bisect_left(self.__ids, dto.id))
+            self._ReplayFrom(replay_from)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def GetRecent(self, count :int) -> List[bool]:
+        with self.__lock:
+            return [self.__outcomes[x] for x in reversed(self.__ids[-count:])]
+
+    def Render(self) -> str:
+        with self.__lock:
+            return self.__road.Render()
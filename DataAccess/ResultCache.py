@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import datetime
+from typing import List
+from .ResultDto import ResultDto
+
+class ResultCache:
+    def __init__(self, ttl_seconds :float = None, max_size :int = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.__entries = {}
+        self.__lock = threading.RLock()
+        self.__is_complete = False
+        self.__snapshot_loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _IsExpired(self, loaded_at :float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - loaded_at > self.ttl_seconds
+
+    def _Evict(self):
+        # only the oldest match dates go, so a complete snapshot stays complete for everything newer than them;
+        # the repository's index and aggregates are built from the full load and do not read evicted entries
+        if self.max_size is None or len(self.__entries) <= self.max_size:
+            return
+        target = int(self.max_size * 0.9)
+        oldest = sorted(self.__entries.items(), key=lambda x: x[1][0].match_date or datetime.min)
+        for hkjc_id, _ in oldest[:len(self.__entries) - target]:
+            del self.__entries[hkjc_id]
+            self.evictions += 1
+
+    def _Invalidate(self):
+        self.__is_complete = False
+        self.__snapshot_loaded_at = None
+
+    def Get(self, hkjc_id) -> ResultDto:
+        with self.__lock:
+            entry = self.__entries.get(hkjc_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._IsExpired(entry[1]):
+                del self.__entries[hkjc_id]
+                self.evictions += 1
+                self.misses += 1
+                self._Invalidate()
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def Put(self, dto :ResultDto):
+        with self.__lock:
+            self.__entries[dto.hkjc_id] = (dto, time.monotonic())
+            self._Evict()
+
+    def PutAll(self, dtos :List[ResultDto]):
+        with self.__lock:
+            loaded_at = time.monotonic()
+            self.__entries = {dto.hkjc_id: (dto, loaded_at) for dto in dtos}
+            self.__is_complete = True
+            self.__snapshot_loaded_at = loaded_at
+            self._Evict()
+
+    def Values(self) -> List[ResultDto]:
+        with self.__lock:
+            return [entry[0] for entry in self.__entries.values()]
+
+    def IsComplete(self) -> bool:
+        with self.__lock:
+            if not self.__is_complete or len(self.__entries) == 0:
+                return False
+            # entries put after the full load are newer, so the snapshot time is the oldest loaded_at
+            if self._IsExpired(self.__snapshot_loaded_at):
+                self._Invalidate()
+            return self.__is_complete
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def GetStats(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.__entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+                'evictions': self.evictions,
+            }
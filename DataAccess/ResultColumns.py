@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import List
+import numpy as np
+from .ResultDto import ResultDto
+
+MISSING_INT = -1
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NAT_VALUE = np.iinfo(np.int64).min
+ROW_FIELDS = ('hkjc_id', 'ht_time', 'ht_odd', 'ht_prematch_odd', 'ht_prematch_goalline', 'ft_time', 'ft_odd', 'ft_success', 'ft_prematch_odd', 'ft_prematch_goalline',
+              'ht_rise', 'ft_rise', 'ht_success', 'ht_last_min', 'ft_last_min', 'match_date', 'ht_prob', 'ft_prob', 'ht_pred', 'id')
+FIELD_TYPES = {
+    'hkjc_id': object,
+    'ht_time': np.int16,
+    'ht_odd': np.float64,
+    'ht_prematch_odd': np.float64,
+    'ht_prematch_goalline': object,
+    'ft_time': np.int16,
+    'ft_odd': np.float64,
+    'ft_success': np.int8,
+    'ft_prematch_odd': np.float64,
+    'ft_prematch_goalline': object,
+    'ht_rise': np.int8,
+    'ft_rise': np.int8,
+    'ht_success': np.int8,
+    'ht_last_min': np.int8,
+    'ft_last_min': np.int8,
+    'match_date': 'datetime64[us]',
+    'ht_prob': np.float64,
+    'ft_prob': np.float64,
+    'ht_pred': np.int8,
+    'id': np.int64,
+}
+BOOLEAN_FIELDS = {'ht_rise', 'ft_rise', 'ht_last_min', 'ft_last_min'}
+INTERNED_FIELDS = {'ht_prematch_goalline', 'ft_prematch_goalline'}
+
+def _ToColumn(values :list, field :str) -> np.ndarray:
+    dtype = FIELD_TYPES[field]
+    if field in INTERNED_FIELDS:
+        interned = {}
+        return np.array([interned.setdefault(value, value) for value in values], dtype=object)
+    if dtype is object or dtype is np.float64:
+        return np.array(values, dtype=dtype)
+    if dtype == 'datetime64[us]':
+        # numpy's own datetime conversion is several times slower than the integer arithmetic
+        return np.fromiter((NAT_VALUE if value is None else (value - EPOCH) // MICROSECOND for value in values), dtype=np.int64, count=len(values)).view(dtype)
+    return np.fromiter((MISSING_INT if value is None else value for value in values), dtype=dtype, count=len(values))
+
+def _FromColumn(value, field :str):
+    dtype = FIELD_TYPES[field]
+    if dtype is object:
+        return value
+    if dtype is np.float64:
+        return None if value != value else float(value)
+    if dtype == 'datetime64[us]':
+        return None if np.isnat(value) else value.astype(object)
+    value = int(value)
+    if value == MISSING_INT:
+        return None
+    if field in BOOLEAN_FIELDS:
+        return value == 1
+    return value
+
+class ResultColumns:
+    def __init__(self, columns :dict):
+        self.__size = len(columns['hkjc_id'])
+        for field in ROW_FIELDS:
+            setattr(self, field, columns[field])
+
+    @classmethod
+    def FromRows(cls, rows :list) -> 'ResultColumns':
+        return cls({field: _ToColumn(list(map(itemgetter(i), rows)), field) for i, field in enumerate(ROW_FIELDS)})
+
+    @classmethod
+    def FromDtos(cls, dtos :List[ResultDto]) -> 'ResultColumns':
+        return cls({field: _ToColumn([getattr(dto, field) for dto in dtos], field) for field in ROW_FIELDS})
+
+    def __len__(self):
+        return self.__size
+
+    def GetDto(self, index :int) -> ResultDto:
+        values = {field: _FromColumn(getattr(self, field)[index], field) for field in ROW_FIELDS}
+        return ResultDto(**values)
+
+    def ToDtos(self) -> List[ResultDto]:
+        return [self.GetDto(i) for i in range(self.__size)]
+
+    def GetMemoryBytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field in ROW_FIELDS)
@@ -1,28 +1,38 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+HONG_KONG_TZ = timezone(timedelta(hours=8))
+
+def ToMatchDate(value :datetime) -> datetime:
+    # match dates are kept as naive Hong Kong time, which is what the SQL Server column has always held
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(HONG_KONG_TZ).replace(tzinfo=None)
 
 class ResultDto:
-    hkjc_id = None
-    ht_time = None
-    ht_odd = None
-    ht_prematch_odd = None
-    ht_prematch_goalline = None
-    ht_rise = None
-    ht_success = None
-    ft_time = None
-    ft_odd = None
-    ft_success = None
-    ft_prematch_odd = None
-    ft_prematch_goalline = None
-    ft_rise = None
-    ft_last_min = None
-    ht_last_min = None
-    match_date :datetime = None
-    ht_prob = None
-    ft_prob = None
-    ht_pred = None
-    id = None
-    
-    def __init__(self, hkjc_id, ht_time, ht_odd):
+    __slots__ = ('hkjc_id', 'ht_time', 'ht_odd', 'ht_prematch_odd', 'ht_prematch_goalline', 'ht_rise', 'ht_success',
+                 'ft_time', 'ft_odd', 'ft_success', 'ft_prematch_odd', 'ft_prematch_goalline', 'ft_rise',
+                 'ft_last_min', 'ht_last_min', 'match_date', 'ht_prob', 'ft_prob', 'ht_pred', 'id')
+
+    def __init__(self, hkjc_id, ht_time, ht_odd, ht_prematch_odd = None, ht_prematch_goalline = None, ht_rise = None, ht_success = None,
+                 ft_time = None, ft_odd = None, ft_success = None, ft_prematch_odd = None, ft_prematch_goalline = None, ft_rise = None,
+                 ft_last_min = None, ht_last_min = None, match_date :datetime = None, ht_prob = None, ft_prob = None, ht_pred = None, id = None):
         self.hkjc_id = hkjc_id
         self.ht_time = ht_time
-        self.ht_odd = ht_odd
\ No newline at end of file
+        self.ht_odd = ht_odd
+        self.ht_prematch_odd = ht_prematch_odd
+        self.ht_prematch_goalline = ht_prematch_goalline
+        self.ht_rise = ht_rise
+        self.ht_success = ht_success
+        self.ft_time = ft_time
+        self.ft_odd = ft_odd
+        self.ft_success = ft_success
+        self.ft_prematch_odd = ft_prematch_odd
+        self.ft_prematch_goalline = ft_prematch_goalline
+        self.ft_rise = ft_rise
+        self.ft_last_min = ft_last_min
+        self.ht_last_min = ht_last_min
+        self.match_date = match_date
+        self.ht_prob = ht_prob
+        self.ft_prob = ft_prob
+        self.ht_pred = ht_pred
+        self.id = id
@@ -1,99 +1,223 @@
-import pyodbc
 from typing import List
+import threading
+import time
+from datetime import datetime, timedelta
 from .ResultDto import ResultDto
+from .HistoricalOddsIndex import HistoricalOddsIndex
+from .DailyAccuracy import DailyAccuracy
+from .PredictionRoad import PredictionRoad
+from .ResultColumns import ResultColumns
+from .ResultCache import ResultCache
+from Metrics import REGISTRY
+from .ResultStore import ResultStore, CreateResultStore, MapRowToDto, MapDtoToParams
 
-SELECT_QUERY = 'SELECT [hkjc_id],[ht_time],[ht_odd],[ht_prematch_odd],[ht_prematch_goalline],[ft_time],[ft_odd],[ft_success],[ft_prematch_odd],[ft_prematch_goalline],[ht_rise],[ft_rise],[ht_success],[ht_last_min],[ft_last_min],[date],[ht_probability],[ft_probability],[ht_prediction],[id] FROM [HKJC_Odds].[dbo].[live_match] '
-UPDATE_QUERY = 'UPDATE [HKJC_Odds].[dbo].[live_match] set ht_time = ?, ht_odd = ?, ht_prematch_odd = ?, ht_prematch_goalline = ?, ht_rise = ?, ht_success = ?, ft_odd = ?, ft_prematch_odd = ?, ft_prematch_goalline = ?, ft_rise = ?, ft_success = ?, ft_time = ?, ht_last_min = ?, ft_last_min = ?, date = ?, ht_probability = ?, ft_probability = ?, ht_prediction = ? where hkjc_id = ?'
-INSERT_QUERY = 'INSERT INTO [HKJC_Odds].[dbo].[live_match] (ht_time, ht_odd, ht_prematch_odd, ht_prematch_goalline, ht_rise, ht_success, ft_odd, ft_prematch_odd, ft_prematch_goalline, ft_rise, ft_success, ft_time, ht_last_min, ft_last_min, date, ht_probability, ft_probability, ht_prediction, hkjc_id) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+SYNC_INCOMPLETE_DAYS = 2
+CACHE_TTL_SECONDS = 6 * 3600
+CACHE_MAX_SIZE = 20000
 
 class ResultRepository:
-    __cursor :pyodbc.Cursor = None
-    __cache = None
+    __store :ResultStore = None
+    __cache :ResultCache = None
     
-    def __init__(self, connection_string:str, loggerFactory):
-        conn = pyodbc.connect(connection_string)
-        self.__cursor = conn.cursor()
-        self.__cache = {}
+    def __init__(self, connection_string:str, loggerFactory, write_buffer_size :int = 50, write_buffer_seconds :float = 5, cache_ttl_seconds :float = CACHE_TTL_SECONDS, cache_max_size :int = CACHE_MAX_SIZE, backend :str = None):
+        self.__store = CreateResultStore(connection_string, backend)
+        self.__db_lock = threading.RLock()
+        self.__cache = ResultCache(cache_ttl_seconds, cache_max_size)
+        self.__index = HistoricalOddsIndex()
+        self.__daily_accuracy = DailyAccuracy()
+        self.__prediction_roads = {True: PredictionRoad(True), False: PredictionRoad(False)}
+        self.__max_id = None
+        self.__max_row_version = None
+        self.__has_row_version = None
+        self.__pending = {}
+        self.__pending_since = None
+        self.__pending_lock = threading.Lock()
+        self.__in_flight = {}
+        self.__flush_lock = threading.Lock()
+        self.__write_buffer_size = write_buffer_size
+        self.__write_buffer_seconds = write_buffer_seconds
         self.__logger = loggerFactory.getLogger("Repository")
-    
-    def __MapToDto(self, result) -> ResultDto:
-        dto = ResultDto(result.hkjc_id, result.ht_time, result.ht_odd)
-        dto.ht_prematch_odd = result.ht_prematch_odd
-        dto.ht_prematch_goalline = result.ht_prematch_goalline
-        dto.ht_rise = result.ht_rise
-        dto.ht_success = result.ht_success
-        dto.ft_odd = result.ft_odd
-        dto.ft_prematch_odd = result.ft_prematch_odd
-        dto.ft_prematch_goalline = result.ft_prematch_goalline
-        dto.ft_rise = result.ft_rise
-        dto.ft_success = result.ft_success
-        dto.ft_time = result.ft_time
-        dto.ht_last_min = result.ht_last_min
-        dto.ft_last_min = result.ft_last_min
-        dto.match_date = result.date
-        dto.ht_prob = result.ht_probability
-        dto.ft_prob = result.ft_probability
-        dto.ht_pred = result.ht_prediction
-        dto.id = result.id
-        return dto
-    
-    def __MapFromDto(self, dto :ResultDto) -> tuple:
-        return (dto.ht_time, 
-                dto.ht_odd, 
-                dto.ht_prematch_odd, 
-                dto.ht_prematch_goalline, 
-                dto.ht_rise, 
-                dto.ht_success, 
-                dto.ft_odd, 
-                dto.ft_prematch_odd, 
-                dto.ft_prematch_goalline, 
-                dto.ft_rise, 
-                dto.ft_success, 
-                dto.ft_time, 
-                dto.ht_last_min,
-                dto.ft_last_min,
-                dto.match_date,
-                dto.ht_prob,
-                dto.ft_prob,
-                dto.ht_pred,
-                dto.hkjc_id)
-    
        
     def GetResultById(self, match_id:str) -> ResultDto:
+        with self.__pending_lock:
+            pending = self.__pending.get(match_id)
+            if pending is None:
+                pending = self.__in_flight.get(match_id)
+        if pending is not None:
+            return pending
+        cached = self.__cache.Get(match_id)
+        if cached is not None:
+            return cached
+        dto = self.__GetResultFromDatabase(match_id)
+        if dto is not None:
+            self.__cache.Put(dto)
+        return dto
+    
+    def __GetResultFromDatabase(self, match_id:str) -> ResultDto:
         self.__logger.debug(f"正從資料庫取得{match_id}賽事的資料")
-        result = self.__cursor.execute(SELECT_QUERY + "WHERE hkjc_id = ?", match_id).fetchone()
+        with self.__db_lock, REGISTRY.Time('repository_seconds', match_id, operation='get_by_id'):
+            result = self.__store.FetchById(match_id)
         if result is None:
             self.__logger.debug(f"資料庫不存在{match_id}的資料")
             return None
         
-        return self.__MapToDto(result)
+        return MapRowToDto(result)
         
     
     def GetResults(self, read_from_cache :bool) -> List[ResultDto]:
-        if read_from_cache and len(self.__cache) > 0:
-            return list(self.__cache.values())
+        if read_from_cache and self.__cache.IsComplete():
+            return self.__cache.Values()
+        
+        if self.__cache.IsComplete() and self.__max_id is not None:
+            self.SyncResults()
+            return self.__cache.Values()
         
         self.__logger.debug(f"正從資料庫取得所有賽事的資料")
-        results = self.__cursor.execute(SELECT_QUERY).fetchall()
-        to_return = []
+        with self.__db_lock, REGISTRY.Time('repository_seconds', operation='get_all'):
+            self.__HasRowVersion()
+            results = self.__store.FetchAll()
+        dtos = [MapRowToDto(result) for result in results]
+        self.__UpdateHighWaterMark(results)
+        self.__cache.PutAll(dtos)
+        self.__index.Rebuild(dtos)
+        self.__daily_accuracy.Rebuild(dtos)
+        for road in self.__prediction_roads.values():
+            road.Rebuild(dtos)
+        return self.__cache.Values()
+    
+    def GetResultColumns(self) -> ResultColumns:
+        self.__logger.debug(f"正從資料庫以欄位格式取得所有賽事的資料")
+        with self.__db_lock, REGISTRY.Time('repository_seconds', operation='get_columns'):
+            results = self.__store.FetchAll()
+        return ResultColumns.FromRows(results)
+    
+    def __HasRowVersion(self) -> bool:
+        if self.__has_row_version is None:
+            with self.__db_lock:
+                self.__has_row_version = self.__store.HasRowVersion()
+            self.__logger.debug(f"資料表{'有' if self.__has_row_version else '沒有'}版本欄位")
+        return self.__has_row_version
+    
+    def __UpdateHighWaterMark(self, results):
         for result in results:
-            dto = self.__MapToDto(result)
-            to_return.append(dto)
-            self.__cache[dto.hkjc_id] = dto
-            
-        return list(self.__cache.values())
+            if result.id is not None and (self.__max_id is None or result.id > self.__max_id):
+                self.__max_id = result.id
+            if self.__has_row_version and (self.__max_row_version is None or result.row_version > self.__max_row_version):
+                self.__max_row_version = result.row_version
+        if self.__max_id is None:
+            self.__max_id = 0
+    
+    def SyncResults(self) -> int:
+        with self.__db_lock, REGISTRY.Time('repository_seconds', operation='sync'):
+            self.__HasRowVersion()
+            # without a row version, rows that never got a result would otherwise be re-read on every sync forever
+            results = self.__store.FetchChanges(self.__max_id, self.__max_row_version, datetime.now() - timedelta(days=SYNC_INCOMPLETE_DAYS))
+        self.__UpdateHighWaterMark(results)
+        
+        with self.__pending_lock:
+            pending_ids = set(self.__pending.keys()) | set(self.__in_flight.keys())
+        synced = 0
+        for result in results:
+            if result.hkjc_id in pending_ids:
+                continue
+            dto = MapRowToDto(result)
+            self.__cache.Put(dto)
+            self.__index.Update(dto)
+            self.__daily_accuracy.Update(dto)
+            self.__UpdatePredictionRoads(dto)
+            synced += 1
+        self.__logger.debug(f"已從資料庫同步{synced}項新增或更改的賽事資料")
+        return synced
+    
+    def GetHistoricalIndex(self) -> HistoricalOddsIndex:
+        if not self.__cache.IsComplete():
+            self.GetResults(False)
+        return self.__index
+    
+    def GetDailyAccuracy(self) -> DailyAccuracy:
+        self.GetResults(False)
+        return self.__daily_accuracy
+    
+    def GetPredictionRoad(self, predict :bool) -> PredictionRoad:
+        self.GetResults(False)
+        return self.__prediction_roads[predict]
+    
+    def __UpdatePredictionRoads(self, dto :ResultDto):
+        for road in self.__prediction_roads.values():
+            road.Update(dto)
+    
+    def GetCacheStats(self) -> dict:
+        return self.__cache.GetStats()
             
     def Upsert(self, dto:ResultDto):
-        is_new = self.GetResultById(dto.hkjc_id) is None
-        data = self.__MapFromDto(dto)
-        if is_new:
-            self.__logger.debug(f"正新增至資料庫{dto.hkjc_id}賽事資料")
-            self.__cursor.execute(INSERT_QUERY, data)
-            self.__cursor.commit()
-        else:
-            self.__logger.debug(f"正更新資料庫{dto.hkjc_id}賽事資料")
-            self.__cursor.execute(UPDATE_QUERY, data)
-            self.__cursor.commit()
+        with self.__db_lock, REGISTRY.Time('repository_seconds', dto.hkjc_id, operation='upsert'):
+            is_new = self.__GetResultFromDatabase(dto.hkjc_id) is None
+            data = MapDtoToParams(dto)
+            if is_new:
+                self.__logger.debug(f"正新增至資料庫{dto.hkjc_id}賽事資料")
+                self.__store.Insert(data)
+            else:
+                self.__logger.debug(f"正更新資料庫{dto.hkjc_id}賽事資料")
+                self.__store.Update(data)
+        self.__cache.Put(dto)
+        self.__index.Update(dto)
+        self.__daily_accuracy.Update(dto)
+        self.__UpdatePredictionRoads(dto)
+    
+    def BulkUpsert(self, dtos :List[ResultDto]):
+        latest = {dto.hkjc_id: dto for dto in dtos}
+        if len(latest) == 0:
+            return
+        
+        with self.__db_lock, REGISTRY.Time('repository_seconds', operation='bulk_upsert'):
+            existing = self.__store.FetchExistingIds(list(latest.keys()))
+            inserts = [MapDtoToParams(dto) for dto in latest.values() if not dto.hkjc_id in existing]
+            updates = [MapDtoToParams(dto) for dto in latest.values() if dto.hkjc_id in existing]
+            self.__logger.debug(f"正批次寫入資料庫: 新增{len(inserts)}項, 更新{len(updates)}項賽事資料")
+            self.__store.WriteMany(inserts, updates)
+        
+        for dto in latest.values():
+            self.__cache.Put(dto)
+            self.__index.Update(dto)
+            self.__daily_accuracy.Update(dto)
+            self.__UpdatePredictionRoads(dto)
+    
+    def EnqueueUpsert(self, dto :ResultDto):
+        with self.__pending_lock:
+            self.__pending[dto.hkjc_id] = dto
+            if self.__pending_since is None:
+                self.__pending_since = time.monotonic()
+            is_due = (len(self.__pending) >= self.__write_buffer_size or
+                      time.monotonic() - self.__pending_since >= self.__write_buffer_seconds)
+        if is_due:
+            self.FlushPendingUpserts()
+    
+    def FlushPendingUpserts(self):
+        with self.__flush_lock:
+            # swap the batch out so EnqueueUpsert/GetResultById never wait on the database
+            with self.__pending_lock:
+                if len(self.__pending) == 0:
+                    return
+                batch = self.__in_flight = self.__pending
+                self.__pending = {}
+                self.__pending_since = None
+            try:
+                self.BulkUpsert(list(batch.values()))
+            except Exception as ex:
+                self.__logger.error(f"批次寫入{len(batch)}項賽事資料失敗, 將於下次重試. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+                with self.__pending_lock:
+                    # anything enqueued while writing is newer than the failed batch
+                    batch.update(self.__pending)
+                    self.__pending = batch
+                    self.__pending_since = time.monotonic()
+            finally:
+                with self.__pending_lock:
+                    self.__in_flight = {}
+    
+    def Close(self):
+        self.FlushPendingUpserts()
+        with self.__db_lock:
+            self.__store.Close()
                 
 if __name__ == "__main__":
     from Config import *
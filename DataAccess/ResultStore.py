@@ -0,0 +1,91 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List
+from .ResultDto import ResultDto, ToMatchDate
+
+SQL_SERVER_BACKEND = 'sqlserver'
+SQLITE_BACKEND = 'sqlite'
+
+ROW_COLUMN_COUNT = 20
+
+def MapRowToDto(result) -> ResultDto:
+    # rows follow the SELECT column order of every store; unpacking straight into the slots skips __init__ and the per-column name lookups
+    dto = ResultDto.__new__(ResultDto)
+    (dto.hkjc_id, dto.ht_time, dto.ht_odd, dto.ht_prematch_odd, dto.ht_prematch_goalline, dto.ft_time, dto.ft_odd, dto.ft_success, dto.ft_prematch_odd, dto.ft_prematch_goalline,
+     dto.ht_rise, dto.ft_rise, dto.ht_success, dto.ht_last_min, dto.ft_last_min, dto.match_date, dto.ht_prob, dto.ft_prob, dto.ht_pred, dto.id) = result[:ROW_COLUMN_COUNT]
+    return dto
+
+def MapDtoToParams(dto :ResultDto) -> tuple:
+    return (dto.ht_time, 
+            dto.ht_odd, 
+            dto.ht_prematch_odd, 
+            dto.ht_prematch_goalline, 
+            dto.ht_rise, 
+            dto.ht_success, 
+            dto.ft_odd, 
+            dto.ft_prematch_odd, 
+            dto.ft_prematch_goalline, 
+            dto.ft_rise, 
+            dto.ft_success, 
+            dto.ft_time, 
+            dto.ht_last_min,
+            dto.ft_last_min,
+            ToMatchDate(dto.match_date),
+            dto.ht_prob,
+            dto.ft_prob,
+            dto.ht_pred,
+            dto.hkjc_id)
+
+class ResultStore(ABC):
+    @abstractmethod
+    def HasRowVersion(self) -> bool:
+        pass
+
+    @abstractmethod
+    def FetchById(self, match_id :str):
+        pass
+
+    @abstractmethod
+    def FetchAll(self) -> list:
+        pass
+
+    @abstractmethod
+    def FetchChanges(self, max_id :int, max_row_version :int, incomplete_since :datetime) -> list:
+        pass
+
+    @abstractmethod
+    def FetchExistingIds(self, match_ids :List[str]) -> set:
+        pass
+
+    @abstractmethod
+    def Insert(self, data :tuple):
+        pass
+
+    @abstractmethod
+    def Update(self, data :tuple):
+        pass
+
+    @abstractmethod
+    def WriteMany(self, inserts :List[tuple], updates :List[tuple]):
+        pass
+
+    def Close(self):
+        pass
+
+def GetBackend(connection_string :str) -> str:
+    if connection_string.startswith('sqlite:///') or connection_string.endswith('.db') or connection_string == ':memory:':
+        return SQLITE_BACKEND
+    return SQL_SERVER_BACKEND
+
+def CreateResultStore(connection_string :str, backend :str = None) -> ResultStore:
+    """backend is 'sqlserver' or 'sqlite' (Config.RESULT_STORE_BACKEND); when omitted it is inferred from the
+    connection string: 'sqlite:///...', '*.db' and ':memory:' select SQLite, anything else SQL Server."""
+    if backend is None:
+        backend = GetBackend(connection_string)
+    if backend == SQL_SERVER_BACKEND:
+        from .SqlServerResultStore import SqlServerResultStore
+        return SqlServerResultStore(connection_string)
+    if backend == SQLITE_BACKEND:
+        from .SqliteResultStore import SqliteResultStore
+        return SqliteResultStore(connection_string)
+    raise ValueError(f"Unknown storage backend {backend}")
@@ -0,0 +1,73 @@
+import pyodbc
+from datetime import datetime
+from typing import List
+from .ResultStore import ResultStore
+
+SELECT_QUERY = 'SELECT [hkjc_id],[ht_time],[ht_odd],[ht_prematch_odd],[ht_prematch_goalline],[ft_time],[ft_odd],[ft_success],[ft_prematch_odd],[ft_prematch_goalline],[ht_rise],[ft_rise],[ht_success],[ht_last_min],[ft_last_min],[date],[ht_probability],[ft_probability],[ht_prediction],[id] FROM [HKJC_Odds].[dbo].[live_match] '
+UPDATE_QUERY = 'UPDATE [HKJC_Odds].[dbo].[live_match] set ht_time = ?, ht_odd = ?, ht_prematch_odd = ?, ht_prematch_goalline = ?, ht_rise = ?, ht_success = ?, ft_odd = ?, ft_prematch_odd = ?, ft_prematch_goalline = ?, ft_rise = ?, ft_success = ?, ft_time = ?, ht_last_min = ?, ft_last_min = ?, date = ?, ht_probability = ?, ft_probability = ?, ht_prediction = ? where hkjc_id = ?'
+ROWVERSION_COLUMN = 'row_ver'
+ROWVERSION_EXISTS_QUERY = f"SELECT COL_LENGTH('[HKJC_Odds].[dbo].[live_match]', '{ROWVERSION_COLUMN}')"
+SYNC_ROWVERSION_QUERY = SELECT_QUERY.replace(' FROM ', f', CAST([{ROWVERSION_COLUMN}] AS BIGINT) AS [row_version] FROM ') + f'WHERE [id] > ? OR [{ROWVERSION_COLUMN}] > CAST(CAST(? AS BIGINT) AS BINARY(8))'
+SYNC_INCOMPLETE_QUERY = SELECT_QUERY + 'WHERE [id] > ? OR (([ht_success] IS NULL OR [ft_success] IS NULL) AND [date] >= ?)'
+EXISTING_IDS_QUERY = 'SELECT [hkjc_id] FROM [HKJC_Odds].[dbo].[live_match] WHERE hkjc_id IN ({0})'
+EXISTING_IDS_CHUNK = 1000
+INSERT_QUERY = 'INSERT INTO [HKJC_Odds].[dbo].[live_match] (ht_time, ht_odd, ht_prematch_odd, ht_prematch_goalline, ht_rise, ht_success, ft_odd, ft_prematch_odd, ft_prematch_goalline, ft_rise, ft_success, ft_time, ht_last_min, ft_last_min, date, ht_probability, ft_probability, ht_prediction, hkjc_id) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+class SqlServerResultStore(ResultStore):
+    __cursor :pyodbc.Cursor = None
+
+    def __init__(self, connection_string :str):
+        conn = pyodbc.connect(connection_string)
+        self.__cursor = conn.cursor()
+        self.__has_row_version = None
+
+    def HasRowVersion(self) -> bool:
+        if self.__has_row_version is None:
+            self.__has_row_version = self.__cursor.execute(ROWVERSION_EXISTS_QUERY).fetchone()[0] is not None
+        return self.__has_row_version
+
+    def FetchById(self, match_id :str):
+        return self.__cursor.execute(SELECT_QUERY + "WHERE hkjc_id = ?", match_id).fetchone()
+
+    def FetchAll(self) -> list:
+        if self.HasRowVersion():
+            return self.__cursor.execute(SYNC_ROWVERSION_QUERY, (-1, -1)).fetchall()
+        return self.__cursor.execute(SELECT_QUERY).fetchall()
+
+    def FetchChanges(self, max_id :int, max_row_version :int, incomplete_since :datetime) -> list:
+        if self.HasRowVersion():
+            return self.__cursor.execute(SYNC_ROWVERSION_QUERY, (max_id, max_row_version or 0)).fetchall()
+        return self.__cursor.execute(SYNC_INCOMPLETE_QUERY, (max_id, incomplete_since)).fetchall()
+
+    def FetchExistingIds(self, match_ids :List[str]) -> set:
+        existing = set()
+        for i in range(0, len(match_ids), EXISTING_IDS_CHUNK):
+            chunk = match_ids[i:i + EXISTING_IDS_CHUNK]
+            query = EXISTING_IDS_QUERY.format(", ".join("?" * len(chunk)))
+            existing.update(row.hkjc_id for row in self.__cursor.execute(query, chunk).fetchall())
+        return existing
+
+    def Insert(self, data :tuple):
+        self.__cursor.execute(INSERT_QUERY, data)
+        self.__cursor.commit()
+
+    def Update(self, data :tuple):
+        self.__cursor.execute(UPDATE_QUERY, data)
+        self.__cursor.commit()
+
+    def WriteMany(self, inserts :List[tuple], updates :List[tuple]):
+        self.__cursor.fast_executemany = True
+        try:
+            if len(updates) > 0:
+                self.__cursor.executemany(UPDATE_QUERY, updates)
+            if len(inserts) > 0:
+                self.__cursor.executemany(INSERT_QUERY, inserts)
+            self.__cursor.commit()
+        except:
+            self.__cursor.rollback()
+            raise
+        finally:
+            self.__cursor.fast_executemany = False
+
+    def Close(self):
+        self.__cursor.connection.close()
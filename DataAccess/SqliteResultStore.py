@@ -0,0 +1,109 @@
+import sqlite3
+from datetime import datetime
+from collections import namedtuple
+from typing import List
+from .ResultStore import ResultStore
+from .ResultDto import ToMatchDate
+
+COLUMNS = ['hkjc_id', 'ht_time', 'ht_odd', 'ht_prematch_odd', 'ht_prematch_goalline', 'ft_time', 'ft_odd', 'ft_success', 'ft_prematch_odd', 'ft_prematch_goalline', 'ht_rise', 'ft_rise', 'ht_success', 'ht_last_min', 'ft_last_min', 'date', 'ht_probability', 'ft_probability', 'ht_prediction', 'id', 'row_version']
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS live_match (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hkjc_id TEXT NOT NULL UNIQUE,
+    ht_time INTEGER,
+    ht_odd REAL,
+    ht_prematch_odd REAL,
+    ht_prematch_goalline TEXT,
+    ht_rise BOOLEAN,
+    ht_success INTEGER,
+    ft_time INTEGER,
+    ft_odd REAL,
+    ft_prematch_odd REAL,
+    ft_prematch_goalline TEXT,
+    ft_rise BOOLEAN,
+    ft_success INTEGER,
+    ht_last_min BOOLEAN,
+    ft_last_min BOOLEAN,
+    date TIMESTAMP,
+    ht_probability REAL,
+    ft_probability REAL,
+    ht_prediction INTEGER,
+    row_ver INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_live_match_date ON live_match (date);
+CREATE INDEX IF NOT EXISTS ix_live_match_row_ver ON live_match (row_ver);
+CREATE TRIGGER IF NOT EXISTS tr_live_match_insert AFTER INSERT ON live_match
+BEGIN
+    UPDATE live_match SET row_ver = (SELECT MAX(row_ver) FROM live_match) + 1 WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS tr_live_match_update AFTER UPDATE OF ht_time, ht_odd, ht_prematch_odd, ht_prematch_goalline, ht_rise, ht_success, ft_time, ft_odd, ft_prematch_odd, ft_prematch_goalline, ft_rise, ft_success, ht_last_min, ft_last_min, date, ht_probability, ft_probability, ht_prediction ON live_match
+BEGIN
+    UPDATE live_match SET row_ver = (SELECT MAX(row_ver) FROM live_match) + 1 WHERE id = NEW.id;
+END;
+'''
+SELECT_QUERY = 'SELECT hkjc_id, ht_time, ht_odd, ht_prematch_odd, ht_prematch_goalline, ft_time, ft_odd, ft_success, ft_prematch_odd, ft_prematch_goalline, ht_rise, ft_rise, ht_success, ht_last_min, ft_last_min, date, ht_probability, ft_probability, ht_prediction, id, row_ver AS row_version FROM live_match '
+UPDATE_QUERY = 'UPDATE live_match SET ht_time = ?, ht_odd = ?, ht_prematch_odd = ?, ht_prematch_goalline = ?, ht_rise = ?, ht_success = ?, ft_odd = ?, ft_prematch_odd = ?, ft_prematch_goalline = ?, ft_rise = ?, ft_success = ?, ft_time = ?, ht_last_min = ?, ft_last_min = ?, date = ?, ht_probability = ?, ft_probability = ?, ht_prediction = ? WHERE hkjc_id = ?'
+INSERT_QUERY = 'INSERT INTO live_match (ht_time, ht_odd, ht_prematch_odd, ht_prematch_goalline, ht_rise, ht_success, ft_odd, ft_prematch_odd, ft_prematch_goalline, ft_rise, ft_success, ft_time, ht_last_min, ft_last_min, date, ht_probability, ft_probability, ht_prediction, hkjc_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+SYNC_QUERY = SELECT_QUERY + 'WHERE id > ? OR row_ver > ?'
+EXISTING_IDS_QUERY = 'SELECT hkjc_id FROM live_match WHERE hkjc_id IN ({0})'
+EXISTING_IDS_CHUNK = 500
+SQLITE_PREFIX = 'sqlite:///'
+
+ResultRow = namedtuple('ResultRow', COLUMNS)
+
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+# the stock converter cannot read a '+08:00' suffix, which rows written before MapDtoToParams normalised dates may have
+sqlite3.register_converter('TIMESTAMP', lambda value: ToMatchDate(datetime.fromisoformat(value.decode())))
+
+def _ResultRowFactory(cursor, row):
+    if len(row) == len(COLUMNS):
+        return ResultRow(*row)
+    return namedtuple('Row', [column[0] for column in cursor.description])(*row)
+
+class SqliteResultStore(ResultStore):
+    def __init__(self, connection_string :str):
+        path = connection_string[len(SQLITE_PREFIX):] if connection_string.startswith(SQLITE_PREFIX) else connection_string
+        self.__connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, cached_statements=32)
+        self.__connection.row_factory = _ResultRowFactory
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__connection.execute('PRAGMA temp_store=MEMORY')
+        self.__connection.executescript(SCHEMA)
+
+    def HasRowVersion(self) -> bool:
+        return True
+
+    def FetchById(self, match_id :str):
+        return self.__connection.execute(SELECT_QUERY + 'WHERE hkjc_id = ?', (match_id,)).fetchone()
+
+    def FetchAll(self) -> list:
+        return self.__connection.execute(SELECT_QUERY).fetchall()
+
+    def FetchChanges(self, max_id :int, max_row_version :int, incomplete_since :datetime) -> list:
+        return self.__connection.execute(SYNC_QUERY, (max_id, max_row_version or 0)).fetchall()
+
+    def FetchExistingIds(self, match_ids :List[str]) -> set:
+        existing = set()
+        for i in range(0, len(match_ids), EXISTING_IDS_CHUNK):
+            chunk = match_ids[i:i + EXISTING_IDS_CHUNK]
+            query = EXISTING_IDS_QUERY.format(", ".join("?" * len(chunk)))
+            existing.update(row.hkjc_id for row in self.__connection.execute(query, chunk).fetchall())
+        return existing
+
+    def Insert(self, data :tuple):
+        with self.__connection:
+            self.__connection.execute(INSERT_QUERY, data)
+
+    def Update(self, data :tuple):
+        with self.__connection:
+            self.__connection.execute(UPDATE_QUERY, data)
+
+    def WriteMany(self, inserts :List[tuple], updates :List[tuple]):
+        with self.__connection:
+            if len(updates) > 0:
+                self.__connection.executemany(UPDATE_QUERY, updates)
+            if len(inserts) > 0:
+                self.__connection.executemany(INSERT_QUERY, inserts)
+
+    def Close(self):
+        self.__connection.close()
@@ -0,0 +1,63 @@
+import numpy as np
+from DataAccess.ResultColumns import ResultColumns, MISSING_INT
+
+ENCODER_VERSION = 1
+FEATURE_NAMES = ('ht_time', 'ht_odd', 'ht_prematch_odd', 'ft_prematch_odd', 'ht_rise', 'ft_rise', 'ht_prematch_goalline', 'ft_prematch_goalline')
+FLOW_CODES = {False: 0, True: 1, None: 2}
+GOAL_LINE_CODES = {line: code for code, line in enumerate(['0.5/1.0', '1.0/1.5', '1.5', '1.5/2.0', '2.0/2.5', '2.5', '2.5/3.0', '3.0/3.5',
+                                                            '3.5', '3.5/4.0', '4.0/4.5', '4.5', '4.5/5.0', '5.0/5.5', '5.5'])}
+UNKNOWN_GOAL_LINE = len(GOAL_LINE_CODES)
+# ResultColumns keeps nullable booleans as int8 with -1 for missing, so index 0/1/-1 maps to False/True/None
+FLOW_COLUMN_CODES = np.array([FLOW_CODES[False], FLOW_CODES[True], FLOW_CODES[None]], dtype=np.float64)
+
+def ConvertFlowToDigit(flow) -> int:
+    return FLOW_CODES[None if flow is None else bool(flow)]
+
+def ConvertGoalLineToDigit(goalLine) -> int:
+    return GOAL_LINE_CODES.get(goalLine, UNKNOWN_GOAL_LINE)
+
+def BuildFeatureRow(ht_time, ht_odd, ht_prematch_odd, ft_prematch_odd, ht_rise, ft_rise, ht_prematch_goalline, ft_prematch_goalline) -> list:
+    return [
+        ht_time,
+        ht_odd,
+        ht_prematch_odd,
+        ft_prematch_odd,
+        ConvertFlowToDigit(ht_rise),
+        ConvertFlowToDigit(ft_rise),
+        ConvertGoalLineToDigit(ht_prematch_goalline),
+        ConvertGoalLineToDigit(ft_prematch_goalline)]
+
+def EncodeGoalLineColumn(lines :np.ndarray) -> np.ndarray:
+    if len(lines) == 0:
+        return np.zeros(0, dtype=np.float64)
+    # goal lines are interned, so only the handful of distinct values go through the dictionary
+    values, inverse = np.unique(lines.astype(str), return_inverse=True)
+    codes = np.array([GOAL_LINE_CODES.get(value, UNKNOWN_GOAL_LINE) for value in values], dtype=np.float64)
+    return codes[inverse]
+
+def EncodeFlowColumn(flows :np.ndarray) -> np.ndarray:
+    return FLOW_COLUMN_CODES[np.where(flows == MISSING_INT, 2, flows)]
+
+def GetTrainableMask(results :ResultColumns) -> np.ndarray:
+    return ((results.ht_time != MISSING_INT) & (results.ht_success != MISSING_INT) &
+            ~np.isnan(results.ht_odd) & ~np.isnan(results.ht_prematch_odd) & ~np.isnan(results.ft_prematch_odd))
+
+def BuildFeatureMatrix(results :ResultColumns, mask :np.ndarray = None) -> np.ndarray:
+    if mask is None:
+        mask = np.ones(len(results), dtype=bool)
+    features = np.empty((int(mask.sum()), len(FEATURE_NAMES)), dtype=np.float64)
+    features[:, 0] = results.ht_time[mask]
+    features[:, 1] = results.ht_odd[mask]
+    features[:, 2] = results.ht_prematch_odd[mask]
+    features[:, 3] = results.ft_prematch_odd[mask]
+    features[:, 4] = EncodeFlowColumn(results.ht_rise[mask])
+    features[:, 5] = EncodeFlowColumn(results.ft_rise[mask])
+    features[:, 6] = EncodeGoalLineColumn(results.ht_prematch_goalline[mask])
+    features[:, 7] = EncodeGoalLineColumn(results.ft_prematch_goalline[mask])
+    return features
+
+def BuildTrainingSet(results :ResultColumns) -> tuple:
+    mask = GetTrainableMask(results)
+    features = BuildFeatureMatrix(results, mask)
+    labels = (results.ht_success[mask] >= 1).astype(np.int64)
+    return features, labels, results.match_date[mask]
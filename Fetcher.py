@@ -1,31 +1,90 @@
 from Config import *
 from typing import List
-from DataAccess.ResultRepository import ResultRepository
-from DataAccess.ResultDto import ResultDto
+from DataAccess.ResultRepository import ResultRepository, CACHE_TTL_SECONDS, CACHE_MAX_SIZE
+from DataAccess.ResultDto import ResultDto, ToMatchDate, HONG_KONG_TZ
+from DataAccess.HistoricalOddsIndex import HALF_TIME, FULL_TIME
 from Crawler import Crawler, SiteApi
+from OddsSnapshot import OddsSnapshot
+from ModelServer import ModelServer, BuildFeatureRow
+from BackfillRunner import BackfillRunner, BackfillCheckpoint, CHECKPOINT_PATH
+from ResponseCache import ResponseCache, CACHE_DIRECTORY
+from PollScheduler import PollScheduler, PollPlan
+from MatchStateTracker import MatchStateTracker
+from OddsTimeSeries import OddsSeriesWriter, SERIES_DIRECTORY
+from TriggerEngine import TriggerEngine, TriggerEvent, LoadRules, NOTIFY_RULE, HT_LAST_MIN_RULE, FT_LAST_MIN_RULE
+from Metrics import REGISTRY
 import Utils
 import queue, threading
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import copy
 import time
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta
+
+RESULT_DELAY = timedelta(hours=2, minutes=30)
+
+class KickoffTimeCache:
+    def __init__(self, max_size :int = 512, ttl_seconds :float = 4 * 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def _Expire(self, now :datetime):
+        while len(self.__entries) > 0:
+            match_id, started = next(iter(self.__entries.items()))
+            if len(self.__entries) <= self.max_size and (now - started).total_seconds() <= self.ttl_seconds:
+                break
+            del self.__entries[match_id]
+
+    def Start(self, match_id) -> datetime:
+        now = datetime.now()
+        with self.__lock:
+            started = self.__entries.get(match_id)
+            if started is None:
+                started = self.__entries[match_id] = now
+            self._Expire(now)
+            return started
+
+    def Get(self, match_id) -> datetime:
+        with self.__lock:
+            return self.__entries.get(match_id)
+
+    def Pop(self, match_id):
+        with self.__lock:
+            self.__entries.pop(match_id, None)
+
+    def __len__(self):
+        return len(self.__entries)
+
+@lru_cache(maxsize=1024)
+def ParseMatchDate(match_date :str) -> datetime:
+    import dateutil.parser
+    return dateutil.parser.parse(match_date)
 
 class Match:
-    home_name = None
-    away_name = None
-    time_text = None
-    time_int = None
-    id = None
-    is_started = None
-    is_goaled = None
-    is_first_half = None
-    is_live_match = None
-    date = None
-    match_cache = {}
+    __slots__ = ('home_name', 'away_name', 'time_text', 'time_int', 'id', 'is_started', 'is_goaled', 'is_first_half', 'is_live_match', 'date', 'match_state')
+    match_cache = KickoffTimeCache()
         
     def __init__(self, data, data_site:str):
+        self.home_name = None
+        self.away_name = None
+        self.time_text = None
+        self.time_int = None
+        self.id = None
+        self.is_started = None
+        self.is_goaled = None
+        self.is_first_half = None
+        self.is_live_match = None
+        self.date = None
+        self.match_state = None
+        
         if data_site == SiteApi.HKJC.name:
-            import dateutil.parser
-            self.date = dateutil.parser.parse(data['matchDate'])
+            self.date = ParseMatchDate(data['matchDate'])
+            self.match_state = data['matchState']
             self.is_live_match = True
             self.is_started = True
             self.home_name = data['homeTeam']['teamNameCH']
@@ -51,23 +110,7 @@ class Match:
                     elif data['accumulatedscore'][1]['home'] != '0' or data['accumulatedscore'][1]['away'] != '0':
                         self.is_goaled = True
             
-            if data['matchState'] == 'FirstHalfCompleted': 
-                if self.id in self.match_cache:
-                    self.match_cache.pop(self.id, None)
-                self.time_int = 46
-                self.time_text = "半場"
-            else:
-                if not self.id in self.match_cache:
-                    self.match_cache[self.id] = datetime.now()
-                if data['matchState'] == 'FirstHalf':
-                    self.time_int = int((datetime.now() - self.match_cache[self.id]).total_seconds() / 60)
-                    if self.time_int >= 46:
-                        self.time_int = 45
-                elif data['matchState'] == 'SecondHalf':
-                    self.time_int = int((datetime.now() - self.match_cache[self.id]).total_seconds() / 60) + 46
-                    if self.time_int >= 90:
-                        self.time_int = 90
-                self.time_text = f"{self.time_int}'"
+            self.RefreshTime()
         elif data_site == SiteApi.G10OAL.name:
             from bs4 import Tag
             data :Tag = data
@@ -101,6 +144,25 @@ class Match:
                 self.time_int = 46
             self.is_first_half = self.time_int <= 45
         
+    def RefreshTime(self):
+        if self.match_state is None:
+            return
+        if self.match_state == 'FirstHalfCompleted': 
+            self.match_cache.Pop(self.id)
+            self.time_int = 46
+            self.time_text = "半場"
+        else:
+            started = self.match_cache.Start(self.id)
+            if self.match_state == 'FirstHalf':
+                self.time_int = int((datetime.now() - started).total_seconds() / 60)
+                if self.time_int >= 46:
+                    self.time_int = 45
+            elif self.match_state == 'SecondHalf':
+                self.time_int = int((datetime.now() - started).total_seconds() / 60) + 46
+                if self.time_int >= 90:
+                    self.time_int = 90
+            self.time_text = f"{self.time_int}'"
+        
     def _ConvertStringToDateTime(self, month_day_string):
         # Get today's date
         today = datetime.now()
@@ -119,6 +181,13 @@ class Match:
         converted_date = datetime(year, month_day.month, month_day.day)
         return converted_date
             
+    def GetSecondsToMinute(self, minute :int) -> float:
+        started = self.match_cache.Get(self.id)
+        if started is None:
+            return None
+        offset = 0 if self.is_first_half else 46
+        return (minute - offset) * 60 - (datetime.now() - started).total_seconds()
+            
     def __str__(self):
         max_length = 32
         home = Utils.FormatStringWidth(self.home_name) + " " * (max_length-len(self.home_name)*2)
@@ -126,87 +195,120 @@ class Match:
         return f'[{self.id}]{home} 對 {away} '
 
 class Fetcher:    
-    def __init__(self, connection_string :str, loggerFactory):
-        self.repository = ResultRepository(connection_string, loggerFactory)
+    def __init__(self, connection_string :str, loggerFactory, crawler :Crawler = None):
+        self.repository = ResultRepository(connection_string, loggerFactory, cache_ttl_seconds=globals().get('RESULT_CACHE_TTL_SECONDS', CACHE_TTL_SECONDS),
+                                           cache_max_size=globals().get('RESULT_CACHE_MAX_SIZE', CACHE_MAX_SIZE), backend=globals().get('RESULT_STORE_BACKEND'))
         self.fetch_counter = 1
-        self.half_time_fetch_cache = []
-        self.full_time_fetch_cache = []
-        self.ht_last_min = []
-        self.ft_last_min = []
         self.loggerFactory = loggerFactory
         self.logger = loggerFactory.getLogger("Fetcher")
-        self.crawler = Crawler(loggerFactory)
+        self.crawler = crawler if crawler is not None else Crawler(loggerFactory, response_cache=ResponseCache(globals().get('RESPONSE_CACHE_PATH') or CACHE_DIRECTORY))
+        self.model_server = ModelServer(loggerFactory)
+        self.executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="Fetcher")
+        self.scheduler = PollScheduler(CHECKINTERVAL_SECOND)
+        self.next_poll_at = 0
+        self.last_snapshot_at = None
+        self.backfill_runner = BackfillRunner(loggerFactory, BackfillCheckpoint(globals().get('BACKFILL_CHECKPOINT_PATH') or CHECKPOINT_PATH))
+        self.match_tracker = MatchStateTracker(lambda data: Match(data, SiteApi.HKJC.name))
+        self.trigger_engine = TriggerEngine(LoadRules(globals().get('TRIGGER_RULES')))
+        self.odds_recorder = OddsSeriesWriter(globals().get('ODDS_SERIES_PATH') or SERIES_DIRECTORY)
         
-    def FillMatchResults(self) -> None:
+    def FillMatchResults(self, now :datetime = None) -> dict:
         dtos = self.repository.GetResults(False)
         self.logger.debug(f"已取得{len(dtos)}項已保存賽事")
-        for dto in dtos:
-            if dto.ft_success is None or dto.ht_success is None:
-                self.logger.debug(f"{dto.id}紀錄未齊全, 將補完賽事")
-                #print(f"{dto.hkjc_id}紀錄未齊全, 將補完賽事")
-                scores = self.crawler.GetMatchResults(dto.hkjc_id)
-                if len(scores) == 0:
-                    self.logger.debug(f"無法取得{dto.hkjc_id}賽事賽果, 將跳過")
-                    continue
-                prematch_odds = self.crawler.GetPreMatchOdds(dto.hkjc_id)
-                ht_goalline = list(prematch_odds['ht'])[0]
-                dto.ht_prematch_goalline = ht_goalline
-                dto.ht_prematch_odd = prematch_odds['ht'][ht_goalline][0]
-                dto.ht_rise = prematch_odds['ht'][ht_goalline][1]
-                dto.ht_success = scores['ht']
-                self.logger.debug(f"已取得{dto.hkjc_id}賽事半場賽果: 半場入球{scores['ht']}, 中位數入球{ht_goalline}, 入球大賠率{dto.ht_prematch_odd}, 賠率流向為上升{dto.ht_rise}")
-                #print(f"已取得{dto.hkjc_id}賽事半場賽果: 半場入球{scores['ht']}, 中位數入球{ht_goalline}, 入球大賠率{dto.ht_prematch_odd}, 賠率流向為上升{dto.ht_rise}")
-                
-                ft_goalline = list(prematch_odds['ft'])[0]
-                dto.ft_prematch_goalline = ft_goalline
-                dto.ft_prematch_odd = prematch_odds['ft'][ft_goalline][0]
-                dto.ft_rise = prematch_odds['ft'][ft_goalline][1]
-                dto.ft_success = scores['ft']
-                self.logger.debug(f"已取得{dto.hkjc_id}賽事全場賽果: 全半場入球{scores['ft']}, 中位數入球{ft_goalline}, 入球大賠率{dto.ft_prematch_odd}, 賠率流向為上升{dto.ft_rise}")
-                #print(f"已取得{dto.hkjc_id}賽事全場賽果: 全半場入球{scores['ft']}, 中位數入球{ft_goalline}, 入球大賠率{dto.ft_prematch_odd}, 賠率流向為上升{dto.ft_rise}")
-                
-                self.repository.Upsert(dto)
-                
-    def _SleepThread(self, message:str, sleep_time:int):
-        self.logger.info(f"{message}, 將閒置Thread {str(sleep_time)}分鐘")
-        time.sleep(sleep_time*60)
+        # match dates are naive Hong Kong time, whatever the local timezone of this machine
+        now = now if now is not None else ToMatchDate(datetime.now(tz=HONG_KONG_TZ))
+        incomplete = [dto for dto in dtos if (dto.ft_success is None or dto.ht_success is None) and self._IsResultDue(dto, now)]
+        return self.backfill_runner.Run(incomplete, lambda dto: dto.hkjc_id, self._ResolveMatchResult, self.repository.BulkUpsert, SiteApi.G10OAL.value)
+
+    def _IsResultDue(self, dto :ResultDto, now :datetime) -> bool:
+        return dto.match_date is None or ToMatchDate(dto.match_date) + RESULT_DELAY <= now
+
+    def _ResolveMatchResult(self, cached :ResultDto) -> ResultDto:
+        # the cached DTO is shared with readers; only BulkUpsert publishes the resolved copy
+        dto = copy.copy(cached)
+        self.logger.debug(f"{dto.id}紀錄未齊全, 將補完賽事")
+        #print(f"{dto.hkjc_id}紀錄未齊全, 將補完賽事")
+        scores, prematch_odds = self.crawler.GetMatchPage(dto.hkjc_id)
+        if len(scores) == 0:
+            self.logger.debug(f"無法取得{dto.hkjc_id}賽事賽果, 將跳過")
+            return None
+        ht_goalline = list(prematch_odds['ht'])[0]
+        dto.ht_prematch_goalline = ht_goalline
+        dto.ht_prematch_odd = prematch_odds['ht'][ht_goalline][0]
+        dto.ht_rise = prematch_odds['ht'][ht_goalline][1]
+        dto.ht_success = scores['ht']
+        self.logger.debug(f"已取得{dto.hkjc_id}賽事半場賽果: 半場入球{scores['ht']}, 中位數入球{ht_goalline}, 入球大賠率{dto.ht_prematch_odd}, 賠率流向為上升{dto.ht_rise}")
+        #print(f"已取得{dto.hkjc_id}賽事半場賽果: 半場入球{scores['ht']}, 中位數入球{ht_goalline}, 入球大賠率{dto.ht_prematch_odd}, 賠率流向為上升{dto.ht_rise}")
+    
+        ft_goalline = list(prematch_odds['ft'])[0]
+        dto.ft_prematch_goalline = ft_goalline
+        dto.ft_prematch_odd = prematch_odds['ft'][ft_goalline][0]
+        dto.ft_rise = prematch_odds['ft'][ft_goalline][1]
+        dto.ft_success = scores['ft']
+        self.logger.debug(f"已取得{dto.hkjc_id}賽事全場賽果: 全半場入球{scores['ft']}, 中位數入球{ft_goalline}, 入球大賠率{dto.ft_prematch_odd}, 賠率流向為上升{dto.ft_rise}")
+        #print(f"已取得{dto.hkjc_id}賽事全場賽果: 全半場入球{scores['ft']}, 中位數入球{ft_goalline}, 入球大賠率{dto.ft_prematch_odd}, 賠率流向為上升{dto.ft_rise}")
+        return dto
+
+    def _Idle(self, plan :PollPlan):
+        self.logger.info(f"{plan.reason}, 將閒置{plan.seconds / 60:.1f}分鐘")
+        self.next_poll_at = time.monotonic() + plan.seconds
         self.fetch_counter += 1
 
+    def _SchedulePoll(self, plan :PollPlan):
+        self.logger.debug(f"{plan.reason}, {plan.seconds:.0f}秒後再檢查")
+        self.next_poll_at = time.monotonic() + plan.seconds
+
+    def GetNextPollSeconds(self) -> float:
+        return max(self.next_poll_at - time.monotonic(), 0)
+
+    def _IsNotified(self, m :Match) -> bool:
+        return self.trigger_engine.IsNotified(m)
+
+    def _GetLiveMatches(self, result, snapshot :OddsSnapshot) -> List[Match]:
+        if len(result) < 2:
+            print("收到奇怪的response")
+            return None
+        
+        with REGISTRY.Time('fetcher_stage_seconds', stage='match_state'):
+            matches :List[Match] = self.match_tracker.Ingest(result, snapshot)
+        if len(self.match_tracker.changes) > 0 or len(self.match_tracker.removed) > 0:
+            self.logger.debug(f'賽事狀態變化: {self.match_tracker.changes}, 已完結或離開即場: {self.match_tracker.removed}')
+        self.trigger_engine.Forget(self.match_tracker.removed)
+        self._RecordOdds(matches, snapshot)
+        
+        self.logger.debug(f'將檢查共{len(matches)}場賽事')
+        print(f'將檢查共{len(matches)}場賽事')
+        return matches
+
+    def _RecordOdds(self, matches :List[Match], snapshot :OddsSnapshot):
+        try:
+            with REGISTRY.Time('fetcher_stage_seconds', stage='odds_series'):
+                self.odds_recorder.Append(snapshot, matches)
+        except Exception as ex:
+            self.logger.error(f"保存即場賠率走勢失敗. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+
+    def _SelectMatches(self, matches :List[Match], snapshot :OddsSnapshot) -> List[Match]:
+        selected = self.match_tracker.SelectForProcessing(matches, snapshot, self.trigger_engine.MayTrigger)
+        if len(selected) < len(matches):
+            self.logger.debug(f'{len(matches) - len(selected)}場賽事沒有變化且不在通知範圍, 今次略過')
+        return selected
+
     def FindMatch(self) -> List[List[str]]:
         self.logger.debug(f"進行第{self.fetch_counter}次fetching")
         print(f"進行第{self.fetch_counter}次fetching")
+        self.next_poll_at = 0
+        cycle_start = time.perf_counter()
         
         try:
-            prefetches = self.crawler.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_All_Odd_Api.value).json()
-            if not prefetches['matches'] is None and len(prefetches['matches']) > 0:
-                first_match = next((x for x in prefetches['matches'] if len(x['inplayPools']) > 0), None)
-                if first_match is None:
-                    self._SleepThread("未能搵到下場有即場的賽事, 休息8小時", 480)
-                    return []
-                import dateutil.parser
-                first_match_time = dateutil.parser.parse(first_match['matchDate'])
-                time_until = (first_match_time - datetime.now(tz=pytz.timezone('Asia/Hong_Kong'))).total_seconds()
-                if time_until > 28860:
-                    self._SleepThread("下場賽事超過8小時後", 480)
-                    return []
-                if time_until > 14460:
-                    self._SleepThread("下場賽事超過4小時後", 240)
-                    return []
-                if time_until > 7260:
-                    self._SleepThread("下場賽事超過2小時後", 120)
-                    return []
-                if time_until > 3660:
-                    self._SleepThread("下場賽事超過1小時後", 60)
-                    return []
-                if time_until > 1860:
-                    self._SleepThread("下場賽事超過半小時後", 30)
-                    return []
-                if time_until > 960:
-                    self._SleepThread("下場賽事超過15分鐘後", 15)
-                    return []
-                if time_until > 360:
-                    self._SleepThread("下場賽事大約5分鐘至15分鐘後", 5)
-                    return []
+            with REGISTRY.Time('fetcher_stage_seconds', stage='odds_snapshot'):
+                prefetches = self.crawler.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_All_Odd_Api.value).json()
+                snapshot = OddsSnapshot(prefetches)
+            self.last_snapshot_at = time.monotonic()
+            self.logger.debug(f"已取得{len(snapshot)}場賽事賠率快照")
+            idle_plan = self.scheduler.PlanIdle(prefetches)
+            if idle_plan is not None:
+                self._Idle(idle_plan)
+                return []
             
         except Exception as ex:
             self.logger.debug(f"從網頁取得資料失敗, 類別: {type(ex)}, {ex}, {ex.args}")
@@ -214,7 +316,8 @@ class Fetcher:
             
         try:
             #result = self.crawler.GetWebsiteData(SiteApi.G10OAL.value, SiteApi.G10OAL_Live_Mathces.value).text
-            result = self.crawler.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_Result_Api.value).json()
+            with REGISTRY.Time('fetcher_stage_seconds', stage='results'):
+                result = self.crawler.GetWebsiteData(SiteApi.HKJC.value, SiteApi.HKJC_Result_Api.value).json()
         except Exception as ex:
             self.logger.debug(f"從網頁取得資料失敗, 類別: {type(ex)}, {ex}, {ex.args}")
             return []
@@ -246,33 +349,82 @@ class Fetcher:
         #         self._SleepThread("所有賽事均未開賽, 或已開賽但沒有即場或已入球", 1)
         #         return toReturn
 
-        matches :List[Match] = []
-        if len(result) < 2:
-            print("收到奇怪的response")
+        matches = self._GetLiveMatches(result, snapshot)
+        if matches is None:
             return toReturn
         
-        for match in (result[1]['matches'] + result[0]['matches']):
-            available_state = ['FirstHalf', 'FirstHalfCompleted', 'SecondHalf']
-            if not match['matchState'] in available_state:
-                continue
-            matches.append(Match(match, SiteApi.HKJC.name))
-
-        self.logger.debug(f'將檢查共{len(matches)}場賽事')
-        print(f'將檢查共{len(matches)}場賽事')
         q = queue.Queue()
-        for match in matches:
-            q.put((match,))
+        for match in self._SelectMatches(matches, snapshot):
+            q.put((match, snapshot))
             
+        pending_predictions = []
         for i in range(16):
-            thread = threading.Thread(target=self._ProcessMatch, args=(q, toReturn) )
+            thread = threading.Thread(target=self._ProcessMatch, args=(q, toReturn, pending_predictions) )
             thread.daemon = True
             thread.start()
         
         q.join()
+        with REGISTRY.Time('fetcher_stage_seconds', stage='prediction'):
+            self._AttachPredictions(pending_predictions)
+        with REGISTRY.Time('fetcher_stage_seconds', stage='flush'):
+            self.repository.FlushPendingUpserts()
+        
+        self.logger.debug(f"連線統計: {self.crawler.GetConnectionStats()}")
+        self.logger.debug(f"快取統計: {self.repository.GetCacheStats()}")
+        self._SchedulePoll(self.scheduler.PlanLive(matches, snapshot, self.trigger_engine))
+        REGISTRY.Observe('fetcher_cycle_seconds', time.perf_counter() - cycle_start)
+        self.fetch_counter += 1
+        return toReturn
+
+    async def FindMatchAsync(self) -> List[List[str]]:
+        self.logger.debug(f"進行第{self.fetch_counter}次fetching")
+        print(f"進行第{self.fetch_counter}次fetching")
+        self.next_poll_at = 0
+        cycle_start = time.perf_counter()
+        
+        try:
+            with REGISTRY.Time('fetcher_stage_seconds', stage='odds_snapshot'):
+                prefetches = (await self.crawler.GetWebsiteDataAsync(SiteApi.HKJC.value, SiteApi.HKJC_All_Odd_Api.value)).json()
+                snapshot = OddsSnapshot(prefetches)
+            self.last_snapshot_at = time.monotonic()
+            self.logger.debug(f"已取得{len(snapshot)}場賽事賠率快照")
+            idle_plan = self.scheduler.PlanIdle(prefetches)
+            if idle_plan is not None:
+                self._Idle(idle_plan)
+                return []
             
+            with REGISTRY.Time('fetcher_stage_seconds', stage='results'):
+                result = (await self.crawler.GetWebsiteDataAsync(SiteApi.HKJC.value, SiteApi.HKJC_Result_Api.value)).json()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self.logger.debug(f"從網頁取得資料失敗, 類別: {type(ex)}, {ex}, {ex.args}")
+            return []
+        
+        matches = self._GetLiveMatches(result, snapshot)
+        if matches is None:
+            return []
+        
+        pending_predictions = []
+        results = await asyncio.gather(*(self._ProcessMatchAsync(m, snapshot, pending_predictions) for m in self._SelectMatches(matches, snapshot)))
+        toReturn = [message for messages in results for message in messages]
+        with REGISTRY.Time('fetcher_stage_seconds', stage='prediction'):
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._AttachPredictions, pending_predictions)
+        with REGISTRY.Time('fetcher_stage_seconds', stage='flush'):
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.repository.FlushPendingUpserts)
+        
+        self.logger.debug(f"連線統計: {self.crawler.GetConnectionStats()}")
+        self.logger.debug(f"快取統計: {self.repository.GetCacheStats()}")
+        self._SchedulePoll(self.scheduler.PlanLive(matches, snapshot, self.trigger_engine))
+        REGISTRY.Observe('fetcher_cycle_seconds', time.perf_counter() - cycle_start)
         self.fetch_counter += 1
         return toReturn
     
+    def _GetResultCopy(self, match_id :str) -> ResultDto:
+        # the repository hands out its shared cached instance; changes are made on a copy and published by EnqueueUpsert
+        dto = self.repository.GetResultById(match_id)
+        return copy.copy(dto) if dto is not None else None
+
     def _GetOddIncrement(self, odd:float):
         if odd < 1.5:
             return 0.03
@@ -290,45 +442,16 @@ class Fetcher:
     def _GetSuccessRateMessage_20240122(self, match :Match, ht_line, ht_odd:float, ft_line, ft_odd:float) -> str:
         previous_records = self.repository.GetResults(True)
         win_rate = "\n\n===過往紀錄分析===\n"
-        match_goalline_records = [x for x in previous_records if x.ht_prematch_goalline == ht_line and x.ft_prematch_goalline == ft_line]
         
-        success = 0
-        two_ball_success = 0
-        total = 0
         self.logger.debug(f"[{match.id}]將檢查全場半場賠率, 時間值:{match.time_int}, 半場{ht_line}賠率值:{ht_odd}, 全場{ft_line}賠率值:{ft_odd}")
         
         ht_odd_increment = self._GetOddIncrement(ht_odd)
         ft_odd_increment = self._GetOddIncrement(ft_odd)
         self.logger.debug(f"[{match.id}]半場誤差值{ht_odd_increment}, 全場誤差值{ft_odd_increment}")
         
-        if match.is_first_half:
-            for record in match_goalline_records:
-                if (ht_odd <= record.ht_prematch_odd + ht_odd_increment and
-                    ht_odd >= record.ht_prematch_odd - ht_odd_increment and
-                    ft_odd <= record.ft_prematch_odd + ft_odd_increment and
-                    ft_odd >= record.ft_prematch_odd - ft_odd_increment and
-                    match.time_int == record.ht_time):
-                    if record.ht_success > 0:
-                        success += 1
-                    if record.ht_success > 1:
-                        two_ball_success += 1
-                        
-                    total += 1
-            self.logger.debug(f"[{match.id}]檢查結果: 共有{total}類似紀錄, 共{success}場成功賽事")
-        
-        else:
-            for record in match_goalline_records:
-                if (ht_odd <= record.ht_prematch_odd + ht_odd_increment and
-                    ht_odd >= record.ht_prematch_odd - ht_odd_increment and
-                    ft_odd <= record.ft_prematch_odd + ft_odd_increment and
-                    ft_odd >= record.ft_prematch_odd - ft_odd_increment and
-                    match.time_int == record.ft_time):
-                    if record.ft_success > 0:
-                        success += 1
-                    if record.ft_success > 1:
-                        two_ball_success += 1
-                    total += 1
-            self.logger.debug(f"[{match.id}]檢查結果: 共有{total}類似紀錄, 共{success}場成功賽事")
+        half = HALF_TIME if match.is_first_half else FULL_TIME
+        success, two_ball_success, total = self.repository.GetHistoricalIndex().Query(ht_line, ft_line, half, match.time_int, ht_odd, ht_odd_increment, ft_odd, ft_odd_increment)
+        self.logger.debug(f"[{match.id}]檢查結果: 共有{total}類似紀錄, 共{success}場成功賽事")
             
         if total < 4:
             return ""
@@ -341,14 +464,14 @@ class Fetcher:
         win_rate += f"\n相類似{total}場賽事有1球機會: {success_rate:.2f}%"
         win_rate += f"\n有2球機會: {two_ball_success_rate:.2f}%"
         
-        dto = self.repository.GetResultById(match.id)
+        dto = self._GetResultCopy(match.id)
         if dto is not None:
             if match.is_first_half and dto.ht_prob is None:
                 dto.ht_prob = success_rate
-                self.repository.Upsert(dto)
+                self.repository.EnqueueUpsert(dto)
             elif dto.ft_prob is None:
                 dto.ft_prob = success_rate
-                self.repository.Upsert(dto)
+                self.repository.EnqueueUpsert(dto)
             
         self.logger.debug(f"檢查最近{RELIABLE_DAYS}日已紀錄場次可靠程度")
         recent_matches = [x for x in previous_records if x.match_date is not None and (match.date.date() - x.match_date.date()).days <= RELIABLE_DAYS]
@@ -378,71 +501,28 @@ class Fetcher:
             
         return win_rate
     
-    def _GetPredictionFromModel(self, ht_time,ht_odd,ht_prematch_odd,ft_prematch_odd,ht_rise,ft_rise,ht_prematch_goalline,ft_prematch_goalline, match :Match) -> str:
-        import joblib
-        def ConvertFlowToDigit(flow) -> int:
-            if flow is None:
-                return 2
-            if flow:
-                return 1
-            return 0
-        
-        def ConvertGoalLineToDigit(goalLine) -> int:
-            if goalLine == '0.5/1.0':
-                return 0
-            if goalLine == '1.0/1.5':
-                return 1
-            if goalLine == '1.5':
-                return 2
-            if goalLine == '1.5/2.0':
-                return 3
-            if goalLine == '2.0/2.5':
-                return 4
-            if goalLine == '2.5':
-                return 5
-            if goalLine == '2.5/3.0':
-                return 6
-            if goalLine == '3.0/3.5':
-                return 7
-            if goalLine == '3.5':
-                return 8
-            if goalLine == '3.5/4.0':
-                return 9
-            if goalLine == '4.0/4.5':
-                return 10
-            if goalLine == '4.5':
-                return 11
-            if goalLine == '4.5/5.0':
-                return 12
-            if goalLine == '5.0/5.5':
-                return 13
-            if goalLine == '5.5':
-                return 14
-            return 15
-            
-        ht_goalline = ConvertGoalLineToDigit(ht_prematch_goalline)
-        ft_goalline = ConvertGoalLineToDigit(ft_prematch_goalline)
-        ht_flow = ConvertFlowToDigit(ht_rise)
-        ft_flow = ConvertFlowToDigit(ft_rise)
-        
-        model = joblib.load('model_lib2.joblib')
-        predictions = model.predict([[
-            ht_time,
-            ht_odd,
-            ht_prematch_odd,
-            ft_prematch_odd,
-            ht_flow,
-            ft_flow,
-            ht_goalline,
-            ft_goalline]])
-        
-        bot_predict = predictions[0] == 1
-        dto = self.repository.GetResultById(match.id)
+    def _AttachPredictions(self, pending_predictions :list):
+        if len(pending_predictions) == 0:
+            return
+        try:
+            predictions = self.model_server.Predict([x[1] for x in pending_predictions])
+        except Exception as ex:
+            self.logger.error(f"模型預測期間發生錯誤. 錯誤類型:{type(ex)}. 錯誤內容:{ex}, {ex.args}")
+            return
+        for (notification, _, match), (prediction, probability) in zip(pending_predictions, predictions):
+            self.logger.debug(f"[{match.id}]模型預測:{prediction}, 有入球機率:{probability}")
+            try:
+                notification[1] += self._GetPredictionMessage(prediction == 1, match)
+            except Exception as ex:
+                self.logger.error(f"[{match.id}]整合預測訊息期間發生錯誤. 錯誤類型:{type(ex)}. 錯誤內容:{ex}, {ex.args}")
+    
+    def _GetPredictionMessage(self, bot_predict :bool, match :Match) -> str:
+        dto = self._GetResultCopy(match.id)
         if not dto is None and dto.ht_pred is None:
             dto.ht_pred = 1 if bot_predict else 0
-            self.repository.Upsert(dto)
+            self.repository.EnqueueUpsert(dto)
         
-        previous_records :List[ResultDto] = self.repository.GetResults(False)
+        previous_records :List[ResultDto] = self.repository.GetResults(True)
         
         self.logger.debug(f"檢查最近{RELIABLE_DAYS}日預測可靠程度")
         recent_matches = [x for x in previous_records if x.match_date is not None and (match.date.date() - x.match_date.date()).days <= RELIABLE_DAYS]
@@ -478,138 +558,181 @@ class Fetcher:
         predict_msg += f"\n近{RELIABLE_DAYS}日命中:{reliable_rate:.2f}%"
         return predict_msg
     
-    def _ProcessMatch(self, queue: queue.Queue, toReturn:list):
-        try:
-            while not queue.empty():
-                m :Match = queue.get()[0]
-                if not m.is_started:
-                    print(f'{str(m)}未開場')
-                    queue.task_done()
-                    continue
-                if m.is_goaled:
-                    print(f'{str(m)}已入波')
-                    queue.task_done()
-                    continue
-                if not m.is_live_match:
-                    print(f'{str(m)}無即場')
-                    queue.task_done()
-                    continue
-                if m.time_int >= 41 and m.is_first_half and m.id not in self.ht_last_min:
-                    header = f'{m.home_name} 對 {m.away_name} 半場最後4分鐘'
-                    body = f'目前球賽時間 {m.time_text}'
-                    toReturn.append((header, body))
-                    last_min_dto = self.repository.GetResultById(m.id)
-                    if last_min_dto is not None:
-                        last_min_dto.ht_last_min = True
-                        self.repository.Upsert(last_min_dto)
-                    self.ht_last_min.append(m.id)
-                    if len(self.ht_last_min) > 5:
-                        _ = self.ht_last_min.pop(0)
-                if m.time_int >= 86 and not m.is_first_half and m.id not in self.ft_last_min:
-                    header = f'{m.home_name} 對 {m.away_name} 全場最後4分鐘'
-                    body = f'目前球賽時間 {m.time_text}'
-                    toReturn.append((header, body))
-                    last_min_dto = self.repository.GetResultById(m.id)
-                    if last_min_dto is not None:
-                        last_min_dto.ft_last_min = True
-                        self.repository.Upsert(last_min_dto)
-                    self.ft_last_min.append(m.id)
-                    if len(self.ft_last_min) > 5:
-                        _ = self.ft_last_min.pop(0)
-                if m.is_first_half and m.id in self.half_time_fetch_cache:
-                    print(f'{str(m)}上半場已通知')
-                    queue.task_done()
-                    continue
-                if not m.is_first_half and m.id in self.full_time_fetch_cache:
-                    print(f'{str(m)}下半場已通知')
-                    queue.task_done()
-                    continue
-                
-                self.logger.debug(f"{m.id}賽事有即場, 目前比分為0-0, 且未進行通知. 將取得即場賠率")
-                odd = self.crawler.GetLiveTimeOdds(m.id)
-                if odd == -1:
-                    self.logger.debug(f"{m.id}賽事沒有即場0.75大球賠率")
-                    print(f'{str(m)}搵唔到賠率')
-                    queue.task_done()
-                    continue
-                if odd < 2:
-                    self.logger.debug(f"{m.id}賽事0.75大賠率未達2倍")
-                    print(f'{str(m)}目前賠率{odd}, 未達2水')
-                    queue.task_done()
-                    continue
-                if odd > 2.15:
-                    self.logger.debug(f"{m.id}賽事0.75大賠率超過2.15, 不宜紀錄")
-                    print(f'{str(m)}目前賠率超過2.15, 不會紀錄及通知')
-                    queue.task_done()
-                    continue
-                
-                self.logger.debug(f"{m.id}賽事附合要求, 將取得賽前賠率並計算成功率")
-                prematch_odds = self.crawler.GetPreMatchOdds(m.id)
-                ht_prematch_goal_line = list(prematch_odds['ht'])[0]
-                self.logger.debug(f"{m.id}賽事賽前半場中位數 {ht_prematch_goal_line}")
-                ft_prematch_goal_line = list(prematch_odds['ft'])[0]
-                self.logger.debug(f"{m.id}賽事賽前全場中位數 {ft_prematch_goal_line}")
-                ht_prematch_high_odd = prematch_odds['ht'][ht_prematch_goal_line][0]
-                ht_prematch_odd_flow = prematch_odds['ht'][ht_prematch_goal_line][1]
-                self.logger.debug(f"{m.id}賽事賽前半場大波賠率 {ht_prematch_high_odd}")
-                ft_prematch_high_odd = prematch_odds['ft'][ft_prematch_goal_line][0]
-                ft_prematch_odd_flow = prematch_odds['ft'][ft_prematch_goal_line][1]
-                self.logger.debug(f"{m.id}賽事賽前全場大波賠率 {ft_prematch_high_odd}")
-                if m.is_first_half:
-                    if ht_prematch_odd_flow is None:
-                        flow = '無升跌'
-                    elif ht_prematch_odd_flow:
-                        flow = '回飛'
-                    else:
-                        flow = '落飛'
-                else:
-                    if ft_prematch_odd_flow is None:
-                        flow = '無升跌'
-                    elif ft_prematch_odd_flow:
-                        flow = '回飛'
-                    else:
-                        flow = '落飛'
-                self.logger.debug(f"{m.id}賽事賽前大波賠率為 {flow}")
-                
-                dto = self.repository.GetResultById(m.id)
-                if dto is None and m.is_first_half:
-                    self.logger.debug(f"{m.id}賽事為新增項目, 將新增至資料庫")
-                    new_dto = ResultDto(m.id, m.time_int, odd)
-                    new_dto.match_date = m.date
-                    self.repository.Upsert(new_dto)
-                elif not dto is None and not m.is_first_half:
-                    self.logger.debug(f"{m.id}為下半場賽事, 將更新資料庫")
-                    dto.ft_time = m.time_int
-                    dto.ft_odd = odd
-                    self.repository.Upsert(dto)
-                            
-                header = f'{m.home_name} 對 {m.away_name} 即場0.75大有水'
-                body = f'目前球賽時間 {m.time_text}\n'
-                #body += f'目前賠率: 0.5/1.0大 - {odd}\n'
-                body += f'賽前賠率: {ht_prematch_goal_line if m.is_first_half else ft_prematch_goal_line}大 - {ht_prematch_high_odd if m.is_first_half else ft_prematch_high_odd}, {flow}'
-                body += f'{self._GetSuccessRateMessage_20240122(m, ht_prematch_goal_line, ht_prematch_high_odd, ft_prematch_goal_line, ft_prematch_high_odd)}'
-                if m.is_first_half:
-                    body += f'{self._GetPredictionFromModel(m.time_int, odd, ht_prematch_high_odd, ft_prematch_high_odd, ht_prematch_odd_flow, ft_prematch_odd_flow, ht_prematch_goal_line, ft_prematch_goal_line, m)}'
-                self.logger.debug(f"{m.id}賽事將發出通知")
-                print(f'{str(m)}將發出通知')
-                toReturn.append([header, body])
-                
-                if m.is_first_half:
-                    if len(self.half_time_fetch_cache) > 50:
-                        _ = self.half_time_fetch_cache.pop(0)
-                        
-                    self.half_time_fetch_cache.append(m.id)
+    def _PrepareMatch(self, m :Match) -> bool:
+        if not m.is_started:
+            print(f'{str(m)}未開場')
+            return False
+        if m.is_goaled:
+            print(f'{str(m)}已入波')
+            return False
+        if not m.is_live_match:
+            print(f'{str(m)}無即場')
+            return False
+        if self._IsNotified(m):
+            print(f'{str(m)}{"上" if m.is_first_half else "下"}半場已通知')
+        return True
+
+    def _ResolveOdds(self, m :Match, snapshot :OddsSnapshot) -> dict:
+        odds = {}
+        for line in self.trigger_engine.GetRequiredLines(m):
+            odd = snapshot.GetLiveTimeOdd(m.id, line)
+            if odd is None:
+                self.logger.debug(f"{m.id}賽事不在賠率快照內, 將個別取得即場{line}賠率")
+                with REGISTRY.Time('fetcher_stage_seconds', m.id, stage='live_odds'):
+                    odd = self.crawler.GetLiveTimeOdds(m.id, line)
+            odds[line] = odd
+        return odds
+
+    async def _ResolveOddsAsync(self, m :Match, snapshot :OddsSnapshot) -> dict:
+        odds = {}
+        for line in self.trigger_engine.GetRequiredLines(m):
+            odd = snapshot.GetLiveTimeOdd(m.id, line)
+            if odd is None:
+                self.logger.debug(f"{m.id}賽事不在賠率快照內, 將個別取得即場{line}賠率")
+                with REGISTRY.Time('fetcher_stage_seconds', m.id, stage='live_odds'):
+                    odd = await self.crawler.GetLiveTimeOddsAsync(m.id, line)
+            odds[line] = odd
+        return odds
+
+    def _EvaluateTriggers(self, m :Match, odds :dict) -> List[TriggerEvent]:
+        events = self.trigger_engine.Evaluate(m, odds)
+        triggered_lines = {event.rule.line for event in events}
+        for line, odd in odds.items():
+            if line in triggered_lines:
+                continue
+            if odd == -1:
+                self.logger.debug(f"{m.id}賽事沒有即場{line}大球賠率")
+                print(f'{str(m)}搵唔到賠率')
+            else:
+                self.logger.debug(f"{m.id}賽事{line}大賠率{odd}未符合觸發條件")
+                print(f'{str(m)}目前賠率{odd}, 未符合通知條件')
+        return events
+
+    def _BuildAlert(self, event :TriggerEvent) -> tuple:
+        m = event.match
+        header = f'{m.home_name} 對 {m.away_name} {event.rule.label}'
+        body = f'目前球賽時間 {m.time_text}'
+        if event.odd is not None:
+            body += f'\n目前賠率: {event.rule.line}大 - {event.odd}'
+        if event.rule.name in (HT_LAST_MIN_RULE, FT_LAST_MIN_RULE):
+            last_min_dto = self._GetResultCopy(m.id)
+            if last_min_dto is not None:
+                if event.rule.name == HT_LAST_MIN_RULE:
+                    last_min_dto.ht_last_min = True
                 else:
-                    if len(self.full_time_fetch_cache) > 50:
-                        _ = self.full_time_fetch_cache.pop(0)
-                        
-                    self.full_time_fetch_cache.append(m.id)
+                    last_min_dto.ft_last_min = True
+                self.repository.EnqueueUpsert(last_min_dto)
+            seconds_to_window = m.GetSecondsToMinute(event.rule.min_minute)
+            if seconds_to_window is not None:
+                REGISTRY.Observe('last_min_alert_lateness_seconds', max(-seconds_to_window, 0), m.id, half=event.half)
+        self.logger.debug(f"{m.id}賽事觸發{event.rule.name}, 將發出通知")
+        return (header, body)
+
+    def _BuildNotification(self, m :Match, odd :float, prematch_odds :dict, pending_predictions :list) -> list:
+        ht_prematch_goal_line = list(prematch_odds['ht'])[0]
+        self.logger.debug(f"{m.id}賽事賽前半場中位數 {ht_prematch_goal_line}")
+        ft_prematch_goal_line = list(prematch_odds['ft'])[0]
+        self.logger.debug(f"{m.id}賽事賽前全場中位數 {ft_prematch_goal_line}")
+        ht_prematch_high_odd = prematch_odds['ht'][ht_prematch_goal_line][0]
+        ht_prematch_odd_flow = prematch_odds['ht'][ht_prematch_goal_line][1]
+        self.logger.debug(f"{m.id}賽事賽前半場大波賠率 {ht_prematch_high_odd}")
+        ft_prematch_high_odd = prematch_odds['ft'][ft_prematch_goal_line][0]
+        ft_prematch_odd_flow = prematch_odds['ft'][ft_prematch_goal_line][1]
+        self.logger.debug(f"{m.id}賽事賽前全場大波賠率 {ft_prematch_high_odd}")
+        if m.is_first_half:
+            if ht_prematch_odd_flow is None:
+                flow = '無升跌'
+            elif ht_prematch_odd_flow:
+                flow = '回飛'
+            else:
+                flow = '落飛'
+        else:
+            if ft_prematch_odd_flow is None:
+                flow = '無升跌'
+            elif ft_prematch_odd_flow:
+                flow = '回飛'
+            else:
+                flow = '落飛'
+        self.logger.debug(f"{m.id}賽事賽前大波賠率為 {flow}")
+        
+        dto = self._GetResultCopy(m.id)
+        if dto is None and m.is_first_half:
+            self.logger.debug(f"{m.id}賽事為新增項目, 將新增至資料庫")
+            new_dto = ResultDto(m.id, m.time_int, odd)
+            new_dto.match_date = ToMatchDate(m.date)
+            self.repository.EnqueueUpsert(new_dto)
+        elif not dto is None and not m.is_first_half:
+            self.logger.debug(f"{m.id}為下半場賽事, 將更新資料庫")
+            dto.ft_time = m.time_int
+            dto.ft_odd = odd
+            self.repository.EnqueueUpsert(dto)
                     
+        header = f'{m.home_name} 對 {m.away_name} 即場0.75大有水'
+        body = f'目前球賽時間 {m.time_text}\n'
+        #body += f'目前賠率: 0.5/1.0大 - {odd}\n'
+        body += f'賽前賠率: {ht_prematch_goal_line if m.is_first_half else ft_prematch_goal_line}大 - {ht_prematch_high_odd if m.is_first_half else ft_prematch_high_odd}, {flow}'
+        with REGISTRY.Time('fetcher_stage_seconds', m.id, stage='success_rate'):
+            body += f'{self._GetSuccessRateMessage_20240122(m, ht_prematch_goal_line, ht_prematch_high_odd, ft_prematch_goal_line, ft_prematch_high_odd)}'
+        notification = [header, body]
+        if m.is_first_half:
+            features = BuildFeatureRow(m.time_int, odd, ht_prematch_high_odd, ft_prematch_high_odd, ht_prematch_odd_flow, ft_prematch_odd_flow, ht_prematch_goal_line, ft_prematch_goal_line)
+            pending_predictions.append((notification, features, m))
+        self.logger.debug(f"{m.id}賽事將發出通知")
+        print(f'{str(m)}將發出通知')
+        return notification
+
+    def _ProcessMatch(self, queue: queue.Queue, toReturn:list, pending_predictions :list):
+        m = None
+        try:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    break
+                m :Match = item[0]
+                snapshot :OddsSnapshot = item[1]
+                with REGISTRY.Time('fetcher_match_seconds', m.id):
+                    if self._PrepareMatch(m):
+                        for event in self._EvaluateTriggers(m, self._ResolveOdds(m, snapshot)):
+                            if event.rule.name == NOTIFY_RULE:
+                                self.logger.debug(f"{m.id}賽事附合要求, 將取得賽前賠率並計算成功率")
+                                with REGISTRY.Time('fetcher_stage_seconds', m.id, stage='prematch_odds'):
+                                    prematch_odds = self.crawler.GetPreMatchOdds(m.id)
+                                toReturn.append(self._BuildNotification(m, event.odd, prematch_odds, pending_predictions))
+                            else:
+                                toReturn.append(self._BuildAlert(event))
+                            self.trigger_engine.Fire(event)
                 queue.task_done()
         except Exception as ex:
-            self.logger.error(f"取得{m.id}賽事賠率期間發生錯誤. 錯誤類型:{type(ex)}. 錯誤內容:{ex}, {ex.args}")
+            self.logger.error(f"取得{m.id if m is not None else ''}賽事賠率期間發生錯誤. 錯誤類型:{type(ex)}. 錯誤內容:{ex}, {ex.args}")
             print("Unknow exception occurred. Gracefully abort process")
             queue.task_done()
+
+    async def _ProcessMatchAsync(self, m :Match, snapshot :OddsSnapshot, pending_predictions :list) -> list:
+        with REGISTRY.Time('fetcher_match_seconds', m.id):
+            return await self._ProcessMatchStepsAsync(m, snapshot, pending_predictions)
+
+    async def _ProcessMatchStepsAsync(self, m :Match, snapshot :OddsSnapshot, pending_predictions :list) -> list:
+        toReturn = []
+        loop = asyncio.get_running_loop()
+        try:
+            if not self._PrepareMatch(m):
+                return toReturn
+            for event in self._EvaluateTriggers(m, await self._ResolveOddsAsync(m, snapshot)):
+                if event.rule.name == NOTIFY_RULE:
+                    self.logger.debug(f"{m.id}賽事附合要求, 將取得賽前賠率並計算成功率")
+                    with REGISTRY.Time('fetcher_stage_seconds', m.id, stage='prematch_odds'):
+                        prematch_odds = await self.crawler.GetPreMatchOddsAsync(m.id)
+                    toReturn.append(await loop.run_in_executor(self.executor, self._BuildNotification, m, event.odd, prematch_odds, pending_predictions))
+                else:
+                    toReturn.append(await loop.run_in_executor(self.executor, self._BuildAlert, event))
+                self.trigger_engine.Fire(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self.logger.error(f"取得{m.id}賽事賠率期間發生錯誤. 錯誤類型:{type(ex)}. 錯誤內容:{ex}, {ex.args}")
+            print("Unknow exception occurred. Gracefully abort process")
+        return toReturn
     
 if __name__ == "__main__":
     from Crawler import Crawler
@@ -0,0 +1,184 @@
+import bs4
+import Utils
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = None
+    lxml_html = None
+
+HALF_TIME_TABLE = 'fhl'
+FULL_TIME_TABLE = 'hil'
+SECONDARY_ROW_CLASS = 'table-secondary'
+TEXT_CENTER_XPATH = ".//div[contains(concat(' ', normalize-space(@class), ' '), ' text-center ')]"
+
+def ReduceOddsRows(rows :list) -> dict:
+    wanted_odds = {}
+    check_median = 999.0
+    for high_text, goal_line, low_text in rows:
+        highOdd = float(high_text)
+
+        if goal_line in wanted_odds.keys():
+            if wanted_odds[goal_line][0] > highOdd:
+                wanted_odds[goal_line] = (wanted_odds[goal_line][0], True)
+            elif wanted_odds[goal_line][0] < highOdd:
+                wanted_odds[goal_line] = (wanted_odds[goal_line][0], False)
+            continue
+
+        lowOdd = float(low_text)
+        median = abs(highOdd - lowOdd)
+        if median < check_median:
+            check_median = median
+            wanted_odds.clear()
+            wanted_odds[goal_line] = (highOdd, None)
+    return wanted_odds
+
+def _GetScores(score_text :str, ft_score :str, ht_score :str) -> dict:
+    if '場已完' in score_text or 'FT 90' in score_text:
+        return {'ht': Utils.GetGoals(ht_score), 'ft': Utils.GetGoals(ft_score)}
+    return {}
+
+def _HasClass(element, class_name :str) -> bool:
+    return class_name in (element.get('class') or '').split()
+
+def _IsOddsRow(element) -> bool:
+    classes = (element.get('class') or '').split()
+    return len(classes) == 0 or any(c != SECONDARY_ROW_CLASS for c in classes)
+
+def _NextSibling(node):
+    element, is_tail = node
+    if not is_tail and element.tail:
+        return (element, True)
+    sibling = element.getnext()
+    if sibling is None:
+        return None
+    return (sibling, False)
+
+def _FindOddsRowsTree(tree, table_name :str) -> list:
+    anchor = tree.find(f".//a[@name='{table_name}']")
+    node = (anchor, False)
+    for _ in range(4):
+        node = _NextSibling(node)
+    table, is_tail = node
+    if is_tail:
+        raise ValueError(f"{table_name}賠率表位置不正確")
+    tbody = next(table.iter('tbody'))
+    rows = []
+    for tr in tbody.iter('tr'):
+        if not _IsOddsRow(tr):
+            continue
+        cells = [td.text_content() for td in tr.iter('td') if _HasClass(td, 'text-center')]
+        rows.append((cells[0], cells[1], cells[2] if len(cells) > 2 else None))
+    return rows
+
+def _FindOddsRowsSoup(soup, table_name :str) -> list:
+    table = soup.find("a", {"name" : table_name}).next_sibling.next_sibling.next_sibling.next_sibling
+    tbody = table.find("tbody")
+    rows = []
+    for odd in tbody.find_all("tr", class_=lambda c: c != SECONDARY_ROW_CLASS):
+        goalLines = odd.find_all("td", class_="text-center")
+        rows.append((goalLines[0].text, goalLines[1].text, goalLines[2].text if len(goalLines) > 2 else None))
+    return rows
+
+class G10oalPage:
+    def __init__(self, html :str, use_lxml :bool = True):
+        self.html = html
+        self.__tree = None
+        self.__soup = None
+        if use_lxml and lxml_html is not None:
+            try:
+                self.__tree = lxml_html.fromstring(html)
+            except (etree.ParserError, ValueError):
+                self.__tree = None
+
+    def _GetSoup(self):
+        if self.__soup is None:
+            self.__soup = bs4.BeautifulSoup(self.html, "html.parser")
+        return self.__soup
+
+    def GetResults(self) -> dict:
+        if self.__tree is not None:
+            try:
+                score_board = self.__tree.xpath(TEXT_CENTER_XPATH)[1]
+                score_text = score_board.text_content()
+                if not ('場已完' in score_text or 'FT 90' in score_text):
+                    return {}
+                ft_score = next(x for x in score_board.iter('div') if x is not score_board and _HasClass(x, 'lead')).text_content()
+                muted = next(x for x in score_board.iter('div') if x is not score_board and _HasClass(x, 'text-muted'))
+                ht_score = next(muted.iter('small')).text_content()
+                return _GetScores(score_text, ft_score, ht_score)
+            except (IndexError, StopIteration, ValueError):
+                pass
+
+        score_board = self._GetSoup().find_all('div', class_=lambda c: c == 'text-center')[1]
+        if not ('場已完' in score_board.text or 'FT 90' in score_board.text):
+            return {}
+        ft_score :str = score_board.find('div', class_='lead').text
+        ht_score :str = score_board.find('div', class_='text-muted').find('small').text
+        return _GetScores(score_board.text, ft_score, ht_score)
+
+    def GetOddsRows(self, table_name :str) -> list:
+        if self.__tree is not None:
+            try:
+                return _FindOddsRowsTree(self.__tree, table_name)
+            except (AttributeError, IndexError, TypeError, StopIteration, ValueError):
+                pass
+        return _FindOddsRowsSoup(self._GetSoup(), table_name)
+
+    def GetPreMatchOdds(self) -> dict:
+        return {'ht': ReduceOddsRows(self.GetOddsRows(HALF_TIME_TABLE)),
+                'ft': ReduceOddsRows(self.GetOddsRows(FULL_TIME_TABLE))}
+
+def ParseMatchResults(html :str) -> dict:
+    return G10oalPage(html).GetResults()
+
+def ParsePreMatchOdds(html :str) -> dict:
+    return G10oalPage(html).GetPreMatchOdds()
+
+def ParseMatchPage(html :str) -> tuple:
+    page = G10oalPage(html)
+    results = page.GetResults()
+    if len(results) == 0:
+        return (results, None)
+    return (results, page.GetPreMatchOdds())
+
+if __name__ == "__main__":
+    import glob
+    import os
+    import sys
+    import time
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'fixtures'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append((path, f.read()))
+    if len(pages) == 0:
+        print(f"{directory}沒有已保存的賽事頁面 (*.html)")
+        sys.exit(1)
+
+    def ParseWithSoup(html :str) -> tuple:
+        page = G10oalPage(html, use_lxml=False)
+        results = page.GetResults()
+        return (results, page.GetPreMatchOdds() if len(results) > 0 else None)
+
+    for path, html in pages:
+        assert ParseMatchPage(html) == ParseWithSoup(html), path
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            ParseWithSoup(html)
+    soup_time = (time.perf_counter() - start) / (repeat * len(pages))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            ParseMatchPage(html)
+    lxml_time = (time.perf_counter() - start) / (repeat * len(pages))
+
+    print(f"頁面: {len(pages)}, 重複: {repeat}, lxml: {'有' if lxml_html is not None else '沒有'}")
+    print(f"html.parser: {soup_time * 1000:.2f} ms/頁")
+    print(f"快速解析: {lxml_time * 1000:.2f} ms/頁 ({soup_time / lxml_time:.1f}x)")
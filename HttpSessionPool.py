@@ -0,0 +1,257 @@
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import asyncio
+import time
+from ResponseCache import ResponseCache, CachedEntry
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
+
+def GetCachedHeaders(cached :CachedEntry) -> dict:
+    headers = {}
+    if cached.content_type is not None:
+        headers['Content-Type'] = cached.content_type
+    if cached.etag is not None:
+        headers['ETag'] = cached.etag
+    if cached.last_modified is not None:
+        headers['Last-Modified'] = cached.last_modified
+    return headers
+
+def BuildCachedResponse(not_modified :requests.Response, cached :CachedEntry) -> requests.Response:
+    # a 304 has no body, so callers get a fresh 200 built from the cached entry rather than a patched 304
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.headers.update(GetCachedHeaders(cached))
+    response._content = cached.content
+    response.encoding = cached.encoding
+    response.url = not_modified.url
+    response.request = not_modified.request
+    response.elapsed = not_modified.elapsed
+    return response
+
+class SiteSession:
+    def __init__(self, site_domain :str, pool_size :int, cookie_ttl :int):
+        self.site_domain = site_domain
+        self.cookie_ttl = cookie_ttl
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.header = {"referer": site_domain, "user-agent": USER_AGENT}
+        self.cookie_lock = threading.Lock()
+        self.cookie_time = None
+        self.stats_lock = threading.Lock()
+        self.request_count = 0
+        self.cookie_refresh_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def IsCookieExpired(self) -> bool:
+        if self.cookie_time is None:
+            return True
+        if time.monotonic() - self.cookie_time > self.cookie_ttl:
+            return True
+        return any(cookie.is_expired() for cookie in self.session.cookies)
+
+    def RefreshCookies(self, timeout, force :bool = False):
+        with self.cookie_lock:
+            if not force and not self.IsCookieExpired():
+                return
+            self.session.cookies.clear()
+            self.session.get(self.site_domain, headers=self.header, timeout=timeout)
+            self.cookie_time = time.monotonic()
+            self.cookie_refresh_count += 1
+
+    def RecordLatency(self, elapsed :float):
+        with self.stats_lock:
+            self.request_count += 1
+            self.latency_total += elapsed
+            if elapsed > self.latency_max:
+                self.latency_max = elapsed
+
+    def GetConnectionCounts(self) -> tuple:
+        connections = 0
+        requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+        return (connections, requests_sent)
+
+    def Close(self):
+        self.session.close()
+
+class HttpSessionPool:
+    def __init__(self, pool_size :int = 16, connect_timeout :float = 5, read_timeout :float = 20, cookie_ttl :int = 1800, response_cache :ResponseCache = None):
+        self.pool_size = pool_size
+        self.response_cache = response_cache
+        self.timeout = (connect_timeout, read_timeout)
+        self.cookie_ttl = cookie_ttl
+        self.__sites = {}
+        self.__lock = threading.Lock()
+
+    def GetSiteSession(self, site_domain :str) -> SiteSession:
+        site = self.__sites.get(site_domain)
+        if site is not None:
+            return site
+        with self.__lock:
+            if not site_domain in self.__sites:
+                self.__sites[site_domain] = SiteSession(site_domain, self.pool_size, self.cookie_ttl)
+            return self.__sites[site_domain]
+
+    def Post(self, site_domain :str, site_api :str) -> requests.Response:
+        site = self.GetSiteSession(site_domain)
+        site.RefreshCookies(self.timeout)
+
+        url = f'{site_domain}{site_api}'
+        header = site.header
+        if self.response_cache is not None:
+            header = {**site.header, **self.response_cache.GetValidators(url)}
+        start = time.perf_counter()
+        result = site.session.post(url, headers=header, timeout=self.timeout)
+        if result.status_code in (401, 403):
+            site.RefreshCookies(self.timeout, force=True)
+            result = site.session.post(url, headers=header, timeout=self.timeout)
+        if result.status_code == 304:
+            cached = self.response_cache.GetRevalidated(url)
+            if cached is not None:
+                result = BuildCachedResponse(result, cached)
+            else:
+                # the entry was evicted since the validators were sent, so fetch the body unconditionally
+                result = site.session.post(url, headers=site.header, timeout=self.timeout)
+                if result.status_code == 200:
+                    self.response_cache.Store(url, result.headers, result.content, result.encoding)
+        elif result.status_code == 200 and self.response_cache is not None:
+            self.response_cache.Store(url, result.headers, result.content, result.encoding)
+        site.RecordLatency(time.perf_counter() - start)
+        return result
+
+    def Reset(self, site_domain :str):
+        with self.__lock:
+            site = self.__sites.pop(site_domain, None)
+        if site is not None:
+            site.Close()
+
+    def GetStats(self) -> dict:
+        stats = {}
+        for site_domain, site in list(self.__sites.items()):
+            handshakes, requests_sent = site.GetConnectionCounts()
+            with site.stats_lock:
+                stats[site_domain] = {
+                    'requests': site.request_count,
+                    'handshakes': handshakes,
+                    'reused_connections': max(requests_sent - handshakes, 0),
+                    'cookie_refreshes': site.cookie_refresh_count,
+                    'latency_avg': site.latency_total / site.request_count if site.request_count > 0 else 0.0,
+                    'latency_max': site.latency_max,
+                }
+        return stats
+
+    def Close(self):
+        with self.__lock:
+            sites = list(self.__sites.values())
+            self.__sites.clear()
+        for site in sites:
+            site.Close()
+
+class AsyncSiteSession:
+    def __init__(self, site_domain :str, pool_size :int, cookie_ttl :int, timeout :tuple):
+        import httpx
+        self.site_domain = site_domain
+        self.cookie_ttl = cookie_ttl
+        self.header = {"referer": site_domain, "user-agent": USER_AGENT}
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]))
+        self.semaphore = asyncio.Semaphore(pool_size)
+        self.cookie_lock = asyncio.Lock()
+        self.cookie_time = None
+        self.request_count = 0
+        self.cookie_refresh_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def IsCookieExpired(self) -> bool:
+        if self.cookie_time is None:
+            return True
+        return time.monotonic() - self.cookie_time > self.cookie_ttl
+
+    async def RefreshCookies(self, force :bool = False):
+        async with self.cookie_lock:
+            if not force and not self.IsCookieExpired():
+                return
+            self.client.cookies.clear()
+            await self.client.get(self.site_domain, headers=self.header)
+            self.cookie_time = time.monotonic()
+            self.cookie_refresh_count += 1
+
+    def RecordLatency(self, elapsed :float):
+        self.request_count += 1
+        self.latency_total += elapsed
+        if elapsed > self.latency_max:
+            self.latency_max = elapsed
+
+    async def Close(self):
+        await self.client.aclose()
+
+class AsyncSessionPool:
+    def __init__(self, pool_size :int = 16, connect_timeout :float = 5, read_timeout :float = 20, cookie_ttl :int = 1800, response_cache :ResponseCache = None):
+        self.pool_size = pool_size
+        self.response_cache = response_cache
+        self.timeout = (connect_timeout, read_timeout)
+        self.cookie_ttl = cookie_ttl
+        self.__sites = {}
+
+    def GetSiteSession(self, site_domain :str) -> AsyncSiteSession:
+        if not site_domain in self.__sites:
+            self.__sites[site_domain] = AsyncSiteSession(site_domain, self.pool_size, self.cookie_ttl, self.timeout)
+        return self.__sites[site_domain]
+
+    async def Post(self, site_domain :str, site_api :str):
+        site = self.GetSiteSession(site_domain)
+        async with site.semaphore:
+            await site.RefreshCookies()
+            
+            url = f'{site_domain}{site_api}'
+            header = site.header
+            if self.response_cache is not None:
+                header = {**site.header, **self.response_cache.GetValidators(url)}
+            start = time.perf_counter()
+            result = await site.client.post(url, headers=header)
+            if result.status_code in (401, 403):
+                await site.RefreshCookies(force=True)
+                result = await site.client.post(url, headers=header)
+            if result.status_code == 304:
+                cached = self.response_cache.GetRevalidated(url)
+                if cached is not None:
+                    import httpx
+                    result = httpx.Response(200, headers=GetCachedHeaders(cached), content=cached.content, request=result.request)
+                else:
+                    result = await site.client.post(url, headers=site.header)
+                    if result.status_code == 200:
+                        self.response_cache.Store(url, result.headers, result.content, result.encoding)
+            elif result.status_code == 200 and self.response_cache is not None:
+                self.response_cache.Store(url, result.headers, result.content, result.encoding)
+            site.RecordLatency(time.perf_counter() - start)
+            return result
+
+    def GetStats(self) -> dict:
+        stats = {}
+        for site_domain, site in list(self.__sites.items()):
+            stats[site_domain] = {
+                'requests': site.request_count,
+                'cookie_refreshes': site.cookie_refresh_count,
+                'latency_avg': site.latency_total / site.request_count if site.request_count > 0 else 0.0,
+                'latency_max': site.latency_max,
+            }
+        return stats
+
+    async def Close(self):
+        sites = list(self.__sites.values())
+        self.__sites.clear()
+        for site in sites:
+            await site.Close()
@@ -0,0 +1,86 @@
+from typing import Callable
+from OddsSnapshot import OddsSnapshot
+from Metrics import REGISTRY
+
+AVAILABLE_STATES = ('FirstHalf', 'FirstHalfCompleted', 'SecondHalf')
+CHANGE_NEW = 'new'
+CHANGE_STATE = 'state'
+CHANGE_SCORE = 'score'
+CHANGE_POOLS = 'pools'
+
+def GetScoreKey(data :dict) -> tuple:
+    return tuple((score.get('home'), score.get('away')) for score in data.get('accumulatedscore') or [])
+
+def GetPoolsKey(snapshot :OddsSnapshot, match_id :str) -> tuple:
+    if snapshot is None:
+        return ()
+    match_data = snapshot.GetMatch(match_id)
+    if match_data is None:
+        return ()
+    return tuple(sorted(match_data.get('inplayPools') or []))
+
+class TrackedMatch:
+    __slots__ = ('match', 'state', 'score', 'pools')
+
+    def __init__(self, match, state :str, score :tuple, pools :tuple):
+        self.match = match
+        self.state = state
+        self.score = score
+        self.pools = pools
+
+class MatchStateTracker:
+    def __init__(self, match_factory :Callable):
+        self.match_factory = match_factory
+        self.__matches = {}
+        self.changes = {}
+        self.removed = []
+
+    def __len__(self):
+        return len(self.__matches)
+
+    def Ingest(self, result :list, snapshot :OddsSnapshot = None) -> list:
+        matches = []
+        changes = {}
+        seen = set()
+        for data in (result[1]['matches'] + result[0]['matches']):
+            state = data['matchState']
+            if not state in AVAILABLE_STATES:
+                continue
+            match_id = data['matchID']
+            seen.add(match_id)
+            score = GetScoreKey(data)
+            pools = GetPoolsKey(snapshot, match_id)
+            tracked = self.__matches.get(match_id)
+            if tracked is None:
+                reasons = [CHANGE_NEW]
+            else:
+                reasons = [reason for reason, changed in ((CHANGE_STATE, tracked.state != state), (CHANGE_SCORE, tracked.score != score), (CHANGE_POOLS, tracked.pools != pools)) if changed]
+
+            if tracked is not None and (len(reasons) == 0 or reasons == [CHANGE_POOLS]):
+                tracked.match.RefreshTime()
+                tracked.pools = pools
+            else:
+                tracked = self.__matches[match_id] = TrackedMatch(self.match_factory(data), state, score, pools)
+            if len(reasons) > 0:
+                changes[match_id] = reasons
+                for reason in reasons:
+                    REGISTRY.Increment('match_tracker_changes_total', reason=reason)
+            matches.append(tracked.match)
+
+        self.removed = [match_id for match_id in self.__matches if not match_id in seen]
+        for match_id in self.removed:
+            del self.__matches[match_id]
+        self.changes = changes
+        return matches
+
+    def _NeedsProcessing(self, m, snapshot :OddsSnapshot, may_trigger :Callable) -> bool:
+        if m.id in self.changes:
+            return True
+        if not m.is_started or m.is_goaled or not m.is_live_match:
+            return False
+        return may_trigger(m, snapshot)
+
+    def SelectForProcessing(self, matches :list, snapshot :OddsSnapshot, may_trigger :Callable) -> list:
+        selected = [m for m in matches if self._NeedsProcessing(m, snapshot, may_trigger)]
+        REGISTRY.Increment('match_tracker_skipped_total', len(matches) - len(selected))
+        return selected
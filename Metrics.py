@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRICS_JSON_PATH = 'metrics.json'
+MAX_TRACKED_MATCHES = 200
+MAX_EVENTS_PER_MATCH = 50
+
+def _FormatLabels(labels :tuple) -> str:
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class Histogram:
+    def __init__(self, buckets :tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def Observe(self, value :float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def Quantile(self, quantile :float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = quantile * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+class Timer:
+    def __init__(self, registry, name :str, match_id, labels :dict):
+        self.registry = registry
+        self.name = name
+        self.match_id = match_id
+        self.labels = labels
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        self.registry.Observe(self.name, self.elapsed, match_id=self.match_id, **self.labels)
+        return False
+
+class MetricsRegistry:
+    def __init__(self):
+        self.__histograms = {}
+        self.__counters = {}
+        self.__matches = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__dump_thread = None
+
+    def Observe(self, name :str, value :float, match_id = None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.Observe(value)
+            if match_id is not None:
+                events = self.__matches.pop(match_id, None)
+                if events is None:
+                    events = deque(maxlen=MAX_EVENTS_PER_MATCH)
+                self.__matches[match_id] = events
+                events.append((time.time(), name, dict(labels), value))
+                while len(self.__matches) > MAX_TRACKED_MATCHES:
+                    self.__matches.popitem(last=False)
+
+    def Increment(self, name :str, value :float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def Time(self, name :str, match_id = None, **labels) -> Timer:
+        return Timer(self, name, match_id, labels)
+
+    def GetMatchValues(self, name :str) -> list:
+        with self.__lock:
+            return [value for events in self.__matches.values() for _, event_name, _, value in events if event_name == name]
+
+    def Reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+            self.__matches.clear()
+
+    def RenderPrometheus(self) -> str:
+        lines = []
+        with self.__lock:
+            names_seen = set()
+            for (name, labels), value in sorted(self.__counters.items()):
+                if name not in names_seen:
+                    lines.append(f'# TYPE {name} counter')
+                    names_seen.add(name)
+                lines.append(f'{name}{_FormatLabels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.__histograms.items()):
+                if name not in names_seen:
+                    lines.append(f'# TYPE {name} histogram')
+                    names_seen.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_FormatLabels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_bucket{_FormatLabels(labels + (("le", "+Inf"),))} {histogram.count}')
+                lines.append(f'{name}_sum{_FormatLabels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{_FormatLabels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def ToDict(self) -> dict:
+        with self.__lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in self.__counters.items()],
+                'histograms': [{
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'avg': histogram.sum / histogram.count if histogram.count > 0 else 0.0,
+                    'p50': histogram.Quantile(0.5),
+                    'p95': histogram.Quantile(0.95),
+                    'max': histogram.max,
+                } for (name, labels), histogram in self.__histograms.items()],
+                'matches': {str(match_id): [{'at': at, 'name': name, 'labels': labels, 'value': value} for at, name, labels, value in events]
+                            for match_id, events in self.__matches.items()},
+            }
+
+    def StartHttpServer(self, port :int, host :str = '0.0.0.0'):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry.ToDict(), ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                elif self.path.startswith('/metrics'):
+                    body = registry.RenderPrometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.__server.serve_forever, name="MetricsServer", daemon=True).start()
+
+    def DumpJson(self, path :str = METRICS_JSON_PATH):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.ToDict(), f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def StartJsonDump(self, path :str = METRICS_JSON_PATH, interval_seconds :float = 60):
+        def DumpLoop():
+            while True:
+                time.sleep(interval_seconds)
+                self.DumpJson(path)
+        self.__dump_thread = threading.Thread(target=DumpLoop, name="MetricsDump", daemon=True)
+        self.__dump_thread.start()
+
+    def Close(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server = None
+
+REGISTRY = MetricsRegistry()
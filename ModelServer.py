@@ -0,0 +1,46 @@
+import os
+import threading
+from typing import List
+import numpy as np
+from FeatureEncoder import BuildFeatureRow, ENCODER_VERSION
+
+MODEL_PATH = 'model_lib2.joblib'
+
+class ModelServer:
+    def __init__(self, loggerFactory, model_path :str = MODEL_PATH):
+        self.logger = loggerFactory.getLogger("ModelServer")
+        self.model_path = model_path
+        self.__model = None
+        self.__model_mtime = None
+        self.__lock = threading.Lock()
+
+    def GetModel(self):
+        mtime = os.stat(self.model_path).st_mtime_ns
+        if self.__model is not None and mtime == self.__model_mtime:
+            return self.__model
+        with self.__lock:
+            if self.__model is None or mtime != self.__model_mtime:
+                import joblib
+                self.logger.debug(f"正載入模型{self.model_path}")
+                model = joblib.load(self.model_path)
+                if isinstance(model, dict):
+                    if model.get('encoder_version') != ENCODER_VERSION:
+                        raise ValueError(f"模型{self.model_path}使用特徵編碼版本{model.get('encoder_version')}, 與目前版本{ENCODER_VERSION}不符")
+                    self.logger.debug(f"模型版本{model.get('version')}, 訓練紀錄{model.get('rows')}項")
+                    model = model['model']
+                self.__model = model
+                self.__model_mtime = mtime
+            return self.__model
+
+    def Predict(self, rows :List[list]) -> List[tuple]:
+        if len(rows) == 0:
+            return []
+        model = self.GetModel()
+        features = np.asarray(rows, dtype=np.float64)
+        predictions = model.predict(features)
+        probabilities = [None] * len(rows)
+        if hasattr(model, 'predict_proba') and 1 in list(model.classes_):
+            positive = list(model.classes_).index(1)
+            probabilities = model.predict_proba(features)[:, positive].tolist()
+        self.logger.debug(f"已為{len(rows)}場賽事進行預測")
+        return [(int(prediction), probability) for prediction, probability in zip(predictions, probabilities)]
@@ -0,0 +1,139 @@
+import os
+import time
+from datetime import datetime
+from typing import List
+import numpy as np
+from DataAccess.ResultColumns import ResultColumns
+from FeatureEncoder import BuildTrainingSet, FEATURE_NAMES, ENCODER_VERSION
+from ModelServer import MODEL_PATH
+
+MODEL_DIRECTORY = 'models'
+DEFAULT_FOLDS = 5
+DEFAULT_MODEL_PARAMS = {'criterion': 'gini', 'max_depth': None, 'min_samples_leaf': 1, 'random_state': 0}
+
+def GetTimeSplits(dates :np.ndarray, folds :int = DEFAULT_FOLDS) -> List[tuple]:
+    # NaT sorts as the smallest int64, so undated records are treated as the oldest
+    order = np.argsort(dates.astype(np.int64), kind='stable')
+    chunks = np.array_split(order, folds + 1)
+    return [(np.concatenate(chunks[:i + 1]), chunks[i + 1]) for i in range(folds) if len(chunks[i + 1]) > 0]
+
+def TrainModel(features :np.ndarray, labels :np.ndarray, params :dict = None):
+    from sklearn.tree import DecisionTreeClassifier
+    model = DecisionTreeClassifier(**(params if params is not None else DEFAULT_MODEL_PARAMS))
+    model.fit(features, labels)
+    return model
+
+def Evaluate(model, features :np.ndarray, labels :np.ndarray) -> dict:
+    predictions = model.predict(features)
+    predicted_yes = predictions == 1
+    predicted_no = ~predicted_yes
+    return {
+        'count': len(labels),
+        'accuracy': float(np.mean(predictions == labels) * 100) if len(labels) > 0 else 0.0,
+        'yes_count': int(predicted_yes.sum()),
+        'yes_hit_rate': float(np.mean(labels[predicted_yes] == 1) * 100) if predicted_yes.any() else 0.0,
+        'no_count': int(predicted_no.sum()),
+        'no_hit_rate': float(np.mean(labels[predicted_no] == 0) * 100) if predicted_no.any() else 0.0,
+        'base_rate': float(np.mean(labels) * 100) if len(labels) > 0 else 0.0,
+    }
+
+def CrossValidate(features :np.ndarray, labels :np.ndarray, dates :np.ndarray, folds :int = DEFAULT_FOLDS, params :dict = None) -> List[dict]:
+    results = []
+    for train, test in GetTimeSplits(dates, folds):
+        model = TrainModel(features[train], labels[train], params)
+        result = Evaluate(model, features[test], labels[test])
+        result['train_count'] = len(train)
+        results.append(result)
+    return results
+
+def RunTraining(results :ResultColumns, folds :int = DEFAULT_FOLDS, params :dict = None) -> tuple:
+    start = time.perf_counter()
+    features, labels, dates = BuildTrainingSet(results)
+    encode_seconds = time.perf_counter() - start
+    if len(labels) < folds + 1:
+        raise ValueError(f"只有{len(labels)}項可用紀錄, 不足以進行{folds}次交叉驗證")
+    start = time.perf_counter()
+    folds_report = CrossValidate(features, labels, dates, folds, params)
+    validate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    model = TrainModel(features, labels, params)
+    train_seconds = time.perf_counter() - start
+    report = {
+        'rows': len(labels),
+        'folds': folds_report,
+        'mean_accuracy': float(np.mean([fold['accuracy'] for fold in folds_report])),
+        'training': Evaluate(model, features, labels),
+        'encode_seconds': encode_seconds,
+        'validate_seconds': validate_seconds,
+        'train_seconds': train_seconds,
+    }
+    return model, report
+
+def SaveModel(model, report :dict, directory :str = MODEL_DIRECTORY, publish_path :str = None) -> str:
+    import joblib
+    version = datetime.now().strftime('%Y%m%d%H%M%S')
+    bundle = {
+        'model': model,
+        'version': version,
+        'encoder_version': ENCODER_VERSION,
+        'feature_names': FEATURE_NAMES,
+        'rows': report['rows'],
+        'mean_accuracy': report['mean_accuracy'],
+    }
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'model_lib2-{version}.joblib')
+    for target in [path] + ([publish_path] if publish_path is not None else []):
+        # ModelServer reloads on mtime, so never let it see a half-written file
+        temp_path = f'{target}.tmp'
+        joblib.dump(bundle, temp_path)
+        os.replace(temp_path, target)
+    return path
+
+def FormatReport(report :dict) -> str:
+    lines = [f"可用紀錄 {report['rows']}"]
+    for i, fold in enumerate(report['folds']):
+        lines.append(f"  第{i + 1}段: 訓練{fold['train_count']}項, 測試{fold['count']}項, 準確率 {fold['accuracy']:.2f}%, "
+                     f"預測有入球 {fold['yes_hit_rate']:.2f}% (共{fold['yes_count']}場次), 預測無入球 {fold['no_hit_rate']:.2f}% (共{fold['no_count']}場次), "
+                     f"實際入球率 {fold['base_rate']:.2f}%")
+    lines.append(f"平均準確率 {report['mean_accuracy']:.2f}%")
+    lines.append(f"用時: 特徵 {report['encode_seconds'] * 1000:.1f}ms, 交叉驗證 {report['validate_seconds'] * 1000:.1f}ms, 訓練 {report['train_seconds'] * 1000:.1f}ms")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import sys
+    from datetime import timedelta
+    from DataAccess.ResultDto import ResultDto
+
+    synthetic_count = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    folds = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_FOLDS
+    publish = len(sys.argv) > 3 and sys.argv[3] == 'publish'
+
+    model_directory = MODEL_DIRECTORY
+    if synthetic_count > 0:
+        import random
+        random.seed(20240122)
+        now = datetime.now()
+        dtos = []
+        for i in range(synthetic_count):
+            dto = ResultDto(i, random.randint(10, 45), round(random.uniform(2.0, 2.15), 2))
+            dto.ht_prematch_goalline = random.choice(['0.5/1.0', '1.0/1.5', '1.5'])
+            dto.ft_prematch_goalline = random.choice(['2.0/2.5', '2.5', '2.5/3.0', '3.0/3.5'])
+            dto.ht_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+            dto.ft_prematch_odd = round(random.uniform(1.6, 2.4), 2)
+            dto.ht_rise = random.choice([True, False, None])
+            dto.ft_rise = random.choice([True, False, None])
+            dto.ht_success = random.randint(0, 3)
+            dto.match_date = now - timedelta(minutes=i)
+            dtos.append(dto)
+        results = ResultColumns.FromDtos(dtos)
+    else:
+        import Config
+        model_directory = getattr(Config, 'MODEL_DIRECTORY', MODEL_DIRECTORY)
+        from LoggerFactory import LoggerFactory
+        from DataAccess.ResultRepository import ResultRepository
+        results = ResultRepository(Config.CONNECTION_STRING, LoggerFactory("ModelTraining_Logs"), backend=getattr(Config, 'RESULT_STORE_BACKEND', None)).GetResultColumns()
+
+    model, report = RunTraining(results, folds)
+    print(FormatReport(report))
+    path = SaveModel(model, report, model_directory, publish_path=MODEL_PATH if publish else None)
+    print(f"模型已保存至{path}" + (f", 並已發佈至{MODEL_PATH}" if publish else ""))
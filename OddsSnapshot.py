@@ -0,0 +1,75 @@
+LIVE_ODDS_POOLS = ['fhlodds', 'hilodds']
+LIVE_ODDS_LINE = '0.5/1.0'
+
+def ParseLineOdd(odd_text :str) -> float:
+    return float(odd_text[4:])
+
+def TryParseLineOdd(odd_text :str) -> float:
+    try:
+        return ParseLineOdd(odd_text)
+    except (ValueError, TypeError):
+        return None
+
+def FindLineOdd(match_data :dict, line :str = LIVE_ODDS_LINE) -> float:
+    for pool in LIVE_ODDS_POOLS:
+        if not pool in match_data:
+            continue
+        for line_data in match_data[pool]['LINELIST']:
+            if line_data['LINE'] != line:
+                continue
+            return ParseLineOdd(line_data['H'])
+    return -1
+
+class OddsSnapshot:
+    def __init__(self, odds_response :dict):
+        self.__matches = {}
+        self.__lines = {}
+        matches = odds_response.get('matches') if odds_response is not None else None
+        for match_data in matches or []:
+            match_id = match_data.get('matchID')
+            if match_id is None:
+                continue
+            self.__matches[match_id] = match_data
+            for pool in LIVE_ODDS_POOLS:
+                if not pool in match_data:
+                    continue
+                for line_data in match_data[pool]['LINELIST']:
+                    high = TryParseLineOdd(line_data.get('H'))
+                    if high is None:
+                        continue
+                    # a bad L must not hide the H odd, which is all FindLineOdd ever read
+                    odds = (high, TryParseLineOdd(line_data.get('L')))
+                    self.__lines.setdefault((pool, line_data['LINE']), {}).setdefault(match_id, odds)
+
+    def __len__(self):
+        return len(self.__matches)
+
+    def GetMatch(self, match_id :str) -> dict:
+        return self.__matches.get(match_id)
+
+    def HasLiveOdds(self, match_id :str) -> bool:
+        match_data = self.__matches.get(match_id)
+        return match_data is not None and any(pool in match_data for pool in LIVE_ODDS_POOLS)
+
+    def GetLineOdds(self, match_id :str, pool :str, line :str) -> tuple:
+        return self.__lines.get((pool, line), {}).get(match_id)
+
+    def GetMatchesByLine(self, pool :str, line :str) -> dict:
+        return dict(self.__lines.get((pool, line), {}))
+
+    def GetLiveTimeOdd(self, match_id :str, line :str = LIVE_ODDS_LINE) -> float:
+        if not self.HasLiveOdds(match_id):
+            return None
+        match_data = self.__matches[match_id]
+        for pool in LIVE_ODDS_POOLS:
+            if not pool in match_data:
+                continue
+            odds = self.GetLineOdds(match_id, pool, line)
+            if odds is not None:
+                return odds[0]
+        return -1
+
+    def IterLineOdds(self):
+        for (pool, line), matches in self.__lines.items():
+            for match_id, odds in matches.items():
+                yield pool, line, match_id, odds
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List
+import numpy as np
+from OddsSnapshot import OddsSnapshot
+
+SERIES_DIRECTORY = 'odds_series'
+DATA_SUFFIX = '.odds'
+INDEX_SUFFIX = '.json'
+ODDS_SCALE = 100
+MAX_SCALED_ODD = np.iinfo(np.uint16).max
+MINUTE_UNKNOWN = 255
+# 16 bytes per line update so a day of files can be memory-mapped and sliced without parsing
+RECORD_DTYPE = np.dtype([('match', '<u4'), ('at', '<u4'), ('high', '<u2'), ('low', '<u2'), ('minute', 'u1'), ('pool', 'u1'), ('line', 'u1'), ('flags', 'u1')])
+
+def _ScaleOdd(odd :float) -> int:
+    if odd is None or odd != odd or odd < 0:
+        return 0
+    return min(int(round(odd * ODDS_SCALE)), MAX_SCALED_ODD)
+
+def _Day(at :float) -> str:
+    return datetime.fromtimestamp(at).strftime('%Y%m%d')
+
+class SeriesIndex:
+    def __init__(self, matches :list = None, pools :list = None, lines :list = None):
+        self.matches = matches or []
+        self.pools = pools or []
+        self.lines = lines or []
+        self.__codes = {name: {value: code for code, value in enumerate(values)} for name, values in (('matches', self.matches), ('pools', self.pools), ('lines', self.lines))}
+
+    def GetCode(self, name :str, value) -> int:
+        return self.__codes[name].get(value)
+
+    def AddCode(self, name :str, value) -> int:
+        codes = self.__codes[name]
+        code = codes.get(value)
+        if code is None:
+            values = getattr(self, name)
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def Save(self, path :str):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'matches': self.matches, 'pools': self.pools, 'lines': self.lines}, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def Load(path :str):
+        if not os.path.exists(path):
+            return SeriesIndex()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return SeriesIndex(data['matches'], data['pools'], data['lines'])
+
+class OddsSeriesWriter:
+    def __init__(self, directory :str = SERIES_DIRECTORY, clock = time.time):
+        self.directory = directory
+        self.clock = clock
+        self.__day = None
+        self.__file = None
+        self.__index = None
+        self.__last = {}
+        self.__lock = threading.Lock()
+        self.records = 0
+        self.skipped = 0
+
+    def _Open(self, day :str):
+        if self.__file is not None:
+            self.__file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, day)
+        self.__index = SeriesIndex.Load(base + INDEX_SUFFIX)
+        self.__file = open(base + DATA_SUFFIX, 'ab')
+        # a torn record from a crash would shift every following record
+        torn = self.__file.tell() % RECORD_DTYPE.itemsize
+        if torn != 0:
+            self.__file.truncate(self.__file.tell() - torn)
+            self.__file.seek(0, os.SEEK_END)
+        self.__day = day
+        self.__last.clear()
+
+    def Append(self, snapshot :OddsSnapshot, matches :list) -> int:
+        minutes = {m.id: m.time_int for m in matches or []}
+        if len(minutes) == 0:
+            return 0
+        at = self.clock()
+        with self.__lock:
+            day = _Day(at)
+            if day != self.__day:
+                self._Open(day)
+            index = self.__index
+            new_codes = len(index.matches) + len(index.pools) + len(index.lines)
+            rows = []
+            for pool, line, match_id, (high, low) in snapshot.IterLineOdds():
+                if not match_id in minutes:
+                    continue
+                minute = minutes[match_id]
+                minute = MINUTE_UNKNOWN if minute is None else min(max(minute, 0), MINUTE_UNKNOWN - 1)
+                record = (index.AddCode('matches', match_id), int(at), _ScaleOdd(high), _ScaleOdd(low), minute, index.AddCode('pools', pool), index.AddCode('lines', line), 0)
+                # unchanged odds are only kept once per minute
+                key = (record[0], record[5], record[6])
+                if self.__last.get(key) == (record[2], record[3], minute):
+                    self.skipped += 1
+                    continue
+                self.__last[key] = (record[2], record[3], minute)
+                rows.append(record)
+            if len(index.matches) + len(index.pools) + len(index.lines) != new_codes:
+                index.Save(os.path.join(self.directory, day + INDEX_SUFFIX))
+            if len(rows) == 0:
+                return 0
+            np.array(rows, dtype=RECORD_DTYPE).tofile(self.__file)
+            self.__file.flush()
+            self.records += len(rows)
+            return len(rows)
+
+    def Close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+                self.__day = None
+
+class OddsSeries:
+    def __init__(self, records :np.ndarray, index :SeriesIndex):
+        self.at = records['at'].astype('datetime64[s]')
+        self.minute = records['minute'].astype(np.int16)
+        self.minute[self.minute == MINUTE_UNKNOWN] = -1
+        self.pool = np.array(index.pools, dtype=object)[records['pool']] if len(records) > 0 else np.array([], dtype=object)
+        self.line = np.array(index.lines, dtype=object)[records['line']] if len(records) > 0 else np.array([], dtype=object)
+        self.high = records['high'].astype(np.float32) / ODDS_SCALE
+        self.low = records['low'].astype(np.float32) / ODDS_SCALE
+        self.high[records['high'] == 0] = np.nan
+        self.low[records['low'] == 0] = np.nan
+
+    def __len__(self):
+        return len(self.at)
+
+class OddsSeriesReader:
+    def __init__(self, directory :str = SERIES_DIRECTORY):
+        self.directory = directory
+        self.__files = {}
+
+    def GetDays(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(DATA_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(DATA_SUFFIX))
+
+    def _Load(self, day :str) -> tuple:
+        base = os.path.join(self.directory, day)
+        size = os.path.getsize(base + DATA_SUFFIX)
+        loaded = self.__files.get(day)
+        if loaded is not None and loaded[0] == size:
+            return loaded[1], loaded[2]
+        count = size // RECORD_DTYPE.itemsize
+        records = np.memmap(base + DATA_SUFFIX, dtype=RECORD_DTYPE, mode='r', shape=(count,)) if count > 0 else np.zeros(0, dtype=RECORD_DTYPE)
+        index = SeriesIndex.Load(base + INDEX_SUFFIX)
+        self.__files[day] = (size, records, index)
+        return records, index
+
+    def GetMatchIds(self, days :List[str] = None) -> List[str]:
+        match_ids = []
+        for day in days or self.GetDays():
+            _, index = self._Load(day)
+            match_ids.extend(index.matches)
+        return list(dict.fromkeys(match_ids))
+
+    def Query(self, match_id :str, line :str = None, pool :str = None, min_minute :int = None, max_minute :int = None, days :List[str] = None) -> OddsSeries:
+        parts = []
+        for day in days or self.GetDays():
+            records, index = self._Load(day)
+            match_code = index.GetCode('matches', match_id)
+            if match_code is None or len(records) == 0:
+                continue
+            mask = records['match'] == match_code
+            for name, value, field in (('lines', line, 'line'), ('pools', pool, 'pool')):
+                if value is None:
+                    continue
+                code = index.GetCode(name, value)
+                if code is None:
+                    mask[:] = False
+                    break
+                mask &= records[field] == code
+            if min_minute is not None:
+                mask &= (records['minute'] >= min_minute) & (records['minute'] != MINUTE_UNKNOWN)
+            if max_minute is not None:
+                mask &= records['minute'] <= max_minute
+            selected = records[mask]
+            if len(selected) > 0:
+                parts.append(OddsSeries(np.asarray(selected), index))
+        if len(parts) == 0:
+            return OddsSeries(np.zeros(0, dtype=RECORD_DTYPE), SeriesIndex())
+        if len(parts) == 1:
+            return parts[0]
+        merged = parts[0]
+        for name in ('at', 'minute', 'pool', 'line', 'high', 'low'):
+            setattr(merged, name, np.concatenate([getattr(part, name) for part in parts]))
+        return merged
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import random
+
+    match_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(0)
+
+    class BenchmarkMatch:
+        def __init__(self, match_id :str, minute :int):
+            self.id = match_id
+            self.time_int = minute
+
+    lines = ['0.5/1.0', '1.5', '2.5']
+    with tempfile.TemporaryDirectory() as directory:
+        clock = [time.time()]
+        writer = OddsSeriesWriter(directory, clock=lambda: clock[0])
+        matches = [BenchmarkMatch(f'5000{i:04d}', rng.randint(0, 80)) for i in range(match_count)]
+        write_seconds = []
+        for cycle in range(cycles):
+            odds = [{'matchID': m.id, 'hilodds': {'LINELIST': [{'LINE': line, 'H': f'100@{rng.uniform(1.6, 2.4):.2f}', 'L': f'100@{rng.uniform(1.6, 2.4):.2f}'} for line in lines]}} for m in matches]
+            snapshot = OddsSnapshot({'matches': odds})
+            start = time.perf_counter()
+            writer.Append(snapshot, matches)
+            write_seconds.append(time.perf_counter() - start)
+            clock[0] += 5
+            if cycle % 12 == 11:
+                for m in matches:
+                    m.time_int = min(m.time_int + 1, 90)
+        writer.Close()
+
+        reader = OddsSeriesReader(directory)
+        start = time.perf_counter()
+        series = reader.Query(matches[0].id, line='0.5/1.0', min_minute=10, max_minute=60)
+        query_seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"{match_count}場 x {cycles}週期: 每週期寫入 p50 {np.percentile(write_seconds, 50) * 1000:.2f}ms p99 {np.percentile(write_seconds, 99) * 1000:.2f}ms, "
+              f"共{writer.records}筆 ({size / 1024 / 1024:.1f}MB), 查詢單場 {query_seconds * 1000:.2f}ms ({len(series)}筆)")
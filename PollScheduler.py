@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import List
+import pytz
+from OddsSnapshot import OddsSnapshot
+from TriggerEngine import TriggerEngine
+
+NEAR_BAND_MARGIN = 0.15
+
+class PollPlan:
+    def __init__(self, seconds :float, reason :str):
+        self.seconds = seconds
+        self.reason = reason
+
+    def __lt__(self, other):
+        return self.seconds < other.seconds
+
+class PollScheduler:
+    def __init__(self, fast_seconds :float, slow_seconds :float = 120, max_idle_seconds :float = 8 * 3600, kickoff_lead_seconds :float = 60, near_band_margin :float = NEAR_BAND_MARGIN):
+        self.fast_seconds = fast_seconds
+        self.slow_seconds = max(slow_seconds, fast_seconds)
+        self.max_idle_seconds = max_idle_seconds
+        self.kickoff_lead_seconds = kickoff_lead_seconds
+        self.near_band_margin = near_band_margin
+
+    def _Clamp(self, plan :PollPlan) -> PollPlan:
+        plan.seconds = min(max(plan.seconds, 1), self.max_idle_seconds)
+        return plan
+
+    def PlanIdle(self, prefetches :dict, now :datetime = None) -> PollPlan:
+        if prefetches['matches'] is None or len(prefetches['matches']) == 0:
+            return None
+        import dateutil.parser
+        now = now if now is not None else datetime.now(tz=pytz.timezone('Asia/Hong_Kong'))
+        kickoffs = [dateutil.parser.parse(x['matchDate']) for x in prefetches['matches'] if len(x['inplayPools']) > 0]
+        if len(kickoffs) == 0:
+            return self._Clamp(PollPlan(self.max_idle_seconds, "未能搵到下場有即場的賽事"))
+        if any(kickoff <= now for kickoff in kickoffs):
+            return None
+        time_until = (min(kickoffs) - now).total_seconds() - self.kickoff_lead_seconds
+        if time_until <= self.fast_seconds:
+            return None
+        return self._Clamp(PollPlan(time_until, f"下場賽事{int(time_until / 60) + 1}分鐘後開賽"))
+
+    def PlanLive(self, matches :list, snapshot :OddsSnapshot, trigger_engine :TriggerEngine) -> PollPlan:
+        plans :List[PollPlan] = [PollPlan(self.slow_seconds, "賽事進行中, 暫無接近通知條件的賽事")]
+        for m in matches or []:
+            if not m.is_started or not m.is_live_match or m.is_goaled:
+                continue
+            minute = trigger_engine.GetNextMinute(m)
+            if minute is not None:
+                seconds = m.GetSecondsToMinute(minute)
+                if seconds is not None:
+                    plans.append(PollPlan(seconds, f"{m.id}賽事即將進入第{minute}分鐘"))
+            if m.time_int == 46:
+                continue
+            if trigger_engine.MayTrigger(m, snapshot, self.near_band_margin):
+                plans.append(PollPlan(self.fast_seconds, f"{m.id}賽事賠率接近通知條件"))
+        return self._Clamp(min(plans))
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+CACHE_DIRECTORY = 'response_cache'
+MAX_MEMORY_BYTES = 32 * 1024 * 1024
+MAX_DISK_BYTES = 512 * 1024 * 1024
+DISK_SUFFIX = '.zlib'
+
+class CachedEntry:
+    def __init__(self, etag :str, last_modified :str, content :bytes, encoding :str, content_type :str):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+        self.encoding = encoding
+        self.content_type = content_type
+
+class ResponseCache:
+    def __init__(self, directory :str = CACHE_DIRECTORY, max_memory_bytes :int = MAX_MEMORY_BYTES, max_disk_bytes :int = MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.__entries = OrderedDict()
+        self.__memory_bytes = 0
+        self.__disk_files = OrderedDict()
+        self.__disk_bytes = 0
+        self.__lock = threading.Lock()
+        self.revalidated = 0
+        self.refetched = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        if directory is not None and os.path.isdir(directory):
+            files = []
+            for name in os.listdir(directory):
+                if name.endswith(DISK_SUFFIX):
+                    stat = os.stat(os.path.join(directory, name))
+                    files.append((stat.st_mtime, name, stat.st_size))
+            for _, name, size in sorted(files):
+                self.__disk_files[name] = size
+                self.__disk_bytes += size
+
+    def GetValidators(self, url :str) -> dict:
+        with self.__lock:
+            entry = self.__entries.get(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def Store(self, url :str, headers, content :bytes, encoding :str):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            with self.__lock:
+                self.refetched += 1
+            return
+        with self.__lock:
+            self.refetched += 1
+            previous = self.__entries.pop(url, None)
+            if previous is not None:
+                self.__memory_bytes -= len(previous.content)
+            self.__entries[url] = CachedEntry(etag, last_modified, content, encoding, headers.get('Content-Type'))
+            self.__memory_bytes += len(content)
+            while self.__memory_bytes > self.max_memory_bytes and len(self.__entries) > 1:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__memory_bytes -= len(evicted.content)
+                self.evictions += 1
+
+    def GetRevalidated(self, url :str) -> CachedEntry:
+        with self.__lock:
+            entry = self.__entries.get(url)
+            if entry is None:
+                return None
+            self.__entries.move_to_end(url)
+            self.revalidated += 1
+            self.bytes_saved += len(entry.content)
+            return entry
+
+    def _GetDiskName(self, url :str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest() + DISK_SUFFIX
+
+    def GetPermanent(self, url :str) -> str:
+        if self.directory is None:
+            return None
+        name = self._GetDiskName(url)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                compressed = f.read()
+            text = zlib.decompress(compressed).decode('utf-8')
+        except (OSError, zlib.error):
+            with self.__lock:
+                self.disk_misses += 1
+            return None
+        os.utime(path)
+        with self.__lock:
+            if name in self.__disk_files:
+                self.__disk_files.move_to_end(name)
+            self.disk_hits += 1
+            self.bytes_saved += len(text)
+        return text
+
+    def PutPermanent(self, url :str, text :str):
+        if self.directory is None:
+            return
+        name = self._GetDiskName(url)
+        path = os.path.join(self.directory, name)
+        compressed = zlib.compress(text.encode('utf-8'), 6)
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+
+        evicted = []
+        with self.__lock:
+            self.__disk_bytes -= self.__disk_files.pop(name, 0)
+            self.__disk_files[name] = len(compressed)
+            self.__disk_bytes += len(compressed)
+            while self.__disk_bytes > self.max_disk_bytes and len(self.__disk_files) > 1:
+                evicted_name, size = self.__disk_files.popitem(last=False)
+                self.__disk_bytes -= size
+                self.evictions += 1
+                evicted.append(evicted_name)
+        for evicted_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, evicted_name))
+            except OSError:
+                pass
+
+    def GetStats(self) -> dict:
+        with self.__lock:
+            conditional = self.revalidated + self.refetched
+            disk_lookups = self.disk_hits + self.disk_misses
+            return {
+                'memory_entries': len(self.__entries),
+                'memory_bytes': self.__memory_bytes,
+                'revalidated': self.revalidated,
+                'refetched': self.refetched,
+                'revalidated_rate': self.revalidated / conditional if conditional > 0 else 0.0,
+                'disk_entries': len(self.__disk_files),
+                'disk_bytes': self.__disk_bytes,
+                'disk_hits': self.disk_hits,
+                'disk_hit_rate': self.disk_hits / disk_lookups if disk_lookups > 0 else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+            }
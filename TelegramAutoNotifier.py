@@ -1,56 +1,93 @@
-import telegram
-import schedule, time
+import time
 from Fetcher import Fetcher
+from Crawler import Crawler
+from TrafficArchive import TrafficRecorder
+from ResponseCache import ResponseCache, CACHE_DIRECTORY
+from TelegramSender import TelegramSender
 from Config import *
-import asyncio, threading
+import asyncio
 from LoggerFactory import LoggerFactory
+from Metrics import REGISTRY, METRICS_JSON_PATH
 
 def GetCurrentTime() -> str:
     return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.localtime())
-    
+
 async def SendNotificationToTelegramAsync():
-    global fetching
-    fetching = True
     logger.debug("開始取得即場賽事資料, 檢查各場次")
     print(f"[{GetCurrentTime()}]檢查各場次")
-    results = fetcher.FindMatch()
+    try:
+        results = await asyncio.wait_for(fetcher.FindMatchAsync(), timeout=CHECKINTERVAL_SECOND)
+    except asyncio.TimeoutError:
+        logger.debug(f"取得即場賽事資料超過{CHECKINTERVAL_SECOND}秒, 已取消今次檢查")
+        print(f"[{GetCurrentTime()}]今次檢查超時, 已取消")
+        return
+    except Exception as ex:
+        # a bad payload only costs this cycle, the loop keeps polling
+        logger.error(f"取得即場賽事資料失敗, 已略過今次檢查. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+        print(f"[{GetCurrentTime()}]今次檢查失敗: {ex}")
+        return
     logger.debug(f"需發通知場次數 {len(results)}")
     print(f"[{GetCurrentTime()}]需發通知場次數 {len(results)}")
-    fetching = False
-    for result in results:
-        msg = result[0] + '\n' + result[1]
-        bot = telegram.Bot(token=TOKEN)
-        for channel in CHANNEL_IDs:
-            await bot.send_message(channel, text=msg)
-        
-def ResultsFetchNewThread():
+    if len(results) == 0:
+        return
+    await sender.Send([result[0] + '\n' + result[1] for result in results])
+    if fetcher.last_snapshot_at is not None:
+        REGISTRY.Observe('notification_delivery_seconds', time.monotonic() - fetcher.last_snapshot_at)
+
+async def ResultsFetchAsync():
     logger.debug("正在取得完場賽事資料")
-    t = threading.Thread(target=fetcher.FillMatchResults)
-    t.start()
-    
-def OddsFetchAsync():
-    asyncio.run(SendNotificationToTelegramAsync()) 
-    
-def OddsFetchNewThread():
-    logger.debug("準備開始取得即場賽事資料")
-    if not fetching:
-        t = threading.Thread(target=OddsFetchAsync)
-        t.start()
-    else:
-        logger.debug("上一個Thread仍然進行中, 取消取得程序")
-        print("上一個Thread仲fetch緊")
-    
+    await asyncio.get_running_loop().run_in_executor(fetcher.executor, fetcher.FillMatchResults)
+
+def LogResultsTaskError(task :asyncio.Task):
+    if task.cancelled() or task.exception() is None:
+        return
+    ex = task.exception()
+    logger.error(f"取得完場賽事資料失敗. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+
+async def MainAsync():
+    results_task = None
+    next_results_time = time.monotonic()
+    next_odds_time = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= next_results_time:
+                if results_task is None or results_task.done():
+                    results_task = asyncio.create_task(ResultsFetchAsync())
+                    results_task.add_done_callback(LogResultsTaskError)
+                next_results_time = now + CHECKINTERVAL_MINUTES * 60
+            if now >= next_odds_time:
+                logger.debug("準備開始取得即場賽事資料")
+                await SendNotificationToTelegramAsync()
+                next_odds_time = time.monotonic() + (fetcher.GetNextPollSeconds() or CHECKINTERVAL_SECOND)
+            await asyncio.sleep(max(min(next_odds_time, next_results_time) - time.monotonic(), 0))
+    finally:
+        try:
+            # write-behind upserts, e.g. from a cycle cancelled by wait_for, would otherwise be lost
+            fetcher.repository.Close()
+        except Exception as ex:
+            logger.error(f"關閉時寫入資料庫失敗. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+        await sender.Close()
+        await fetcher.crawler.async_session_pool.Close()
+        fetcher.odds_recorder.Close()
+        if fetcher.crawler.recorder is not None:
+            fetcher.crawler.recorder.Close()
+
 if __name__ == "__main__":
     global fetcher
     global logger
+    global sender
     loggingFactory = LoggerFactory("AutoNotifier_Logs")
     logger = loggingFactory.getLogger("Main")
-    fetcher = Fetcher(CONNECTION_STRING, loggingFactory)
-    ResultsFetchNewThread()
-    OddsFetchAsync()
-    schedule.every(CHECKINTERVAL_SECOND).seconds.do(OddsFetchNewThread)
-    schedule.every(CHECKINTERVAL_MINUTES).minutes.do(ResultsFetchNewThread)
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
\ No newline at end of file
+    recorder = None
+    if globals().get('CAPTURE_ARCHIVE_PATH') is not None:
+        recorder = TrafficRecorder(CAPTURE_ARCHIVE_PATH)
+        logger.info(f"已啟用錄製模式, 所有回應將保存至{CAPTURE_ARCHIVE_PATH}")
+    response_cache = ResponseCache(globals().get('RESPONSE_CACHE_PATH') or CACHE_DIRECTORY)
+    fetcher = Fetcher(CONNECTION_STRING, loggingFactory, crawler=Crawler(loggingFactory, response_cache=response_cache, recorder=recorder))
+    sender = TelegramSender(TOKEN, CHANNEL_IDs, loggingFactory)
+    if globals().get('METRICS_PORT') is not None:
+        REGISTRY.StartHttpServer(METRICS_PORT)
+    else:
+        REGISTRY.StartJsonDump(globals().get('METRICS_PATH') or METRICS_JSON_PATH)
+    asyncio.run(MainAsync())
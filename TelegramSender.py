@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import List
+import telegram
+from telegram.error import RetryAfter, TimedOut, NetworkError
+from Metrics import REGISTRY
+
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = '\n\n──────────\n\n'
+
+class TokenBucket:
+    def __init__(self, rate_per_second :float, capacity :float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def Acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate_per_second)
+
+def _GetRetryAfterSeconds(ex :RetryAfter) -> float:
+    retry_after = ex.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+def CoalesceMessages(messages :List[str], max_length :int = MAX_MESSAGE_LENGTH) -> List[str]:
+    chunks = []
+    current = ''
+    for message in messages:
+        if len(message) > max_length:
+            if current != '':
+                chunks.append(current)
+                current = ''
+            chunks.extend(message[i:i + max_length] for i in range(0, len(message), max_length))
+            continue
+        candidate = message if current == '' else current + COALESCE_SEPARATOR + message
+        if len(candidate) > max_length:
+            chunks.append(current)
+            current = message
+        else:
+            current = candidate
+    if current != '':
+        chunks.append(current)
+    return chunks
+
+class TelegramSender:
+    def __init__(self, token :str, channel_ids :list, loggerFactory, global_rate :float = 30, per_chat_rate :float = 20 / 60, per_chat_burst :int = 3, coalesce_threshold :int = 3, max_retries :int = 3):
+        self.logger = loggerFactory.getLogger("TelegramSender")
+        self.bot = telegram.Bot(token=token)
+        self.channel_ids = list(channel_ids)
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.chat_buckets = {}
+        self.coalesce_threshold = coalesce_threshold
+        self.max_retries = max_retries
+        self.is_started = False
+
+    async def Start(self):
+        if not self.is_started:
+            await self.bot.initialize()
+            self.is_started = True
+
+    async def Close(self):
+        if self.is_started:
+            await self.bot.shutdown()
+            self.is_started = False
+
+    def _GetChatBucket(self, channel) -> TokenBucket:
+        bucket = self.chat_buckets.get(channel)
+        if bucket is None:
+            bucket = self.chat_buckets[channel] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    async def Send(self, messages :List[str]) -> int:
+        if len(messages) == 0:
+            return 0
+        await self.Start()
+        if len(messages) >= self.coalesce_threshold:
+            chunks = CoalesceMessages(messages)
+            self.logger.debug(f"通知數量{len(messages)}項, 已合併為{len(chunks)}個訊息")
+        else:
+            chunks = messages
+        results = await asyncio.gather(*(self._SendToChannel(channel, chunks) for channel in self.channel_ids))
+        return sum(results)
+
+    async def _SendToChannel(self, channel, chunks :List[str]) -> int:
+        delivered = 0
+        bucket = self._GetChatBucket(channel)
+        for chunk in chunks:
+            if await self._SendWithRetry(channel, bucket, chunk):
+                delivered += 1
+        return delivered
+
+    async def _SendWithRetry(self, channel, bucket :TokenBucket, text :str) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await bucket.Acquire()
+            await self.global_bucket.Acquire()
+            try:
+                with REGISTRY.Time('telegram_send_seconds'):
+                    await self.bot.send_message(channel, text=text)
+                return True
+            except RetryAfter as ex:
+                wait_seconds = _GetRetryAfterSeconds(ex)
+                REGISTRY.Increment('telegram_retries_total', reason='retry_after')
+                self.logger.warning(f"發送至{channel}被限流, 將於{wait_seconds}秒後重試")
+                await asyncio.sleep(wait_seconds)
+            except (TimedOut, NetworkError) as ex:
+                REGISTRY.Increment('telegram_retries_total', reason='network')
+                self.logger.warning(f"發送至{channel}失敗, 將重試. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+                await asyncio.sleep(2 ** attempt)
+            except Exception as ex:
+                self.logger.error(f"發送至{channel}失敗. 錯誤類型:{type(ex)}. 錯誤內容:{ex}")
+                return False
+        self.logger.error(f"發送至{channel}重試{self.max_retries}次後仍然失敗")
+        return False
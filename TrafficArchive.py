@@ -0,0 +1,124 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+from typing import List
+import requests
+
+ARCHIVE_PATH = 'traffic_archive.jsonl.gz'
+
+class RecordedResponse:
+    def __init__(self, url :str, status_code :int, content :bytes, encoding :str = 'utf-8', content_type :str = None, elapsed :float = 0.0, at :float = 0.0):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = {'content-type': content_type} if content_type is not None else {}
+        self.elapsed_seconds = elapsed
+        self.at = at
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+class TrafficRecorder:
+    def __init__(self, path :str = ARCHIVE_PATH):
+        self.path = path
+        self.__file = gzip.open(path, 'ab')
+        self.__lock = threading.Lock()
+        self.__started = time.monotonic()
+        self.count = 0
+
+    def Record(self, url :str, response, elapsed :float):
+        content = response.content
+        header = {
+            'url': url,
+            'status': response.status_code,
+            'encoding': response.encoding,
+            'content_type': response.headers.get('content-type'),
+            'elapsed': elapsed,
+            'at': time.monotonic() - self.__started,
+            'length': len(content),
+        }
+        with self.__lock:
+            if self.__file is None:
+                return
+            self.__file.write(json.dumps(header).encode('utf-8') + b'\n')
+            self.__file.write(content)
+            self.count += 1
+
+    def Close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+def LoadArchive(path :str = ARCHIVE_PATH) -> List[RecordedResponse]:
+    responses = []
+    with gzip.open(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            header = json.loads(line)
+            content = f.read(header['length'])
+            responses.append(RecordedResponse(header['url'], header['status'], content, header['encoding'], header['content_type'], header['elapsed'], header['at']))
+    return responses
+
+class ReplaySessionPool:
+    def __init__(self, responses :List[RecordedResponse], latency_scale :float = 0):
+        self.latency_scale = latency_scale
+        self.__responses = {}
+        self.__positions = {}
+        self.__lock = threading.Lock()
+        self.request_count = 0
+        self.miss_count = 0
+        for response in responses:
+            self.__responses.setdefault(response.url, []).append(response)
+
+    def _Next(self, site_domain :str, site_api :str) -> RecordedResponse:
+        url = f'{site_domain}{site_api}'
+        with self.__lock:
+            recorded = self.__responses.get(url)
+            if recorded is None:
+                self.miss_count += 1
+                raise requests.exceptions.ConnectionError(f"{url}沒有已錄製的回應")
+            # replay in recorded order, then keep serving the last capture
+            position = self.__positions.get(url, 0)
+            self.__positions[url] = position + 1
+            self.request_count += 1
+            return recorded[min(position, len(recorded) - 1)]
+
+    def Post(self, site_domain :str, site_api :str) -> RecordedResponse:
+        response = self._Next(site_domain, site_api)
+        if self.latency_scale > 0:
+            time.sleep(response.elapsed_seconds * self.latency_scale)
+        return response
+
+    def Rewind(self):
+        with self.__lock:
+            self.__positions.clear()
+
+    def Reset(self, site_domain :str):
+        pass
+
+    def GetStats(self) -> dict:
+        with self.__lock:
+            return {'replay': {'requests': self.request_count, 'misses': self.miss_count, 'urls': len(self.__responses)}}
+
+    def Close(self):
+        pass
+
+class AsyncReplaySessionPool(ReplaySessionPool):
+    async def Post(self, site_domain :str, site_api :str) -> RecordedResponse:
+        response = self._Next(site_domain, site_api)
+        if self.latency_scale > 0:
+            await asyncio.sleep(response.elapsed_seconds * self.latency_scale)
+        return response
+
+    async def Close(self):
+        pass
@@ -0,0 +1,89 @@
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+MAX_CACHED_GRAPHS = 64
+
+def RenderTrendGraph(days :List[int], rates :List[float], x_lbl :str) -> bytes:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from scipy.interpolate import CubicSpline
+
+    x = np.linspace(0, len(days) - 1, 100)
+    cs = CubicSpline(range(len(days)), rates)
+
+    plt.rcParams['font.family'] = ['MingLiU', 'Arial', 'sans-serif']
+
+    plt.plot(range(len(days)), rates, 'o', label="實數")
+    plt.plot(x, cs(x), label="曲線圖")
+
+    plt.ylim(0, 100)
+    plt.xlabel(x_lbl)
+    plt.ylabel('命中 (%)')
+    plt.title('命中趨勢')
+    plt.grid(True)
+    plt.legend()
+
+    image_buffer = io.BytesIO()
+    plt.savefig(image_buffer, format='png')
+    plt.close()
+    return image_buffer.getvalue()
+
+class TrendGraphRenderer:
+    def __init__(self, max_workers :int = 2, max_entries :int = MAX_CACHED_GRAPHS):
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        self.__cache = OrderedDict()
+        self.__in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _GetExecutor(self) -> ProcessPoolExecutor:
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.__executor
+
+    async def Render(self, key :tuple, days :List[int], rates :List[float], x_lbl :str) -> bytes:
+        content = (tuple(days), tuple(rates), x_lbl)
+        cached = self.__cache.get(key)
+        if cached is not None and cached[0] == content:
+            self.__cache.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+        in_flight = self.__in_flight.get(key)
+        if in_flight is not None and in_flight[0] == content:
+            self.hits += 1
+            return await asyncio.shield(in_flight[1])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().run_in_executor(self._GetExecutor(), RenderTrendGraph, list(days), list(rates), x_lbl)
+        self.__in_flight[key] = (content, future)
+        try:
+            image = await asyncio.shield(future)
+        finally:
+            if self.__in_flight.get(key, (None, None))[1] is future:
+                del self.__in_flight[key]
+        self.__cache[key] = (content, image)
+        self.__cache.move_to_end(key)
+        while len(self.__cache) > self.max_entries:
+            self.__cache.popitem(last=False)
+        return image
+
+    def GetStats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self.__cache), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups > 0 else 0.0}
+
+    def Close(self):
+        with self.__executor_lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=True, cancel_futures=True)
+                self.__executor = None
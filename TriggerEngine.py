@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+from OddsSnapshot import OddsSnapshot, LIVE_ODDS_LINE
+from Metrics import REGISTRY
+
+HALF_TIME = 'ht'
+FULL_TIME = 'ft'
+HT_LAST_MIN_RULE = 'ht_last_min'
+FT_LAST_MIN_RULE = 'ft_last_min'
+NOTIFY_RULE = 'live_odds'
+STATE_WAITING = 'waiting'
+STATE_PENDING = 'pending'
+STATE_FIRED = 'fired'
+FIRED_TTL_SECONDS = 4 * 3600
+MAX_FIRED = 4096
+
+class ExpiringSet:
+    def __init__(self, max_size :int = MAX_FIRED, ttl_seconds :float = FIRED_TTL_SECONDS, clock :Callable = time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def _Expire(self, now :float):
+        while len(self.__entries) > 0:
+            key, added = next(iter(self.__entries.items()))
+            if len(self.__entries) <= self.max_size and now - added <= self.ttl_seconds:
+                break
+            del self.__entries[key]
+
+    def Add(self, key):
+        now = self.clock()
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = now
+            self._Expire(now)
+
+    def Discard(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        with self.__lock:
+            added = self.__entries.get(key)
+            if added is None:
+                return False
+            if self.clock() - added > self.ttl_seconds:
+                del self.__entries[key]
+                return False
+            return True
+
+    def __len__(self):
+        return len(self.__entries)
+
+class TriggerRule:
+    def __init__(self, name :str, label :str, half :str = None, line :str = None, min_odd :float = None, max_odd :float = None, min_minute :int = None, max_minute :int = None):
+        self.name = name
+        self.label = label
+        self.half = half
+        self.line = line
+        self.min_odd = min_odd
+        self.max_odd = max_odd
+        self.min_minute = min_minute
+        self.max_minute = max_minute
+
+    def AppliesTo(self, m) -> bool:
+        if self.half is not None and self.half != GetHalf(m):
+            return False
+        if self.min_minute is not None and (m.time_int is None or m.time_int < self.min_minute):
+            return False
+        if self.max_minute is not None and (m.time_int is None or m.time_int > self.max_minute):
+            return False
+        return True
+
+    def IsOddInBand(self, odd :float, margin :float = 0) -> bool:
+        if self.line is None:
+            return True
+        if odd is None or odd == -1:
+            return False
+        if self.min_odd is not None and odd < self.min_odd - margin:
+            return False
+        if self.max_odd is not None and odd > self.max_odd + margin:
+            return False
+        return True
+
+    def __repr__(self):
+        return f'TriggerRule({self.name})'
+
+DEFAULT_RULES = [
+    TriggerRule(HT_LAST_MIN_RULE, '半場最後4分鐘', half=HALF_TIME, min_minute=41),
+    TriggerRule(FT_LAST_MIN_RULE, '全場最後4分鐘', half=FULL_TIME, min_minute=86),
+    TriggerRule(NOTIFY_RULE, '即場0.75大有水', line=LIVE_ODDS_LINE, min_odd=2, max_odd=2.15),
+]
+
+def GetHalf(m) -> str:
+    return HALF_TIME if m.is_first_half else FULL_TIME
+
+def LoadRules(definitions :list) -> List[TriggerRule]:
+    rules = list(DEFAULT_RULES)
+    names = {rule.name for rule in rules}
+    for definition in definitions or []:
+        rule = TriggerRule(**definition)
+        if rule.name in names:
+            raise ValueError(f"重複的觸發規則名稱: {rule.name}")
+        names.add(rule.name)
+        rules.append(rule)
+    return rules
+
+class TriggerEvent:
+    __slots__ = ('rule', 'match', 'half', 'odd', 'previous_odd')
+
+    def __init__(self, rule :TriggerRule, match, half :str, odd :float = None, previous_odd :float = None):
+        self.rule = rule
+        self.match = match
+        self.half = half
+        self.odd = odd
+        self.previous_odd = previous_odd
+
+    @property
+    def key(self) -> tuple:
+        return (self.rule.name, self.match.id, self.half)
+
+class MatchTriggerState:
+    __slots__ = ('states', 'odds')
+
+    def __init__(self):
+        self.states = {}
+        self.odds = {}
+
+class TriggerEngine:
+    def __init__(self, rules :List[TriggerRule] = None, fired :ExpiringSet = None):
+        self.rules = rules if rules is not None else list(DEFAULT_RULES)
+        self.__rules = {rule.name: rule for rule in self.rules}
+        self.__fired = fired if fired is not None else ExpiringSet()
+        self.__matches :Dict[str, MatchTriggerState] = {}
+        self.__lock = threading.Lock()
+
+    def GetRule(self, name :str) -> TriggerRule:
+        return self.__rules[name]
+
+    def IsFired(self, rule_name :str, m) -> bool:
+        return (rule_name, m.id, GetHalf(m)) in self.__fired
+
+    def IsNotified(self, m) -> bool:
+        return all(self.IsFired(rule.name, m) for rule in self.rules if rule.line is not None and (rule.half is None or rule.half == GetHalf(m)))
+
+    def IsLastMinAlerted(self, m) -> bool:
+        return self.IsFired(HT_LAST_MIN_RULE if m.is_first_half else FT_LAST_MIN_RULE, m)
+
+    def _Pending(self, m) -> List[TriggerRule]:
+        half = GetHalf(m)
+        return [rule for rule in self.rules if rule.AppliesTo(m) and not (rule.name, m.id, half) in self.__fired]
+
+    def GetRequiredLines(self, m) -> List[str]:
+        lines = []
+        for rule in self._Pending(m):
+            if rule.line is not None and not rule.line in lines:
+                lines.append(rule.line)
+        return lines
+
+    def MayTrigger(self, m, snapshot :OddsSnapshot, margin :float = 0) -> bool:
+        for rule in self._Pending(m):
+            if rule.line is None:
+                return True
+            odd = snapshot.GetLiveTimeOdd(m.id, rule.line) if snapshot is not None else None
+            if odd is None or rule.IsOddInBand(odd, margin):
+                return True
+        return False
+
+    def GetNextMinute(self, m) -> int:
+        # rules gated by min_minute are not pending yet, so the scheduler has to wake up for them
+        if m.time_int is None:
+            return None
+        half = GetHalf(m)
+        minutes = [rule.min_minute for rule in self.rules
+                   if rule.min_minute is not None and m.time_int < rule.min_minute and (rule.half is None or rule.half == half)
+                   and not (rule.name, m.id, half) in self.__fired]
+        return min(minutes) if len(minutes) > 0 else None
+
+    def Evaluate(self, m, odds :dict = None) -> List[TriggerEvent]:
+        odds = odds or {}
+        half = GetHalf(m)
+        events = []
+        with self.__lock:
+            state = self.__matches.get(m.id)
+            if state is None:
+                state = self.__matches[m.id] = MatchTriggerState()
+        for rule in self._Pending(m):
+            key = (rule.name, half)
+            odd = odds.get(rule.line) if rule.line is not None else None
+            previous_odd = state.odds.get((rule.line, half)) if rule.line is not None else None
+            if rule.IsOddInBand(odd):
+                if state.states.get(key) != STATE_PENDING:
+                    REGISTRY.Increment('trigger_events_total', rule=rule.name)
+                state.states[key] = STATE_PENDING
+                events.append(TriggerEvent(rule, m, half, odd, previous_odd))
+            else:
+                state.states[key] = STATE_WAITING
+        for line, odd in odds.items():
+            state.odds[(line, half)] = odd
+        return events
+
+    def Fire(self, event :TriggerEvent):
+        self.__fired.Add(event.key)
+        state = self.__matches.get(event.match.id)
+        if state is not None:
+            state.states[(event.rule.name, event.half)] = STATE_FIRED
+
+    def Forget(self, match_ids :list):
+        with self.__lock:
+            for match_id in match_ids:
+                self.__matches.pop(match_id, None)
+
+    def GetState(self, rule_name :str, m) -> str:
+        if self.IsFired(rule_name, m):
+            return STATE_FIRED
+        state = self.__matches.get(m.id)
+        if state is None:
+            return STATE_WAITING
+        return state.states.get((rule_name, GetHalf(m)), STATE_WAITING)
+
+    def __len__(self):
+        return len(self.__matches)
@@ -0,0 +1,40 @@
+import glob
+import os
+import pytest
+import G10oalParser
+from G10oalParser import G10oalPage, ParseMatchPage
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIRECTORY, '*.html')))
+
+def _Read(name :str) -> str:
+    with open(os.path.join(FIXTURE_DIRECTORY, name), encoding='utf-8') as f:
+        return f.read()
+
+def _ParseWithSoup(html :str) -> tuple:
+    page = G10oalPage(html, use_lxml=False)
+    results = page.GetResults()
+    return (results, page.GetPreMatchOdds() if len(results) > 0 else None)
+
+def test_fixtures_exist():
+    assert len(FIXTURES) >= 3
+
+@pytest.mark.skipif(G10oalParser.lxml_html is None, reason="lxml is not installed")
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_lxml_matches_soup(path):
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    assert ParseMatchPage(html) == _ParseWithSoup(html)
+
+def test_finished_match():
+    scores, prematch_odds = ParseMatchPage(_Read('match_finished.html'))
+    assert scores == {'ht': 1, 'ft': 3}
+    assert prematch_odds == {'ht': {'1.0': (2.19, None)}, 'ft': {'3.0': (2.12, True)}}
+
+def test_ft90_counts_as_finished():
+    scores, prematch_odds = ParseMatchPage(_Read('match_ft90.html'))
+    assert scores == {'ht': 0, 'ft': 0}
+    assert prematch_odds['ht'] == {'0.5/1.0': (2.36, False)}
+
+def test_live_match_has_no_results():
+    assert ParseMatchPage(_Read('match_live.html')) == ({}, None)
@@ -0,0 +1,229 @@
+import random
+from typing import List
+import pytest
+from DataAccess.ResultDto import ResultDto
+from DataAccess.PredictionRoad import RoadMap, PredictionRoad, CHECKPOINT_INTERVAL, MIN_PREDICTION_ID
+
+# the original TelegramCommandBot.GetRoadGraph, kept verbatim apart from taking outcomes instead of matches
+def GetRoadGraph(outcomes :List[bool]) -> str:
+    listRoad = []
+    turnedDict = {}
+
+    def AddToRoad(success :bool):
+        if len(listRoad) == 0:
+            listRoad.append([success, None, None, None, None, None])
+            return
+
+        latestValidRoad = 0
+        for i in range(len(listRoad)):
+            if listRoad[i][0] is None:
+                break
+            latestValidRoad = i
+
+        if listRoad[latestValidRoad][0] != success:
+            latestValidRoad += 1
+
+        if len(listRoad) <= latestValidRoad:
+            listRoad.append([None for _ in range(6)])
+
+        filled = False
+        for i in range(6):
+            if listRoad[latestValidRoad][i] is None:
+                listRoad[latestValidRoad][i] = success
+                filled = True
+                break
+
+        if not filled:
+            toSetRow = 5
+            for row, turningData in turnedDict.items():
+                if row == latestValidRoad:
+                    continue
+
+                if row + turningData[1] >= latestValidRoad:
+                    toSetRow = turningData[0] - 1
+            if toSetRow < 0:
+                toSetRow = 0
+            if not latestValidRoad in turnedDict:
+                turnedDict[latestValidRoad] = [toSetRow, 0]
+
+            extended = latestValidRoad + 1
+            while not filled:
+                if extended >= len(listRoad):
+                    listRoad.append([None for _ in range(6)])
+                    listRoad[extended][toSetRow] = success
+                    turnedDict[latestValidRoad] = [toSetRow, turnedDict[latestValidRoad][1] + 1]
+                    filled = True
+                    break
+                if not listRoad[extended][toSetRow] is None:
+                    extended += 1
+                else:
+                    listRoad[extended][toSetRow] = success
+                    turnedDict[latestValidRoad] = [toSetRow, turnedDict[latestValidRoad][1] + 1]
+                    filled = True
+                    break
+
+    for success in outcomes:
+        AddToRoad(success)
+
+    listRoad = listRoad[-14:]
+
+    result = ""
+    for row in range(6):
+        for column in range(len(listRoad)):
+            if listRoad[column][row] == True:
+                result += '✅'
+            elif listRoad[column][row] == False:
+                result += '❌'
+            else:
+                result += '⬛️'
+        result += "\n"
+    return result
+
+def _Streaks(*lengths) -> List[bool]:
+    outcomes = []
+    for i, length in enumerate(lengths):
+        outcomes += [i % 2 == 0] * length
+    return outcomes
+
+def _Random(count :int, seed :int) -> List[bool]:
+    generator = random.Random(seed)
+    outcomes = []
+    while len(outcomes) < count:
+        outcomes += [generator.random() < 0.5] * generator.choice([1, 1, 2, 3, 5, 7, 9, 14])
+    return outcomes[:count]
+
+SEQUENCES = {
+    'empty': [],
+    'single': [True],
+    'fills_column': _Streaks(6),
+    'wraps_column': _Streaks(7),
+    'dragon_tail': _Streaks(12, 2, 1, 3),
+    'dragon_tail_past_window': _Streaks(30, 1),
+    'nested_dragon_tail': _Streaks(10, 9, 8, 7, 1, 8),
+    'second_dragon_tail': _Streaks(9, 1, 1, 1, 9, 2),
+    'streak_breaks': [i % 2 == 0 for i in range(40)],
+    'random_short': _Random(150, 1),
+    'random_long': _Random(1500, 2),
+}
+
+def _MakeDto(id :int, outcome :bool, predict :bool = True) -> ResultDto:
+    if predict:
+        ht_success = 1 if outcome else 0
+    else:
+        ht_success = 0 if outcome else 1
+    return ResultDto(f'M{id}', 30, 2.0, ht_success=ht_success, ht_pred=predict, id=id)
+
+def _Expected(dtos :List[ResultDto], predict :bool) -> tuple:
+    # the baseline PredictionRecent filter and ordering
+    matches = sorted(dtos, key=lambda x: x.id)
+    matches = [x for x in matches if x.id > MIN_PREDICTION_ID and not x.ht_success is None and not x.ht_pred is None and x.ht_pred == predict]
+    outcomes = [x.ht_success >= 1 if predict else x.ht_success == 0 for x in matches]
+    return GetRoadGraph(outcomes), list(reversed(outcomes[-10:]))
+
+def _Actual(road :PredictionRoad) -> tuple:
+    return road.Render(), road.GetRecent(10)
+
+@pytest.mark.parametrize('name', SEQUENCES)
+def test_road_map_matches_baseline(name):
+    road = RoadMap()
+    for success in SEQUENCES[name]:
+        road.Add(success)
+    assert road.Render() == GetRoadGraph(SEQUENCES[name])
+
+def test_road_map_matches_baseline_at_every_step():
+    outcomes = _Random(400, 3)
+    road = RoadMap()
+    for i, success in enumerate(outcomes):
+        road.Add(success)
+        assert road.Render() == GetRoadGraph(outcomes[:i + 1]), f"diverged after {i + 1} entries"
+
+def test_road_map_copy_is_independent():
+    road = RoadMap()
+    for success in _Streaks(8, 3):
+        road.Add(success)
+    copy = road.Copy()
+    copy.Add(False)
+    assert road.Render() == GetRoadGraph(_Streaks(8, 3))
+    assert copy.Render() == GetRoadGraph(_Streaks(8, 4))
+
+@pytest.mark.parametrize('predict', [True, False])
+@pytest.mark.parametrize('count', [0, 1, CHECKPOINT_INTERVAL - 1, CHECKPOINT_INTERVAL, CHECKPOINT_INTERVAL + 1,
+                                   2 * CHECKPOINT_INTERVAL - 1, 2 * CHECKPOINT_INTERVAL, 2 * CHECKPOINT_INTERVAL + 1])
+def test_incremental_matches_rebuild(predict, count):
+    outcomes = _Random(count, count)
+    dtos = [_MakeDto(MIN_PREDICTION_ID + 1 + i, success, predict) for i, success in enumerate(outcomes)]
+    expected = _Expected(dtos, predict)
+
+    rebuilt = PredictionRoad(predict)
+    rebuilt.Rebuild(dtos)
+    assert _Actual(rebuilt) == expected
+
+    incremental = PredictionRoad(predict)
+    for dto in dtos:
+        incremental.Update(dto)
+    assert _Actual(incremental) == expected
+    assert len(incremental) == len(rebuilt) == count
+
+@pytest.mark.parametrize('position', [0, CHECKPOINT_INTERVAL - 1, CHECKPOINT_INTERVAL, CHECKPOINT_INTERVAL + 1,
+                                      2 * CHECKPOINT_INTERVAL - 1, 2 * CHECKPOINT_INTERVAL, 2 * CHECKPOINT_INTERVAL + 5])
+def test_changed_outcome_at_checkpoint_boundary(position):
+    outcomes = _Random(2 * CHECKPOINT_INTERVAL + 10, 4)
+    dtos = [_MakeDto(MIN_PREDICTION_ID + 1 + i, success) for i, success in enumerate(outcomes)]
+    road = PredictionRoad(True)
+    road.Rebuild(dtos)
+
+    dtos[position] = _MakeDto(dtos[position].id, not outcomes[position])
+    road.Update(dtos[position])
+    assert _Actual(road) == _Expected(dtos, True)
+
+    # and back again, which must replay from the same checkpoint
+    dtos[position] = _MakeDto(dtos[position].id, outcomes[position])
+    road.Update(dtos[position])
+    assert _Actual(road) == _Expected(dtos, True)
+
+@pytest.mark.parametrize('position', [0, CHECKPOINT_INTERVAL - 1, CHECKPOINT_INTERVAL, 2 * CHECKPOINT_INTERVAL])
+def test_removed_entry_at_checkpoint_boundary(position):
+    outcomes = _Random(2 * CHECKPOINT_INTERVAL + 10, 5)
+    dtos = [_MakeDto(MIN_PREDICTION_ID + 1 + i, success) for i, success in enumerate(outcomes)]
+    road = PredictionRoad(True)
+    road.Rebuild(dtos)
+
+    dtos[position].ht_pred = False
+    road.Update(dtos[position])
+    assert _Actual(road) == _Expected(dtos, True)
+    assert len(road) == len(dtos) - 1
+
+def test_out_of_order_updates_match_rebuild():
+    generator = random.Random(6)
+    outcomes = _Random(3 * CHECKPOINT_INTERVAL, 6)
+    dtos = [_MakeDto(MIN_PREDICTION_ID + 1 + i, success) for i, success in enumerate(outcomes)]
+    shuffled = list(dtos)
+    generator.shuffle(shuffled)
+
+    road = PredictionRoad(True)
+    for dto in shuffled:
+        road.Update(dto)
+    assert _Actual(road) == _Expected(dtos, True)
+
+def test_filters_like_baseline():
+    dtos = [_MakeDto(MIN_PREDICTION_ID + i, i % 3 == 0) for i in range(-5, 40)]
+    dtos[10].ht_pred = False
+    dtos[11].ht_pred = None
+    dtos[12].ht_success = None
+    dtos[13].ht_success = 3
+    for predict in (True, False):
+        rebuilt = PredictionRoad(predict)
+        rebuilt.Rebuild(dtos)
+        incremental = PredictionRoad(predict)
+        for dto in dtos:
+            incremental.Update(dto)
+        assert _Actual(rebuilt) == _Actual(incremental) == _Expected(dtos, predict)
+
+def test_repeated_update_is_ignored():
+    dtos = [_MakeDto(MIN_PREDICTION_ID + 1 + i, success) for i, success in enumerate(_Streaks(8, 2, 3))]
+    road = PredictionRoad(True)
+    road.Rebuild(dtos)
+    road.Update(dtos[4])
+    road.Update(_MakeDto(dtos[4].id, True))
+    assert _Actual(road) == _Expected(dtos, True)
+    assert len(road) == len(dtos)
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from DataAccess.ResultDto import ResultDto
+from DataAccess.ResultStore import MapDtoToParams, MapRowToDto
+from DataAccess.SqliteResultStore import SqliteResultStore
+
+@pytest.fixture
+def store():
+    store = SqliteResultStore(':memory:')
+    yield store
+    store.Close()
+
+def test_tz_aware_match_date_reads_back_as_hong_kong_time(store):
+    dto = ResultDto('M1', 30, 2.05)
+    dto.match_date = datetime(2024, 1, 22, 20, 30, tzinfo=timezone(timedelta(hours=8)))
+    store.Insert(MapDtoToParams(dto))
+
+    rows = store.FetchAll()
+    assert len(rows) == 1
+    assert MapRowToDto(rows[0]).match_date == datetime(2024, 1, 22, 20, 30)
+    assert MapRowToDto(store.FetchById('M1')).match_date == datetime(2024, 1, 22, 20, 30)
+
+def test_other_offsets_are_converted_to_hong_kong_time(store):
+    dto = ResultDto('M1', 30, 2.05)
+    dto.match_date = datetime(2024, 1, 22, 12, 30, tzinfo=timezone.utc)
+    store.Insert(MapDtoToParams(dto))
+    assert MapRowToDto(store.FetchAll()[0]).match_date == datetime(2024, 1, 22, 20, 30)
+
+def test_naive_match_date_is_unchanged(store):
+    dto = ResultDto('M1', 30, 2.05)
+    dto.match_date = datetime(2024, 1, 22, 20, 30)
+    store.Insert(MapDtoToParams(dto))
+    assert MapRowToDto(store.FetchAll()[0]).match_date == datetime(2024, 1, 22, 20, 30)
+
+def test_rows_already_stored_with_an_offset_are_readable(store):
+    dto = ResultDto('M1', 30, 2.05)
+    params = list(MapDtoToParams(dto))
+    params[14] = '2024-01-22 20:30:00+08:00'
+    store.Insert(tuple(params))
+    assert MapRowToDto(store.FetchAll()[0]).match_date == datetime(2024, 1, 22, 20, 30)